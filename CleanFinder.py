@@ -1,4 +1,5 @@
 import os
+import multiprocessing
 
 """
 I want the directory with all the code and folder to be either:
@@ -20,23 +21,29 @@ if os.getcwd() != script_dir:
     os.chdir(script_dir)
 
 
-if not os.path.exists(os.path.join(os.getcwd(), 'results')):
-    os.mkdir(os.path.join(os.getcwd(), 'results'))
-if not os.path.exists(os.path.join(os.getcwd(), 'results', 'icons')):
-    os.mkdir(os.path.join(os.getcwd(), 'results', 'icons'))
-if not os.path.exists(os.path.join(os.getcwd(), 'results', 'log.log')):
-    open(os.path.join(os.getcwd(), 'results', 'log.log'), 'a').close()
-
-import sys
-from PySide6 import QtWidgets
-
-from src.non_ui_components.servers import ThreadsUiServer
-from src.non_ui_components.uis_manager import UiWindowManager
-from src.non_ui_components.macos_services import register_open_in_cleanfinder_service
-from src.ui_components.misc_widgets.menu_bar import populate_menubar_and_connect_triggers
-from src.shared.vars import conf_manager as conf, threads_server, logger as logger
-from src.installation import InstallationUiWidget
-from src.profiling import start_profiling, stop_profiling
+# The "contains text" search runs in worker processes which are spawned, so each one runs this
+# module again (as '__mp_main__'): the UI is only imported (and set up) by the app process.
+if __name__ == '__main__':
+    # Needed for the frozen app bundle, before anything heavy is imported
+    multiprocessing.freeze_support()
+
+    if not os.path.exists(os.path.join(os.getcwd(), 'results')):
+        os.mkdir(os.path.join(os.getcwd(), 'results'))
+    if not os.path.exists(os.path.join(os.getcwd(), 'results', 'icons')):
+        os.mkdir(os.path.join(os.getcwd(), 'results', 'icons'))
+    if not os.path.exists(os.path.join(os.getcwd(), 'results', 'log.log')):
+        open(os.path.join(os.getcwd(), 'results', 'log.log'), 'a').close()
+
+    import sys
+    from PySide6 import QtWidgets
+
+    from src.non_ui_components.servers import ThreadsUiServer
+    from src.non_ui_components.uis_manager import UiWindowManager
+    from src.non_ui_components.macos_services import register_open_in_cleanfinder_service
+    from src.ui_components.misc_widgets.menu_bar import populate_menubar_and_connect_triggers
+    from src.shared.vars import conf_manager as conf, threads_server, logger as logger
+    from src.installation import InstallationUiWidget
+    from src.profiling import start_profiling, stop_profiling
 
 
 def enforce_should_reset_file_exists(should_reset_file_path: str):
@@ -1,12 +1,15 @@
+import numpy as np
 import pandas as pd
 
 from PySide6 import QtCore, QtGui
 from PySide6.QtGui import QFont, QColor
-from PySide6.QtCore import QAbstractTableModel, Qt
+from PySide6.QtCore import QAbstractTableModel, Qt, QModelIndex
 from PySide6.QtWidgets import QListView
 
-from src.utils.os_utils import get_icon_names, get_dataframe_of_file_names_in_directory, is_dir
+from src.utils.os_utils import get_icon_names, get_dataframe_of_file_names_in_directory, is_dir, \
+    get_dataframe_of_items_in_directory, size_bytes_to_string
 from src.utils.utils import get_full_icon_path
+from src.utils.file_explorer_utils import SavedSearchRefreshThread
 
 from src.shared.vars import conf_manager as conf
 from src.non_ui_components.configurations_manager import is_string_rgb
@@ -16,6 +19,7 @@ import time
 
 
 class PandasModelBase(QtCore.QAbstractTableModel):
+    saved_search_refreshed = QtCore.Signal()
 
     def __init__(self, datapath=None,
                  data=None,
@@ -47,6 +51,11 @@ class PandasModelBase(QtCore.QAbstractTableModel):
         self.cut_items = []
         self.cut_items_path = ''
         self.allow_decoration_role = True
+        # When set, the model shows this SavedSearch's results (a virtual folder) rather
+        # than the contents of self._path (which is then the search's root)
+        self.saved_search = None
+        self._saved_search_refreshing = False
+        self._saved_search_refresh_pending = False
 
     @property
     def path(self):
@@ -169,6 +178,19 @@ class PandasModelBase(QtCore.QAbstractTableModel):
         self._data.reset_index(drop=True, inplace=True)
         self.endResetModel()
 
+    # Removes the rows of deleted items, a run of adjacent rows at a time, without
+    # re-listing the folder
+    def remove_items(self, item_names: list[str]):
+        rows = list(np.where(self._data.iloc[:, conf.FILENAME_COLUMN_INDEX].isin(item_names))[0])
+        while len(rows) > 0:
+            last = first = rows.pop()
+            while len(rows) > 0 and rows[-1] == first - 1:
+                first = rows.pop()
+            self.beginRemoveRows(QModelIndex(), first, last)
+            self._data = pd.concat([self._data.iloc[:first], self._data.iloc[last + 1:]])
+            self.endRemoveRows()
+        self._data.reset_index(drop=True, inplace=True)
+
     def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
         if value is not None and role == Qt.ItemDataRole.EditRole:
             self._data.iloc[index.row(), 0] = value
@@ -187,6 +209,18 @@ class PandasModelBase(QtCore.QAbstractTableModel):
         self._data.reset_index(drop=True, inplace=True)
         self.layoutChanged.emit()
 
+    # Fills in a folder's Size (and size_raw, so sorting by size works) once it's computed
+    def update_folder_size(self, item_name: str, size_bytes: int):
+        rows = self._data.index[self._data.iloc[:, conf.FILENAME_COLUMN_INDEX] == item_name]
+        if len(rows) == 0:
+            return
+        row = self._data.index.get_loc(rows[0])
+        size_col = self._data.columns.get_loc('Size')
+        self._data.iat[row, size_col] = size_bytes_to_string(size_bytes)
+        self._data.iat[row, self._data.columns.get_loc('size_raw')] = size_bytes
+        index = self.index(row, size_col)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole])
+
     def update_item(self, row, column, new_value):
         index = self.index(row, column)
         self.setData(index, new_value, Qt.ItemDataRole.EditRole)
@@ -195,7 +229,36 @@ class PandasModelBase(QtCore.QAbstractTableModel):
 
     # Notify about structure changes (e.g., rows/columns added or removed)
     def refresh_data(self):
-        newdata = get_dataframe_of_file_names_in_directory(self._path)
+        if self.saved_search is not None:
+            self.refresh_saved_search()
+        else:
+            self._replace_data(get_dataframe_of_file_names_in_directory(self._path))
+
+    # A saved search is refreshed on a worker thread (it walks its whole tree the first time);
+    # a refresh asked for while one is running is done once it's over
+    def refresh_saved_search(self):
+        if self._saved_search_refreshing:
+            self._saved_search_refresh_pending = True
+            return
+        self._saved_search_refreshing = True
+        # Parented to the model so it isn't destroyed while still running
+        refresh_thread = SavedSearchRefreshThread(self.saved_search, parent=self)
+        refresh_thread.refreshed.connect(self._saved_search_refreshed)
+        refresh_thread.finished.connect(refresh_thread.deleteLater)
+        refresh_thread.start()
+
+    def _saved_search_refreshed(self, saved_search, results: list):
+        self._saved_search_refreshing = False
+        # Ignored if another folder (or saved search) was opened meanwhile
+        if saved_search is self.saved_search:
+            self._replace_data(get_dataframe_of_items_in_directory(self._path, results))
+            self.saved_search_refreshed.emit()
+        if self._saved_search_refresh_pending:
+            self._saved_search_refresh_pending = False
+            if self.saved_search is not None:
+                self.refresh_saved_search()
+
+    def _replace_data(self, newdata: pd.DataFrame):
         if self.sorted:
             self.enforce_sorting(newdata)
         if newdata.equals(self._data):
@@ -320,8 +383,28 @@ class SimplePandasModel(PandasModelBase):
         self.num_rows += 1
         self.endResetModel()
 
+    # Appends a batch of rows with a single insert notification (instead of a model reset per row)
+    def append_rows(self, rows: list[list]):
+        if not rows:
+            return
+        first_row = len(self._data)
+        self.beginInsertRows(QModelIndex(), first_row, first_row + len(rows) - 1)
+        new_rows = pd.DataFrame(rows, columns=self._data.columns)
+        self._data = new_rows if first_row == 0 else pd.concat([self._data, new_rows], ignore_index=True)
+        self.num_rows = len(self._data)
+        self.endInsertRows()
+
+    def replace_all_rows(self, rows: list[list]):
+        self.beginResetModel()
+        self._data = pd.DataFrame(rows, columns=self._data.columns)
+        self.num_rows = len(rows)
+        self.endResetModel()
+
     def clear_all_data(self):
+        self.beginResetModel()
         self._data = self._data.iloc[0:0, :]
+        self.num_rows = 0
+        self.endResetModel()
 
 
 class SimplePandasModel2(QAbstractTableModel):
@@ -3,6 +3,10 @@ import os.path
 import json
 import datetime
 from src.shared.locations import ICONS_DIR, BASE_ICONS_DIR
+from src.utils.prune_rules import PruneRules, DEFAULT_PRUNE_PATTERNS
+from src.utils.size_engine import SIZE_MODE_ALLOCATED, SIZE_MODE_APPARENT
+from src.utils.copy_engine import VERIFY_ALGORITHMS, VERIFY_SHA256, VERIFY_XXHASH, \
+    verify_algorithm_used
 
 
 def is_string_rgb(s):
@@ -218,6 +222,23 @@ class ConfigurationsManager:
         self.SHOW_FAVORITES_TITLE = self.config["SHOW_FAVORITES_TITLE"]
         # Dual-pane mode: two file-explorer panes side by side (applies to new windows)
         self.DUAL_PANE_MODE = self.config.get("DUAL_PANE_MODE", "N")
+        # Files larger than this are skipped by the "contains text" search
+        self.CONTENT_SEARCH_MAX_FILE_SIZE_MB = self.config.get("CONTENT_SEARCH_MAX_FILE_SIZE_MB", 100)
+        # Folders skipped by the recursive walkers (search, folder sizes, zipping)
+        self.PRUNE_PATTERNS = self.config.get("PRUNE_PATTERNS", DEFAULT_PRUNE_PATTERNS)
+        self.PRUNE_MAX_DEPTH = self.config.get("PRUNE_MAX_DEPTH", 0)    # 0 = unlimited
+        self.PRUNE_STAY_ON_FILESYSTEM = self.config.get("PRUNE_STAY_ON_FILESYSTEM", "N")
+        self.PRUNE_FOLLOW_SYMLINKS = self.config.get("PRUNE_FOLLOW_SYMLINKS", "N")
+        # Compute folder sizes in the background and show them in the Size column
+        self.SHOW_FOLDER_SIZES = self.config.get("SHOW_FOLDER_SIZES", "N")
+        # Folder sizes in the Size column are the space taken on disk rather than the sum
+        # of the files' sizes
+        self.FOLDER_SIZES_ON_DISK = self.config.get("FOLDER_SIZES_ON_DISK", "N")
+        # Hash pasted files while copying them and check each copy against its source
+        self.VERIFY_PASTES = self.config.get("VERIFY_PASTES", "N")
+        self.VERIFY_PASTES_HASH = self.config.get("VERIFY_PASTES_HASH", VERIFY_XXHASH)
+        # Permanent deletes move items to a staging folder at once, and purge them later
+        self.STAGE_PERMANENT_DELETES = self.config.get("STAGE_PERMANENT_DELETES", "Y")
 
 
     # Y/N features
@@ -254,6 +275,99 @@ class ConfigurationsManager:
         else:
             self._DUAL_PANE_MODE = False
 
+    @property
+    def PRUNE_STAY_ON_FILESYSTEM(self):
+        return self._PRUNE_STAY_ON_FILESYSTEM
+
+    @PRUNE_STAY_ON_FILESYSTEM.setter
+    def PRUNE_STAY_ON_FILESYSTEM(self, value):
+        if value in ['Y', 'y']:
+            self._PRUNE_STAY_ON_FILESYSTEM = True
+        else:
+            self._PRUNE_STAY_ON_FILESYSTEM = False
+
+    @property
+    def PRUNE_FOLLOW_SYMLINKS(self):
+        return self._PRUNE_FOLLOW_SYMLINKS
+
+    @PRUNE_FOLLOW_SYMLINKS.setter
+    def PRUNE_FOLLOW_SYMLINKS(self, value):
+        if value in ['Y', 'y']:
+            self._PRUNE_FOLLOW_SYMLINKS = True
+        else:
+            self._PRUNE_FOLLOW_SYMLINKS = False
+
+    @property
+    def SHOW_FOLDER_SIZES(self):
+        return self._SHOW_FOLDER_SIZES
+
+    @SHOW_FOLDER_SIZES.setter
+    def SHOW_FOLDER_SIZES(self, value):
+        if value in ['Y', 'y']:
+            self._SHOW_FOLDER_SIZES = True
+        else:
+            self._SHOW_FOLDER_SIZES = False
+
+    @property
+    def FOLDER_SIZES_ON_DISK(self):
+        return self._FOLDER_SIZES_ON_DISK
+
+    @FOLDER_SIZES_ON_DISK.setter
+    def FOLDER_SIZES_ON_DISK(self, value):
+        if value in ['Y', 'y']:
+            self._FOLDER_SIZES_ON_DISK = True
+        else:
+            self._FOLDER_SIZES_ON_DISK = False
+
+    @property
+    def size_mode(self) -> str:
+        return SIZE_MODE_ALLOCATED if self.FOLDER_SIZES_ON_DISK else SIZE_MODE_APPARENT
+
+    @property
+    def VERIFY_PASTES(self):
+        return self._VERIFY_PASTES
+
+    @VERIFY_PASTES.setter
+    def VERIFY_PASTES(self, value):
+        if value in ['Y', 'y']:
+            self._VERIFY_PASTES = True
+        else:
+            self._VERIFY_PASTES = False
+
+    @property
+    def STAGE_PERMANENT_DELETES(self):
+        return self._STAGE_PERMANENT_DELETES
+
+    @STAGE_PERMANENT_DELETES.setter
+    def STAGE_PERMANENT_DELETES(self, value):
+        if value in ['Y', 'y']:
+            self._STAGE_PERMANENT_DELETES = True
+        else:
+            self._STAGE_PERMANENT_DELETES = False
+
+    @property
+    def verify_algorithm(self):
+        # For CopyEngine(verify=...): None when pastes aren't verified, otherwise the hash
+        # actually used (sha256 for xxh3 when the xxhash package is missing)
+        if not self.VERIFY_PASTES:
+            return None
+        return verify_algorithm_used(self.VERIFY_PASTES_HASH) \
+            if self.VERIFY_PASTES_HASH in VERIFY_ALGORITHMS else VERIFY_SHA256
+
+    @property
+    def prune_rules(self) -> PruneRules:
+        return PruneRules(patterns=self.PRUNE_PATTERNS,
+                          max_depth=int(self.PRUNE_MAX_DEPTH) or None,
+                          stay_on_filesystem=self.PRUNE_STAY_ON_FILESYSTEM,
+                          follow_symlinks=self.PRUNE_FOLLOW_SYMLINKS)
+
+    @property
+    def full_tree_prune_rules(self) -> PruneRules:
+        # For the walks which must see every item (sizes, zipping): the name patterns, max
+        # depth and staying on one disk are search filters, so only the loop protection is
+        # kept - a size or a zip is never silently partial
+        return PruneRules(patterns=[], follow_symlinks=self.PRUNE_FOLLOW_SYMLINKS)
+
     @property
     def SHOW_HIDDEN_ITEMS(self):
         return self._SHOW_HIDDEN_ITEMS
@@ -297,6 +411,16 @@ class ConfigurationsManager:
             "FOLDERS_ALWAYS_ABOVE_FILES": "Y",
             "SHOW_HIDDEN_ITEMS": "N",
             "DUAL_PANE_MODE": "N",
+            "CONTENT_SEARCH_MAX_FILE_SIZE_MB": 100,
+            "PRUNE_PATTERNS": DEFAULT_PRUNE_PATTERNS,
+            "PRUNE_MAX_DEPTH": 0,
+            "PRUNE_STAY_ON_FILESYSTEM": "N",
+            "PRUNE_FOLLOW_SYMLINKS": "N",
+            "SHOW_FOLDER_SIZES": "N",
+            "FOLDER_SIZES_ON_DISK": "N",
+            "VERIFY_PASTES": "N",
+            "VERIFY_PASTES_HASH": VERIFY_XXHASH,
+            "STAGE_PERMANENT_DELETES": "Y",
             "scrollbar": {
                 "SCROLLBAR_COLOR": "rgb(200, 207, 210)",
                 "SCROLLBAR_BACKGROUND_COLOR": "rgb(250, 250, 250)",
@@ -531,9 +655,14 @@ class ConfigurationsManager:
                 pass
         elif att in ['FILE_EXPLORER_SHOW_ROW_NUMBERS', 'FILE_EXPLORER_ALTERNATING_ROW_COLORS',
                      'FOLDERS_ALWAYS_ABOVE_FILES', 'SHOW_HIDDEN_ITEMS', 'SHOW_FAVORITES_TITLE',
-                     'DUAL_PANE_MODE']:
+                     'DUAL_PANE_MODE', 'PRUNE_STAY_ON_FILESYSTEM', 'PRUNE_FOLLOW_SYMLINKS',
+                     'SHOW_FOLDER_SIZES', 'FOLDER_SIZES_ON_DISK', 'VERIFY_PASTES',
+                     'STAGE_PERMANENT_DELETES']:
             if new_att_value not in ['Y', 'y', 'N', 'n']:
                 pass
+        elif att == 'VERIFY_PASTES_HASH':
+            if new_att_value not in VERIFY_ALGORITHMS:
+                pass
         elif att == 'DATE_FORMAT':
             try:
                 datetime.datetime.today().strftime(str(new_att_value))
@@ -603,6 +732,14 @@ class ConfigurationsManager:
             {"config_keys_path": ["FOLDERS_ALWAYS_ABOVE_FILES"], "display_text": "Alywas show folders above files"},
             {"config_keys_path": ["SHOW_FAVORITES_TITLE"], "display_text": "Show bookmarks title row"},
             {"config_keys_path": ["DUAL_PANE_MODE"], "display_text": "Dual pane mode - two panes side by side (Y/N, applies to new windows)"},
+            {"config_keys_path": ["SHOW_FOLDER_SIZES"], "display_text": "Calculate folder sizes in the background (Y/N)"},
+            {"config_keys_path": ["FOLDER_SIZES_ON_DISK"], "display_text": "Folder sizes show the space taken on disk (Y/N)"},
+            {"config_keys_path": ["VERIFY_PASTES"], "display_text": "Verify pasted files against their source (Y/N; copies are read back, usually from memory rather than the disk)"},
+            {"config_keys_path": ["VERIFY_PASTES_HASH"], "display_text": f"Hash used to verify pastes (xxh3 / sha256; xxh3 needs the xxhash package - using {verify_algorithm_used(self.VERIFY_PASTES_HASH)})"},
+            {"config_keys_path": ["STAGE_PERMANENT_DELETES"], "display_text": "Permanent deletes can be undone for 5 minutes (Y/N)"},
+            {"config_keys_path": ["PRUNE_MAX_DEPTH"], "display_text": "Max folder depth for searches (0 = unlimited)"},
+            {"config_keys_path": ["PRUNE_STAY_ON_FILESYSTEM"], "display_text": "Searches stay on the same disk (Y/N)"},
+            {"config_keys_path": ["PRUNE_FOLLOW_SYMLINKS"], "display_text": "Searches, sizes and zips follow symlinked folders (Y/N)"},
 
 
             {"config_keys_path": ["fonts", "TEXT_FONT"], "display_text": "Font"},
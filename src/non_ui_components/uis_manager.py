@@ -3,14 +3,20 @@ import os
 import pickle
 import numpy as np
 
-from PySide6.QtCore import Qt, QTimer
+from PySide6.QtCore import Qt, QTimer, QThread
 from PySide6.QtWidgets import QMainWindow
-from src.shared.locations import SYSTEM_ROOT_DIR, RESULTS_PATH
-from src.shared.vars import conf_manager as conf, logger as logger
+from src.shared.locations import SYSTEM_ROOT_DIR, RESULTS_PATH, FOLDER_SIZE_CACHE_PATH, \
+    STAGED_DELETES_PATH
+from src.shared.vars import conf_manager as conf, logger as logger, folder_size_cache
 from src.utils.os_utils import get_clipboard_copied_files_paths, extract_filename_from_path, \
-    get_all_items_in_path, extract_parent_path_from_path, dir_
-from src.utils.pasting_items import TableWithRadioButtons, PastingManager
-from src.non_ui_components.user_actions import UserActionsManager
+    extract_parent_path_from_path, dir_, beautify_bytes_size
+from src.utils.pasting_items import TableWithRadioButtons, PastingManager, PastePlanner
+from src.utils.paste_planner import PastePlan
+from src.ui_components.misc_widgets.dialogs_and_messages import prompt_message
+from src.non_ui_components.user_actions import UserActionsManager, UserAction_StagedDelete
+from src.utils.staged_deletion import StagedDeletions, StagedItem
+from src.utils.file_explorer_utils import StagedPurgeThread
+from src.utils.saved_searches import SavedSearch, load_saved_searches, save_saved_searches
 from src.ui_components.ui import ui
 
 
@@ -19,6 +25,9 @@ class PastingDelegate:
         self.ui_manager = ui_manager
         self.thread_runners = []
         self.pasting_manager = PastingManager(caller=self.ui_manager)
+        # Once the app is up, offer to resume pastes interrupted by the last quit (or a crash)
+        QTimer.singleShot(0, lambda: self.pasting_manager.resume_interrupted_pastes(
+            when_done=self.ui_manager.refresh_all_uis))
 
     def paste_items_from_clipboard(self, dest_path: str, delete_source_after_paste: bool):
         copied_file_paths = get_clipboard_copied_files_paths()
@@ -29,6 +38,26 @@ class PastingDelegate:
 
     def paste_items(self, dest_path: str, copied_file_paths, delete_source_after_paste: bool,
                     rename_item_names_in_dest: list[tuple[str, str]] = []):
+        # Plan the paste first (sizes, conflicts at every level, free space), in the background;
+        # it can be cancelled while the items are scanned
+        planner = PastePlanner(
+            copied_file_paths, dest_path, delete_source_after_paste,
+            when_planned=lambda plan: self.paste_planned_items(plan, copied_file_paths,
+                                                               delete_source_after_paste,
+                                                               rename_item_names_in_dest))
+        planner.finished.connect(lambda: self.thread_runners.remove(planner))
+        self.thread_runners.append(planner)
+        planner.run()
+
+    def paste_planned_items(self, plan: PastePlan, copied_file_paths, delete_source_after_paste: bool,
+                            rename_item_names_in_dest: list[tuple[str, str]] = []):
+        dest_path = plan.dest_path
+        if not plan.has_enough_space:
+            logger.info(f"Not enough space in {dest_path}")
+            prompt_message("Not enough space",
+                           f"Pasting needs {beautify_bytes_size(plan.required_bytes)[2]}, but only "
+                           f"{beautify_bytes_size(plan.free_bytes)[2]} are free in {dest_path}")
+            return
         source_path = extract_parent_path_from_path(copied_file_paths[0])
         logger.info(f"paste_items --> source_path = {source_path}, dest_path = {dest_path}")
         if source_path == dest_path:
@@ -37,30 +66,26 @@ class PastingDelegate:
             self.paste_items_via_thread(
                 copied_file_paths, dest_path, delete_source_after_paste,
                 item_names_to_keep_both=[extract_filename_from_path(f) for f in copied_file_paths],
-                rename_item_names_in_dest=rename_item_names_in_dest)
+                rename_item_names_in_dest=rename_item_names_in_dest, plan=plan)
         else:
-            conflicting_items = self.get_pasting_conflicts(dest_path, copied_file_paths)
+            conflicting_items = plan.conflicting_names
             if len(conflicting_items) > 0:
                 logger.info("has conflicts")
                 self.tbl = TableWithRadioButtons(self, dest_path, conflicting_items,
-                                                 copied_file_paths, delete_source_after_paste)
+                                                 copied_file_paths, delete_source_after_paste, plan)
                 self.tbl.show()
             else:
                 logger.info("No conflicts")
                 self.paste_items_via_thread(
                     copied_file_paths, dest_path, delete_source_after_paste,
-                    rename_item_names_in_dest = rename_item_names_in_dest)
-
-    def get_pasting_conflicts(self, dest_path: str, copied_file_paths: list[str]):
-        items_in_dest = get_all_items_in_path(dest_path)
-        items_to_paste = [os.path.basename(x) for x in copied_file_paths]
-        return [x for x in items_to_paste if x in items_in_dest]
+                    rename_item_names_in_dest = rename_item_names_in_dest, plan=plan)
 
     def paste_items_via_thread(self, copied_file_paths: list[str],
                                dest_path: str,
                                delete_source_after_paste: bool,
                                rename_item_names_in_dest: list[tuple[str, str]] = [],
-                               item_names_to_keep_both: list[str] = []):
+                               item_names_to_keep_both: list[str] = [],
+                               plan: PastePlan = None):
         if len(copied_file_paths) == 0:
             return
 
@@ -86,6 +111,7 @@ class PastingDelegate:
                                    delete_source_after_paste=delete_source_after_paste,
                                    when_done=self.ui_manager.refresh_all_uis,
                                    source_dest_pairs=source_dest_pairs,
+                                   plan=plan,
                                    )
 
     def safetly_kill_all_threads(self):
@@ -100,6 +126,10 @@ class UiWindowManager(QMainWindow):
         self._cut_items_path = ''
         self.historical_actions = UserActionsManager()
         self.pasting_delegate = PastingDelegate(self)
+        # Permanently deleted items are staged first, and purged in the background
+        self.staged_deletions = StagedDeletions(STAGED_DELETES_PATH)
+        self.purge_thread = StagedPurgeThread(self.staged_deletions)
+        self.purge_thread.start(QThread.Priority.LowestPriority)
 
         is_ascending_per_col = {}
         for k in conf.get(['sorting', 'is_ascending_per_col']).keys():
@@ -112,6 +142,17 @@ class UiWindowManager(QMainWindow):
             self.get_columns_sorting_scheme_per_path(
                 os.path.join(RESULTS_PATH, 'columns_sorting_scheme_per_path')
             )
+        self.saved_searches = load_saved_searches(os.path.join(RESULTS_PATH, 'saved_searches'))
+
+    def add_saved_search(self, saved_search: SavedSearch):
+        logger.info(f"UiWindowManager.add_saved_search: {saved_search.name}")
+        self.saved_searches[saved_search.name] = saved_search
+        self.save_saved_searches(RESULTS_PATH)
+
+    # Also keeps the saved searches' caches, so re-opening them later stays incremental
+    def save_saved_searches(self, path: str):
+        if os.path.exists(path):
+            save_saved_searches(os.path.join(path, 'saved_searches'), self.saved_searches)
 
     def save_columns_sorting_scheme_per_path(self, path: str):
         if (os.path.exists(path)
@@ -146,6 +187,40 @@ class UiWindowManager(QMainWindow):
             for t in w.all_tables():
                 t._refresh_source_data()
 
+    def remove_deleted_items_from_uis(self, paths: list[str]):
+        # Tables showing the deleted items' folders lose their rows; only tables inside a
+        # deleted folder, or showing a saved search, are re-listed
+        names_per_folder = {}
+        for path in paths:
+            names_per_folder.setdefault(os.path.dirname(path), []).append(os.path.basename(path))
+        for w in self.windows:
+            for t in w.all_tables():
+                if t.pandasModel.saved_search is not None or \
+                        any(t.path == p or t.path.startswith(p + os.sep) for p in paths):
+                    t._refresh_source_data()
+                elif t.path in names_per_folder:
+                    t.remove_rows_of_items(names_per_folder[t.path])
+
+    def stage_items_for_deletion(self, paths: list[str]) -> tuple[list[StagedItem], list[tuple[str, str]]]:
+        # Each item is renamed into a staging folder - instant - and purged later
+        staged_items, errors = self.staged_deletions.stage(paths)
+        self.purge_thread.add(staged_items)
+        self.remove_deleted_items_from_uis([item.original_path for item in staged_items])
+        return staged_items, errors
+
+    def delete_items_staged(self, paths: list[str]) -> list[tuple[str, str]]:
+        """Permanently delete `paths` by staging them (undoable until they're purged).
+        Returns the (path, error message) of the items which couldn't be staged."""
+        staged_items, errors = self.stage_items_for_deletion(paths)
+        if len(staged_items) > 0:
+            self.keep_last_action(UserAction_StagedDelete(staged_items, self))
+        return errors
+
+    def restore_staged_items(self, staged_items: list[StagedItem]) -> list[StagedItem]:
+        restored_items = [item for item in staged_items if self.staged_deletions.restore(item)]
+        self.refresh_all_uis()
+        return restored_items
+
     def reload_keyboard_shortcuts(self):
         for w in self.windows:
             w.reload_keyboard_shortcuts()
@@ -322,6 +397,10 @@ class UiWindowManager(QMainWindow):
         self.windows = [w for w in self.windows if id(w) != id(ui)]
         if len(self.windows) == 0:
             self.pasting_delegate.safetly_kill_all_threads()
+            self.purge_thread.stop()
+            self.purge_thread.wait()
             conf.save_config_to_file()
             self.save_columns_sorting_scheme_per_path(RESULTS_PATH)
+            self.save_saved_searches(RESULTS_PATH)
+            folder_size_cache.save(FOLDER_SIZE_CACHE_PATH)
             print("Bye bye")
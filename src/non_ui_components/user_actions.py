@@ -193,6 +193,26 @@ class UserAction_CopyPasteItemsUsingThread(UserAction):
 
 
 
+class UserAction_StagedDelete(UserAction):
+    """A permanent delete whose items are still staged (see staged_deletion): undone by
+    renaming them back, as long as they weren't purged yet."""
+    def __init__(self, staged_items, uis_manager):
+        super().__init__('staged_delete')
+        self.staged_items = staged_items
+        self.uis_manager = uis_manager
+
+    def undo(self):
+        restored_items = self.uis_manager.restore_staged_items(self.staged_items)
+        if len(restored_items) < len(self.staged_items):
+            print("Some items were already purged, or their name is taken")
+
+    def redo(self):
+        paths = [item.original_path for item in self.staged_items
+                 if os.path.lexists(item.original_path)]
+        self.staged_items, _ = self.uis_manager.stage_items_for_deletion(paths)
+
+
+
 # class UserAction_RenameItem(UserAction):
 #     def __init__(self, path: str, prev_to_new_name_map: tuple[str, str]):
 #         super().__init__('Rename_item')
@@ -31,6 +31,9 @@ CONFIG_FILE_PATH = os.path.join(RESOURCES_PATH, 'config.json')
 DRAGGING_ICON = os.path.join(ICONS_DIR, '_dragged_items_.png')
 EXT_AND_ICONS_DF_PATH = os.path.join(RESULTS_PATH, 'usable_extensions_and_icons_df')
 LOG_FILE_PATH = os.path.join(RESULTS_PATH, 'log.log')
+FOLDER_SIZE_CACHE_PATH = os.path.join(RESULTS_PATH, 'folder_size_cache')
+PASTE_JOURNALS_PATH = os.path.join(RESULTS_PATH, 'paste_journals')
+STAGED_DELETES_PATH = os.path.join(RESULTS_PATH, 'staged_deletes')
 APPLICATION_DIRECTORIES = ['/Applications',
                            '/System/Applications',
                            '/System/Library/CoreServices/Applications']
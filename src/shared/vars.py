@@ -10,6 +10,10 @@ conf_manager = ConfigurationsManager(locations.CONFIG_FILE_PATH)
 from src.non_ui_components.extensions_to_icons_mapper import ExtensionsToIconsMapper
 extensions_to_icons_mapper = ExtensionsToIconsMapper(locations.EXT_AND_ICONS_DF_PATH)
 
+from src.utils.size_engine import FolderSizeCache
+# Shared by every folder-size calculation; saved when the last window closes
+folder_size_cache = FolderSizeCache.load(locations.FOLDER_SIZE_CACHE_PATH)
+
 
 logging.basicConfig(
     level=logging.DEBUG,
@@ -11,6 +11,7 @@ from PySide6.QtWidgets import (QApplication, QTableView, QAbstractItemView, QMes
                                QScrollBar, QHeaderView)
 from src.ui_components.misc_widgets.properties_window import (PropertiesWindowSingleItem,
                                                               PropertiesWindowMultipleItems)
+from src.ui_components.misc_widgets.disk_usage_window import DiskUsageWindow
 from src.ui_components.misc_widgets.dialogs_and_messages import QDialogFreeTextButtons, \
     message_box_w_arrow_keys_enabled, prompt_message
 from src.ui_components.misc_widgets.misc_widgets import QFileDialogWithCheckbox
@@ -23,13 +24,16 @@ from src.utils.os_utils import (get_item_date_modified, get_dataframe_of_file_na
                                 extract_extension_from_path, extract_filename_from_path, is_root,
                                 save_app_icon_in_app_icons_dir, open_path_in_terminal, show_in_finder, dir_,
                                 create_file, increment_max_item_name, get_all_item_names_in_directory,
-                                get_type_as_icon_string, get_file_type, size_bytes_to_string)
+                                get_type_as_icon_string, get_file_type, size_bytes_to_string,
+                                get_dataframe_of_items_in_directory)
 from src.utils.utils import SinglePathQFileSystemWatcherWithContextManager, single_run_qtimer, \
     map_key_to_new_row_num, create_qaction_key_sequence, \
     update_type_ahead_buffer, compute_type_ahead_target
-from src.utils.file_explorer_utils import DeletionThread, MyStyledItem, ReplaceTextInSelectedItems,\
+from src.utils.size_engine import nearest_first
+from src.utils.file_explorer_utils import ItemsDeleter, MyStyledItem, ReplaceTextInSelectedItems,\
     next_new_dir_name, paths_history, ItemsZipper, map_shortcut_name_to_func, RowSelectionExtender,\
-     PrefixSuffixChangeInSelectedItems, validate_name_change_is_approved
+     PrefixSuffixChangeInSelectedItems, validate_name_change_is_approved, FolderSizesThread, \
+    release_stopping_thread
 from src.ui_components.misc_widgets.context_menu import ContextMenuDelegate
 from src.shared.vars import threads_server
 
@@ -73,6 +77,10 @@ class FileExplorerTable(QTableView):
         self.row_selection_extender = RowSelectionExtender(self)  # When user presses Shift+Up/Down
         self.deletion_threads = []
         self.zipping_threads = []
+        self.folder_sizes_thread = None
+        # Folder name -> (size, folder mtime_ns) computed for `known_folder_sizes_key`
+        self.known_folder_sizes = {}
+        self.known_folder_sizes_key = None
         self.user_communications_ui = threads_server['s1']
         self.cols_to_hide = [4, 5, 6, 7, 8, 9]
 
@@ -82,6 +90,8 @@ class FileExplorerTable(QTableView):
         """
         self.pandasModel = data_model
         self.setModel(self.pandasModel)
+        self.pandasModel.saved_search_refreshed.connect(self.watch_saved_search_directories)
+        self.pandasModel.saved_search_refreshed.connect(self.start_folder_sizes_calculation)
         self.make_cut_items_greyed_out()
         self.num_columns = self.source_data.shape[1]
 
@@ -121,6 +131,7 @@ class FileExplorerTable(QTableView):
         self.horizontalHeader().sectionResized.connect(self.update_structure_changed)
         self._set_cols_widths()
         self.set_scrollbars()
+        self.vertical_scrollbar.valueChanged.connect(self.update_folder_sizes_order)
 
 
         """
@@ -132,6 +143,7 @@ class FileExplorerTable(QTableView):
         # and only re-adds actions on each right-click. See ContextMenuDelegate.
         self.context_menu_delegate = ContextMenuDelegate(self)
         self.properties_dialog_boxes = []
+        self.disk_usage_windows = []
 
 
         """
@@ -152,6 +164,7 @@ class FileExplorerTable(QTableView):
 
         # Track changes in the file system
         self.connect_filesystem_watcher()
+        self.start_folder_sizes_calculation()
 
 
     @property
@@ -655,12 +668,30 @@ class FileExplorerTable(QTableView):
             self.cancel_cut_items()
             paths = self._extract_full_paths_from_indices(self.selectedIndexes())
             self.browsing_history_manager.remove_paths_and_subpaths_from_history(paths)
-            deletion_thread = DeletionThread(paths, permanently)
-            self.deletion_threads.append(deletion_thread)
-            deletion_thread.start()
             self.encompassing_uis_manager.remove_paths_and_subpaths_from_browsing_histories(paths)
-            self.deletion_timer = \
-                single_run_qtimer(200, lambda: self.encompassing_uis_manager.refresh_all_uis())
+            if permanently and conf.STAGE_PERMANENT_DELETES:
+                # Staged (renamed away at once, purged later); the items which can't be
+                # are deleted the regular way
+                errors = self.encompassing_uis_manager.delete_items_staged(paths)
+                paths = [path for path, _ in errors]
+                if len(paths) == 0:
+                    return
+            items_deleter = ItemsDeleter(paths, permanently, when_done=self.items_deleted)
+            self.deletion_threads.append(items_deleter)
+            items_deleter.run()
+
+    def items_deleted(self, deleted_paths: list[str], errors: list[tuple[str, str]]):
+        # Only the rows of the deleted items are removed, rather than every table re-listed
+        self.encompassing_uis_manager.remove_deleted_items_from_uis(deleted_paths)
+        if len(errors) > 0:
+            lines = [f"{extract_filename_from_path(path)}: {error}" for path, error in errors[:10]]
+            if len(errors) > 10:
+                lines.append(f"... and {len(errors) - 10} more")
+            prompt_message(f"{len(errors)} items could not be deleted", "\n".join(lines))
+
+    def remove_rows_of_items(self, item_names: list[str]):
+        with self.watcher:  # Temporarily disable files watcher
+            self.pandasModel.remove_items(item_names)
 
 
     def remove_items(self):
@@ -687,6 +718,18 @@ class FileExplorerTable(QTableView):
         except:
             pass
 
+    def open_disk_usage(self):
+        # Of the selected folder, or of the current folder when no (single) folder is selected
+        self.disk_usage_windows = [window for window in self.disk_usage_windows
+                                   if window.is_currently_presented]
+        folder_path = self.path
+        items_paths = self._extract_full_paths_from_indices(self.selectedIndexes())
+        if len(items_paths) == 1 and os.path.isdir(items_paths[0]):
+            folder_path = items_paths[0]
+        disk_usage_window = DiskUsageWindow(folder_path, self)
+        disk_usage_window.show()
+        self.disk_usage_windows.append(disk_usage_window)
+
 
     def keep_selection_as_prev(self, indices: list[QtCore.QModelIndex]):
         if len(indices) > 0:  # Something was already selected
@@ -701,11 +744,13 @@ class FileExplorerTable(QTableView):
                     reset_tree_selection: bool = True,
                     selected_path_after_change: str = None):
 
-        if new_path == self.browsing_history_manager.curr_path():
+        if new_path == self.browsing_history_manager.curr_path() and \
+                self.pandasModel.saved_search is None:
             return 1
 
         logger.info(f"Changing path from {self.path} to {new_path}")
 
+        self.pandasModel.saved_search = None
         self.pandasModel.replace_data_and_path(
             get_dataframe_of_file_names_in_directory(new_path), new_path,
             self.encompassing_uis_manager.get_columns_ordering_scheme(new_path))
@@ -728,8 +773,90 @@ class FileExplorerTable(QTableView):
             text = selected_path_after_change.split('/')[-1]
             self.select_row_where_item_text_is(text)
 
+        self.start_folder_sizes_calculation()
         return 1
 
+    """
+     Folder sizes (optional, computed in the background)
+    """
+    def start_folder_sizes_calculation(self):
+        if not conf.SHOW_FOLDER_SIZES:
+            self.stop_folder_sizes_calculation()
+            return
+        if self.known_folder_sizes_key != (self.path, conf.size_mode):
+            self.stop_folder_sizes_calculation()
+            self.known_folder_sizes = {}
+            self.known_folder_sizes_key = (self.path, conf.size_mode)
+        folder_names = self.source_data.loc[self.source_data['is_folder'].astype(bool),
+                                            conf.FILE_EXPLORER_FILENAME_COL_NAME].tolist()
+        # After a refresh, the sizes of the folders whose mtime didn't change are shown at
+        # once; only the others are (re)computed
+        folders_to_compute = []
+        for name in folder_names:
+            known = self.known_folder_sizes.get(name)
+            try:
+                mtime_ns = os.stat(os.path.join(self.path, name)).st_mtime_ns
+            except OSError:
+                continue
+            if known is not None and known[1] == mtime_ns:
+                self.pandasModel.update_folder_size(name, known[0])
+            else:
+                folders_to_compute.append(name)
+        if len(folders_to_compute) == 0:
+            return
+        # A calculation still running for this folder takes them on rather than starting over
+        if self.folder_sizes_thread is not None and \
+                self.folder_sizes_thread.add_folders(folders_to_compute):
+            self.update_folder_sizes_order()
+            return
+        self.stop_folder_sizes_calculation()
+        self.folder_sizes_thread = FolderSizesThread(self.path, folders_to_compute)
+        self.folder_sizes_thread.size_ready.connect(self.folder_size_ready)
+        self.update_folder_sizes_order()
+        self.folder_sizes_thread.start()
+
+    def folder_size_ready(self, item_name: str, size_bytes: int, mtime_ns: int):
+        self.known_folder_sizes[item_name] = (size_bytes, mtime_ns)
+        self.pandasModel.update_folder_size(item_name, size_bytes)
+
+    def update_folder_sizes_order(self, *args):
+        if self.folder_sizes_thread is None:
+            return
+        first_visible = max(self.rowAt(0), 0)
+        last_visible = self.rowAt(self.viewport().height() - 1)
+        if last_visible < 0:
+            last_visible = self.source_data.shape[0] - 1
+        self.folder_sizes_thread.set_order(
+            nearest_first(self.source_data.iloc[:, conf.FILENAME_COLUMN_INDEX].tolist(),
+                          first_visible, last_visible))
+
+    def stop_folder_sizes_calculation(self):
+        if self.folder_sizes_thread is not None:
+            self.folder_sizes_thread.size_ready.disconnect()
+            self.folder_sizes_thread.stop()
+            # Not waited for: it ends within the folder it's listing, then deletes itself
+            release_stopping_thread(self.folder_sizes_thread)
+            self.folder_sizes_thread = None
+
+
+    def open_saved_search(self, saved_search):
+        """Show a saved search as a virtual folder: its root is the model's path and the
+        results (paths relative to the root) are its rows. The cached results are shown at
+        once, then brought up to date incrementally."""
+        logger.info(f"Opening saved search {saved_search.name} ({saved_search.root})")
+        root = saved_search.root
+        self.pandasModel.saved_search = saved_search
+        self.pandasModel.replace_data_and_path(
+            get_dataframe_of_items_in_directory(root, saved_search.results), root,
+            self.encompassing_uis_manager.get_columns_ordering_scheme(root))
+        self.connect_filesystem_watcher()
+        self.encompassing_ui.path_changed(self, root, True)
+        self.browsing_history_manager.add_path(root)
+        self.browsing_history_manager.reset_head_to_current_path()
+        self.prev_selected_index = None
+        self.just_changed_path_flag = True
+        self.click_timer = single_run_qtimer(0, self._refresh_source_data)
+        return 1
 
     def create_new_dir(self):
         if not os.path.exists(self.path):
@@ -1156,6 +1283,7 @@ class FileExplorerTable(QTableView):
         logger.info("FileExplorerTable._refresh_source_data")
         with self.watcher:  # Temporarily disable files watcher
             self.pandasModel.refresh_data()
+        self.start_folder_sizes_calculation()
         # Select the item which was selected before the refresh
         if self.prev_selected_index is not None:
             row = self.prev_selected_index.row()
@@ -1213,8 +1341,22 @@ class FileExplorerTable(QTableView):
         else:
             return QSize(self.xdim, 681)
 
+    # A saved search also watches every folder it walked (a new match changes one of them);
+    # called again after each refresh, as the set of folders may have changed
+    def watch_saved_search_directories(self):
+        if self.pandasModel.saved_search is None:
+            return
+        # The root is watched (and unwatched) by the context manager
+        watched = set(self.watcher.directories()) - {self.watcher.path}
+        wanted = set(self.pandasModel.saved_search.watched_directories()) - {self.watcher.path}
+        if watched - wanted:
+            self.watcher.removePaths(list(watched - wanted))
+        if wanted - watched:
+            self.watcher.addPaths(list(wanted - watched))
+
     # Reacts to changes in the file system (e.g., renaming, deleting, etc.)
     def connect_filesystem_watcher(self):
         self.watcher = SinglePathQFileSystemWatcherWithContextManager(self.path)
+        self.watch_saved_search_directories()
         self.watcher.directoryChanged.connect(self._refresh_source_data)
         self.watcher.fileChanged.connect(self._refresh_source_data)
@@ -88,6 +88,8 @@ class ContextMenuDelegate:
                  "associated_method": self.file_exp_obj.open_path_in_terminal},
                 {"menu_item_name": "Show in Finder",
                  "associated_method": self.file_exp_obj.show_in_finder},
+                {"menu_item_name": "Disk usage",
+                 "associated_method": self.file_exp_obj.open_disk_usage},
                 ]
 
     @property
@@ -190,6 +192,9 @@ class ContextMenuDelegate:
                                      "associated_method": lambda: open_path_in_terminal(terminal_path)})
             actions_list.append({"menu_item_name": "Show in Finder",
                                  "associated_method": self.file_exp_obj.show_in_finder})
+            if len(items_list) == 1 and os.path.isdir(os.path.join(self.file_exp_obj.path, clicked_item_name)):
+                actions_list.append({"menu_item_name": "Disk usage",
+                                     "associated_method": self.file_exp_obj.open_disk_usage})
             actions_list.append({"menu_item_name": "Properties",
                                  "associated_method": self.file_exp_obj.open_properties})
             self.append_to_context_menu(menu, actions_list)
@@ -0,0 +1,233 @@
+from PySide6.QtWidgets import (QDialog, QDialogButtonBox, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+                               QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView,
+                               QSplitter, QWidget, QToolTip)
+from PySide6.QtCore import Signal, QThread, Qt, QTimer, QRectF
+from PySide6.QtGui import QPainter, QColor, QPen
+import os
+from src.utils.disk_usage import DiskUsageScan, DirNode, squarify
+from src.utils.os_utils import beautify_bytes_size, run_file_in_terminal
+from src.utils.size_engine import SizeSnapshot
+from src.shared.vars import conf_manager as conf
+
+
+# The list and the treemap are redrawn from the (growing) tree every REFRESH_INTERVAL_MS
+# while the scan runs
+REFRESH_INTERVAL_MS = 500
+# Entries beyond these are left out of the list / treemap (they'd be too small to see)
+MAX_LIST_ENTRIES = 500
+MAX_TREEMAP_ENTRIES = 200
+NUM_LARGEST_FILES = 16
+TREEMAP_FOLDER_COLOR = QColor(120, 160, 210)
+TREEMAP_FILE_COLOR = QColor(190, 200, 210)
+
+
+class DiskUsageScanThread(QThread):
+    """Runs a DiskUsageScan, emitting its running totals (a SizeSnapshot) every ~100 ms.
+    The prune patterns (node_modules, .git, ...) aren't applied: those are often the very
+    space hogs this view is for."""
+    progress = Signal(object)
+
+    def __init__(self, root_path: str):
+        super().__init__()
+        self.scan = DiskUsageScan(root_path, conf.full_tree_prune_rules, size_mode=conf.size_mode)
+
+    def run(self):
+        self.scan.run(on_progress=self.progress.emit)
+
+    def cancel(self):
+        self.scan.cancel()
+
+
+class TreemapWidget(QWidget):
+    """Draws a folder's entries as a squarified treemap; clicking a folder's rectangle
+    emits its node."""
+    folder_clicked = Signal(object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.entries = []
+        self.rects = []
+        self.setMinimumSize(200, 200)
+        self.setMouseTracking(True)
+
+    def set_entries(self, entries: list[tuple[int, str, DirNode]]):
+        self.entries = [entry for entry in entries[:MAX_TREEMAP_ENTRIES] if entry[0] > 0]
+        self._layout()
+        self.update()
+
+    def _layout(self):
+        self.rects = [QRectF(*rect) for rect in
+                      squarify([entry[0] for entry in self.entries], 0, 0, self.width(), self.height())]
+
+    def resizeEvent(self, event):
+        self._layout()
+        super().resizeEvent(event)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.setPen(QPen(Qt.GlobalColor.white, 1))
+        for (size, name, node), rect in zip(self.entries, self.rects):
+            painter.setBrush(TREEMAP_FOLDER_COLOR if node is not None else TREEMAP_FILE_COLOR)
+            painter.drawRect(rect)
+            if rect.width() > 40 and rect.height() > 16:
+                painter.drawText(rect.adjusted(3, 2, -3, -2),
+                                 Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop,
+                                 f"{name}\n{beautify_bytes_size(size)[2]}")
+        painter.end()
+
+    def _entry_at(self, pos):
+        for entry, rect in zip(self.entries, self.rects):
+            if rect.contains(pos):
+                return entry
+        return None
+
+    def mouseMoveEvent(self, event):
+        entry = self._entry_at(event.position())
+        if entry is not None:
+            QToolTip.showText(event.globalPosition().toPoint(),
+                              f"{entry[1]} - {beautify_bytes_size(entry[0])[2]}", self)
+
+    def mousePressEvent(self, event):
+        entry = self._entry_at(event.position())
+        if entry is not None and entry[2] is not None:
+            self.folder_clicked.emit(entry[2])
+
+
+class DiskUsageWindow(QDialog):
+    """
+    Shows where the space under a folder went: the current folder's entries largest first
+    (double-click a folder to drill into it), the same as a treemap, and the largest files
+    anywhere below it. The scan runs once, in the background; drilling down and going back
+    up only redisplays parts of the tree it builds.
+    """
+    def __init__(self, root_path: str, encompassing_obj=None):
+        super(DiskUsageWindow, self).__init__()
+        self.root_path = root_path
+        self.encompassing_obj = encompassing_obj
+        self.is_currently_presented = True
+        self.scan_thread = DiskUsageScanThread(root_path)
+        self.current_node = self.scan_thread.scan.root
+        self.current_entries = []
+        self.initUI()
+        self.scan_thread.progress.connect(self.update_scan_status)
+        self.refresh_timer = QTimer()
+        self.refresh_timer.timeout.connect(self.show_current_node)
+        self.refresh_timer.start(REFRESH_INTERVAL_MS)
+        self.scan_thread.start()
+
+    def initUI(self):
+        self.setWindowTitle('Disk usage - ' + os.path.basename(self.root_path.rstrip(os.sep)))
+        self.resize(900, 600)
+
+        self.up_button = QPushButton("Up")
+        self.up_button.clicked.connect(self.go_up)
+        self.path_label = QLabel("")
+        self.path_label.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+        self.top_layout = QHBoxLayout()
+        self.top_layout.addWidget(self.up_button)
+        self.top_layout.addWidget(self.path_label, 1)
+
+        self.entries_table = self._create_table(['Name', 'Size', '% of folder'])
+        self.entries_table.doubleClicked.connect(self.double_click_on_entry)
+        self.largest_files_table = self._create_table(['Largest files below', 'Size'])
+        self.largest_files_table.doubleClicked.connect(self.double_click_on_largest_file)
+        self.treemap = TreemapWidget()
+        self.treemap.folder_clicked.connect(self.drill_into)
+
+        self.lists_splitter = QSplitter(Qt.Orientation.Vertical)
+        self.lists_splitter.addWidget(self.entries_table)
+        self.lists_splitter.addWidget(self.largest_files_table)
+        self.splitter = QSplitter(Qt.Orientation.Horizontal)
+        self.splitter.addWidget(self.lists_splitter)
+        self.splitter.addWidget(self.treemap)
+        self.splitter.setSizes([400, 500])
+
+        self.status_label = QLabel("")
+
+        self.button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
+        self.button_box.rejected.connect(self.reject)
+
+        self.overall_layout = QVBoxLayout()
+        self.overall_layout.addLayout(self.top_layout)
+        self.overall_layout.addWidget(self.splitter, 1)
+        self.overall_layout.addWidget(self.status_label)
+        self.overall_layout.addWidget(self.button_box)
+        self.setLayout(self.overall_layout)
+
+    @staticmethod
+    def _create_table(column_names: list[str]) -> QTableWidget:
+        table = QTableWidget(0, len(column_names))
+        table.setHorizontalHeaderLabels(column_names)
+        table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        table.verticalHeader().setVisible(False)
+        table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        for column in range(1, len(column_names)):
+            table.horizontalHeader().setSectionResizeMode(column,
+                                                          QHeaderView.ResizeMode.ResizeToContents)
+        return table
+
+    def update_scan_status(self, snapshot: SizeSnapshot):
+        text = (f"{beautify_bytes_size(snapshot.bytes)[2]} in {snapshot.files:,} files, "
+                f"{snapshot.folders:,} folders")
+        if snapshot.errors > 0:
+            text += f" ({snapshot.errors:,} items could not be read)"
+        if not snapshot.finished:
+            text += "  - scanning..."
+        self.status_label.setText(text)
+        if snapshot.finished:
+            self.refresh_timer.stop()
+            self.show_current_node()
+
+    def show_current_node(self):
+        node = self.current_node
+        self.path_label.setText(node.path)
+        self.up_button.setEnabled(node.parent is not None)
+
+        # Read under the scan's lock, as the scan may still be filling the tree in
+        scan = self.scan_thread.scan
+        self.current_entries = scan.entries(node)[:MAX_LIST_ENTRIES]
+        self.entries_table.setRowCount(len(self.current_entries))
+        for row, (size, name, child) in enumerate(self.current_entries):
+            share = 100 * size / node.total_bytes if node.total_bytes > 0 else 0
+            self.entries_table.setItem(row, 0, QTableWidgetItem(name + (os.sep if child is not None else '')))
+            self.entries_table.setItem(row, 1, QTableWidgetItem(beautify_bytes_size(size)[2]))
+            self.entries_table.setItem(row, 2, QTableWidgetItem(f"{share:.1f}%"))
+        self.treemap.set_entries(self.current_entries)
+
+        largest_files = scan.largest_files_below(node, NUM_LARGEST_FILES)
+        self.largest_files_table.setRowCount(len(largest_files))
+        for row, (size, relative_path) in enumerate(largest_files):
+            self.largest_files_table.setItem(row, 0, QTableWidgetItem(relative_path))
+            self.largest_files_table.setItem(row, 1, QTableWidgetItem(beautify_bytes_size(size)[2]))
+
+    def drill_into(self, node: DirNode):
+        self.current_node = node
+        self.show_current_node()
+
+    def go_up(self):
+        if self.current_node.parent is not None:
+            self.drill_into(self.current_node.parent)
+
+    def double_click_on_entry(self, index):
+        if index.row() >= len(self.current_entries):
+            return
+        size, name, child = self.current_entries[index.row()]
+        if child is not None:
+            self.drill_into(child)
+        elif os.path.exists(os.path.join(self.current_node.path, name)):
+            run_file_in_terminal(os.path.join(self.current_node.path, name))
+
+    def double_click_on_largest_file(self, index):
+        relative_path = self.largest_files_table.item(index.row(), 0).text()
+        run_file_in_terminal(os.path.join(self.current_node.path, relative_path))
+
+    def kill_thread(self):
+        self.refresh_timer.stop()
+        self.scan_thread.cancel()
+        self.scan_thread.wait()
+
+    def reject(self):
+        self.kill_thread()
+        self.is_currently_presented = False
+        super(DiskUsageWindow, self).reject()
@@ -6,14 +6,16 @@ from PySide6.QtWidgets import (QTabWidget, QLabel, QPushButton, QVBoxLayout, QFi
                                QDialog, QDialogButtonBox, QLineEdit, QFrame)
 from PySide6.QtCore import Qt, QSize, QPoint
 from PySide6.QtGui import QIcon
-from src.utils.os_utils import (resize_and_save_png_file, get_item_size_pretty, get_file_apps_info,
+from src.utils.os_utils import (resize_and_save_png_file, get_file_apps_info, beautify_bytes_size,
                                 get_file_type, extract_extension_from_path, copy_item, is_dir,
                                 delete_item)
+from src.utils.size_engine import FolderSizeScan, SizeSnapshot
+from src.utils.file_explorer_utils import release_stopping_thread
 
 from src.shared.locations import ICONS_DIR, SYSTEM_DEFAULT_ICONS_DIR
 from src.utils.utils import convert_incs_to_png, get_full_icon_path
 from PySide6.QtCore import Signal, QObject, QThread
-from src.shared.vars import conf_manager as conf
+from src.shared.vars import conf_manager as conf, folder_size_cache
 
 
 def create_separating_line() -> QFrame:
@@ -94,26 +96,57 @@ class RunInThread:
         self.is_alive = False
 
 
+class FolderSizeScanThread(QThread):
+    """Runs a FolderSizeScan, emitting its running totals (a SizeSnapshot) every ~100 ms."""
+    progress = Signal(object)
+
+    def __init__(self, item_or_items: Union[str, list[str]]):
+        super().__init__()
+        self.scan = FolderSizeScan(item_or_items, conf.full_tree_prune_rules,
+                                   cache=folder_size_cache)
+
+    def run(self):
+        self.scan.run(on_progress=self.progress.emit)
+
+    def cancel(self):
+        self.scan.cancel()
+
+
 class PropertiesWindowCalculateSizeInThread(QDialog):
     def __init__(self, item_or_items: Union[str, list[str]]):
         super(PropertiesWindowCalculateSizeInThread, self).__init__()
 
         self.is_currently_presented = True
-        self.thread_runner = RunInThread(func_to_run_in_thread=get_item_size_pretty,
-                                         func_to_run_when_finished=self.update_item_size_label_text,
-                                         params={'fs': item_or_items})
-        self.thread_runner.thread.start()
+        self.size_scan_thread = FolderSizeScanThread(item_or_items)
+        self.size_scan_thread.progress.connect(self.update_item_size_label_text)
+        self.size_scan_thread.start()
 
         self.setGeometry(300, 300, 300, 300)
 
-    def update_item_size_label_text(self):
-        self.item_size.setText("Size:\t\t\t" + str(self.thread_runner.worker.outcome[2]))
+    def update_item_size_label_text(self, snapshot: SizeSnapshot):
+        text = (f"Size:\t\t\t{beautify_bytes_size(snapshot.bytes)[2]}"
+                f" ({snapshot.files:,} files, {snapshot.folders:,} folders)"
+                f"\nOn disk:\t\t{beautify_bytes_size(snapshot.allocated_bytes)[2]}")
+        if snapshot.hard_links > 0:
+            text += f"\n\t\t\t{snapshot.hard_links:,} extra hard links counted once"
+        if snapshot.errors > 0:
+            text += f"\n\t\t\t{snapshot.errors:,} items could not be read"
+        if not snapshot.finished:
+            text += "  - calculating..."
+        self.item_size.setText(text)
 
     def apply(self):
         print("Apply button clicked")
 
     def kill_thread(self):
-        self.thread_runner.kill()
+        # Stops the scan promptly (within the folder each worker is listing), without waiting
+        # for it on the GUI thread: it deletes itself once it ends
+        if self.size_scan_thread is None:
+            return
+        self.size_scan_thread.progress.disconnect()
+        self.size_scan_thread.cancel()
+        release_stopping_thread(self.size_scan_thread)
+        self.size_scan_thread = None
 
     def accept(self):
         print("OK button clicked")
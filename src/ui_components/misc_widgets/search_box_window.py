@@ -1,47 +1,94 @@
 from PySide6 import QtCore
 from PySide6.QtWidgets import (QTableView, QAbstractItemView, QLineEdit, QSizePolicy, QVBoxLayout,
-                               QHeaderView, QDialog, QDialogButtonBox, QStyledItemDelegate, QStyle)
-from PySide6.QtCore import Signal, QObject, QThread, Qt
+                               QHeaderView, QDialog, QDialogButtonBox, QStyledItemDelegate, QStyle,
+                               QComboBox, QHBoxLayout, QLabel, QPushButton, QInputDialog)
+from PySide6.QtCore import Signal, QThread, Qt, QTimer
 from PySide6.QtGui import QFont
 import os
-import time
+import queue
+import re
+import threading
 import pandas as pd
-from src.utils.os_utils import run_file_in_terminal
+from src.utils.os_utils import run_file_in_terminal, size_bytes_to_string
+from src.utils.search_utils import (MATCH_MODES, MATCH_MODE_FUZZY, compile_matcher, iter_matches,
+                                    parse_search, TopKResults)
+from src.utils.content_search import ContentSearch
+from src.utils.saved_searches import SavedSearch
 from src.data_models import SimplePandasModel
+from src.ui_components.misc_widgets.dialogs_and_messages import prompt_message
 from src.shared.vars import conf_manager as conf
 
 
-def files_iterator(path: str, txt: str):
-    for root, dirs, files in os.walk(path, topdown=True):
-        files_and_dirs = files + dirs
-        for name in files_and_dirs:
-            relative_path = os.path.join(root, name).replace(path + '/', '')
-            if txt in relative_path:
-                yield relative_path
+# Maximal number of fuzzy results kept (and shown) for a single search
+FUZZY_TOP_K = 500
+# Search mode (next to the name-matching modes) which looks inside the files' contents
+CONTENT_SEARCH_MODE = 'contents'
+# Name-search results buffered between the walking thread and the table
+RESULTS_QUEUE_SIZE = 2000
+# The table is fed from the queue every RESULTS_DRAIN_INTERVAL_MS, at most
+# RESULTS_PER_DRAIN rows at a time, so the GUI stays responsive on huge result sets
+RESULTS_DRAIN_INTERVAL_MS = 100
+RESULTS_PER_DRAIN = 500
+SEARCH_DONE = object()
+# Stopped threads still winding down
+_stopping_threads = set()
 
 
-class Worker(QObject):
-    finished = Signal()
-    progress = Signal(int)
-
-    def __init__(self, encompassing_obj, num_items_to_find, text_to_search):
-        self.encompassing_obj = encompassing_obj
-        self.num_items_to_find = num_items_to_find
-        self.chunk_ended = False
-        super().__init__()
+class SearchProducerThread(QThread):
+    """
+    The single producer of a name search: walks the tree and puts ``(relative_path, score)``
+    results on a bounded queue, which the search window drains on a timer. When the queue is
+    full (the table can't keep up) the walk simply waits. `files_iter` must check
+    `stop_event` as it walks (see ``iter_matches``), so `stop()` ends the walk at the next
+    entry even if nothing matches. A SEARCH_DONE marker is put on the queue once the walk is
+    exhausted.
+    """
+    def __init__(self, files_iter, results_queue: queue.Queue, stop_event: threading.Event,
+                 parent=None):
+        super().__init__(parent)
+        self.files_iter = files_iter
+        self.results_queue = results_queue
+        self.stop_event = stop_event
 
     def run(self):
-        i = 0
-        while i < self.num_items_to_find:
+        for result in self.files_iter:
+            if not self._put(result):
+                return
+        if not self.stop_event.is_set():
+            self._put(SEARCH_DONE)
+
+    def _put(self, item) -> bool:
+        while not self.stop_event.is_set():
             try:
-                nextfile = next(self.encompassing_obj.files_iter)
-                self.encompassing_obj.results_table.model().insertRows(new_row=[nextfile])
-            except StopIteration:
-                self.encompassing_obj.search_finished = True
-                pass
-            i += 1
-        self.chunk_ended = True
-        self.encompassing_obj.quit_all_threads()
+                self.results_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def stop(self):
+        self.stop_event.set()
+
+
+class ContentSearchThread(QThread):
+    """
+    Runs a ContentSearch (which fans out to a process pool) off the GUI thread, and sends
+    every matching file back as a signal, so results stream into the table as they're found.
+    """
+    match_found = Signal(str, str)   # path relative to the search root, first matching line
+
+    def __init__(self, content_search: ContentSearch, parent=None):
+        super().__init__(parent)
+        self.content_search = content_search
+
+    def run(self):
+        root_prefix_len = len(os.path.join(self.content_search.root, ''))
+        for path, previews in self.content_search.run():
+            line_num, preview = previews[0]
+            self.match_found.emit(path[root_prefix_len:], f"{line_num}: {preview}")
+
+    def cancel(self):
+        self.content_search.cancel()
 
 
 class NoElideDelegate(QStyledItemDelegate):
@@ -67,7 +114,9 @@ class SearchWindow_threaded(QDialog):
         super(SearchWindow_threaded, self).__init__()
         self.root_path = root_path
         self.encompassing_ui = encompassing_ui
-        self.threads = {}
+        self.search_producer = None
+        self.results_queue = None
+        self.ranked_results = None
         self.initUI()
         self.installEventFilter(self)
         self.search_box.setFocus()
@@ -91,7 +140,34 @@ class SearchWindow_threaded(QDialog):
             border:  1px solid lightgrey;
             };""")
         self.search_box.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Minimum)
-        self.search_layout.addWidget(self.search_box)
+        self.search_box.setToolTip("Name text, optionally with filters, e.g.:\n"
+                                   "report size > 1 GB\n"
+                                   "modified in last 3 days ext in {mp4, mov}\n"
+                                   "type = folder modified before 2024-01-01")
+
+        # How the search text is matched against item names
+        self.match_mode_box = QComboBox()
+        for match_mode, match_mode_text in MATCH_MODES.items():
+            self.match_mode_box.addItem(match_mode_text, match_mode)
+        self.match_mode_box.addItem("Contains text (in files)", CONTENT_SEARCH_MODE)
+
+        self.search_box_layout = QHBoxLayout()
+        self.search_box_layout.addWidget(self.search_box)
+        self.search_box_layout.addWidget(self.match_mode_box)
+        self.search_layout.addLayout(self.search_box_layout)
+
+        # Saved searches open as (live) virtual folders in the window's active pane
+        self.save_search_button = QPushButton("Save as virtual folder")
+        self.save_search_button.clicked.connect(self.save_search)
+        self.saved_searches_box = QComboBox()
+        self.saved_searches_box.addItem("Open saved search...", None)
+        for name in sorted(self.uis_manager.saved_searches):
+            self.saved_searches_box.addItem(name, name)
+        self.saved_searches_box.activated.connect(self.open_saved_search)
+        self.saved_searches_layout = QHBoxLayout()
+        self.saved_searches_layout.addWidget(self.save_search_button)
+        self.saved_searches_layout.addWidget(self.saved_searches_box)
+        self.search_layout.addLayout(self.saved_searches_layout)
 
         # Results:
         self.results_table = QTableView()
@@ -104,14 +180,24 @@ class SearchWindow_threaded(QDialog):
         # Let a widened column scroll horizontally so long paths can be read in full.
         self.results_table.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAsNeeded)
         self.results_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
-        self.model = SimplePandasModel(data=pd.DataFrame(columns=['Filename']))
+        self.model = SimplePandasModel(data=pd.DataFrame(columns=['Filename', 'Preview']))
         self.results_table.setModel(self.model)
         # Start the single column filling the window; the user can drag it wider/narrower.
         self.results_table.setColumnWidth(0, 470)
+        # The matching line is only relevant when searching inside files
+        self.results_table.setColumnHidden(1, True)
         self.results_table.doubleClicked.connect(self.double_click_on_search_result)
-        self.results_table.verticalScrollBar().valueChanged.connect(self.scrollbar_reached_bottom)
         self.results_layout.addWidget(self.results_table)
 
+        # Content search throughput (files/sec, bytes/sec)
+        self.content_search_thread = None
+        self.stats_label = QLabel("")
+        self.results_layout.addWidget(self.stats_label)
+        self.stats_timer = QTimer()
+        self.stats_timer.timeout.connect(self.update_content_search_stats)
+        self.drain_timer = QTimer()
+        self.drain_timer.timeout.connect(self.drain_results_queue)
+
         # Create the buttons
         self.button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Close)
         self.button_box.accepted.connect(self.accept)
@@ -131,40 +217,152 @@ class SearchWindow_threaded(QDialog):
     def keyPressEvent(self, e):
         if (e.key() == QtCore.Qt.Key.Key_Return) or (e.key() == QtCore.Qt.Key.Key_Enter):   # Enter
             if self.search_box.text() != '':
-                self.empty_results_table()
+                match_mode = self.match_mode_box.currentData()
+                if match_mode == CONTENT_SEARCH_MODE:
+                    self.start_content_search(self.search_box.text())
+                    return
+                try:
+                    # Metadata predicates ("size > 1 GB", ...) are split off the name text
+                    query = parse_search(self.search_box.text(), match_mode)
+                except ValueError as err:
+                    prompt_message("Invalid search query", str(err))
+                    return
+                try:
+                    # Compiled once per search, then applied to every item name
+                    matcher = compile_matcher(query.name_text, match_mode) if query.name_text else None
+                except re.error as err:
+                    prompt_message("Invalid search pattern", str(err))
+                    return
                 self.quit_all_threads()
-                self.search_finished = False
-                self.chunk_ended = False
-                # Stateful (for the lifecycle of the search-box) iterator which will be
-                # used by all workers
-                self.files_iter = files_iterator(self.root_path, self.search_box.text())
-                # Find the first n items (the following n items will be looked for once
-                # user scrolls all the way down):
-                self.next_n_items_finder_thread()
+                self.empty_results_table()
+                self.results_table.setColumnHidden(1, True)
+                self.stats_label.setText("")
+                self.ranked_results = \
+                    TopKResults(FUZZY_TOP_K) if match_mode == MATCH_MODE_FUZZY else None
+                self.results_queue = queue.Queue(maxsize=RESULTS_QUEUE_SIZE)
+                stop_event = threading.Event()
+                self.search_producer = SearchProducerThread(
+                    iter_matches(self.root_path, matcher,
+                                 query if query.has_predicates else None,
+                                 conf.prune_rules, conf.BASIC_FAVORITES_DICT['Path'], stop_event),
+                    self.results_queue, stop_event)
+                self.search_producer.start()
+                self.drain_timer.start(RESULTS_DRAIN_INTERVAL_MS)
         elif e.key() == QtCore.Qt.Key.Key_Escape:    # Enter
             self.reject()
 
-    def scrollbar_reached_bottom(self, value: int):
-        if value == self.results_table.verticalScrollBar().maximum():
-            print("Scrollbar has reached the end")
-            if not self.search_finished and self.worker.chunk_ended:
-                self.next_n_items_finder_thread()
-                time.sleep(0.5)
-
-    def next_n_items_finder_thread(self, n: int = 100):
-        new_thread_index = len(self.threads)
-        self.threads[new_thread_index] = {'thread': QThread(), 'is_alive': True}
-        new_thread = self.threads[new_thread_index]['thread']
-        self.worker = Worker(self, n, self.search_box.text())
-        self.worker.moveToThread(new_thread)
-        new_thread.started.connect(self.worker.run)
-        new_thread.start()
+    def start_content_search(self, text: str):
+        self.quit_all_threads()
+        self.empty_results_table()
+        self.results_table.setColumnHidden(1, False)
+        self.content_search_thread = ContentSearchThread(
+            ContentSearch(self.root_path, text,
+                          max_file_size=int(float(conf.CONTENT_SEARCH_MAX_FILE_SIZE_MB) * 1024 ** 2),
+                          prune_rules=conf.prune_rules))
+        self.content_search_thread.match_found.connect(self.add_content_search_result)
+        self.content_search_thread.finished.connect(self.content_search_finished)
+        self.content_search_thread.start()
+        self.stats_timer.start(500)
+
+    def add_content_search_result(self, relative_path: str, preview: str):
+        self.results_table.model().insertRows(new_row=[relative_path, preview])
+
+    def update_content_search_stats(self):
+        if self.content_search_thread is None:
+            return
+        content_search = self.content_search_thread.content_search
+        self.stats_label.setText(
+            f"{content_search.files_scanned} files scanned  |  "
+            f"{content_search.files_per_second:.0f} files/sec  |  "
+            f"{size_bytes_to_string(int(content_search.bytes_per_second))}/sec")
+
+    def content_search_finished(self):
+        self.stats_timer.stop()
+        self.update_content_search_stats()
+
+    def stop_content_search(self):
+        if self.content_search_thread is not None:
+            self.content_search_thread.cancel()
+            self.content_search_thread.wait()
+            self.content_search_thread = None
+        self.stats_timer.stop()
+
+    def drain_results_queue(self):
+        rows = []
+        search_done = False
+        while len(rows) < RESULTS_PER_DRAIN:
+            try:
+                result = self.results_queue.get_nowait()
+            except queue.Empty:
+                break
+            if result is SEARCH_DONE:
+                search_done = True
+                break
+            rows.append(result)
+
+        if self.ranked_results is None:
+            self.results_table.model().append_rows([[relative_path, ''] for relative_path, _ in rows])
+        elif rows:
+            # Fuzzy results are re-ranked as they arrive so the best hits stay on top
+            for relative_path, score in rows:
+                self.ranked_results.push(score, relative_path)
+            self.results_table.model().replace_all_rows(
+                [[x, ''] for x in self.ranked_results.best_first()])
+
+        if search_done:
+            self.drain_timer.stop()
+            self.stats_label.setText(f"{self.results_table.model().num_rows} results")
+
+    def stop_search_producer(self):
+        self.drain_timer.stop()
+        if self.search_producer is not None:
+            # Not waited for (the GUI would freeze until the walk reaches its next entry):
+            # kept referenced until it ends, as a running QThread mustn't be destroyed
+            producer = self.search_producer
+            _stopping_threads.add(producer)
+            producer.finished.connect(lambda: _stopping_threads.discard(producer))
+            producer.stop()
+            if producer.isFinished():
+                _stopping_threads.discard(producer)
+            self.search_producer = None
+        self.results_queue = None
+
+    @property
+    def uis_manager(self):
+        return self.encompassing_ui.encompassing_uis_manager
+
+    def save_search(self):
+        text = self.search_box.text()
+        match_mode = self.match_mode_box.currentData()
+        if text == '':
+            return
+        if match_mode == CONTENT_SEARCH_MODE:
+            prompt_message("Can't save this search",
+                           "Searches of file contents can't be saved as virtual folders")
+            return
+        name, ok = QInputDialog.getText(self, "Save search", "Name:", text=text)
+        if not ok or name == '':
+            return
+        try:
+            compile_matcher(parse_search(text, match_mode).name_text, match_mode)
+        except (ValueError, re.error) as err:
+            prompt_message("Invalid search query", str(err))
+            return
+        saved_search = SavedSearch(name, self.root_path, text, match_mode)
+        self.uis_manager.add_saved_search(saved_search)
+        self.encompassing_ui.file_explorer.open_saved_search(saved_search)
+        self.accept()
+
+    def open_saved_search(self, box_index: int):
+        name = self.saved_searches_box.itemData(box_index)
+        if name is None:
+            return
+        self.encompassing_ui.file_explorer.open_saved_search(self.uis_manager.saved_searches[name])
+        self.accept()
 
     def quit_all_threads(self):
-        for thread in self.threads.keys():
-            if self.threads[thread]['is_alive']:
-                self.threads[thread]['thread'].quit()
-                self.threads[thread]['is_alive'] = False
+        self.stop_search_producer()
+        self.stop_content_search()
 
     def accept(self):
         self.quit_all_threads()
@@ -175,7 +373,7 @@ class SearchWindow_threaded(QDialog):
         super(SearchWindow_threaded, self).reject()
 
     def double_click_on_search_result(self, index):
-        item_path = os.path.join(self.root_path, index.data())
+        item_path = os.path.join(self.root_path, index.siblingAtColumn(0).data())
         if os.path.isdir(item_path):
             self.encompassing_ui.encompassing_uis_manager.create_new_window(item_path)
         else:
@@ -779,6 +779,11 @@ class ui(QtWidgets.QMainWindow):
             conf.set_attr("FILE_EXPLORER_COL_WIDTH_4", table0.columnWidth(3))
 
     def on_close(self):
+        for table in self.all_tables():
+            table.stop_folder_sizes_calculation()
+            for disk_usage_window in table.disk_usage_windows:
+                if disk_usage_window.is_currently_presented:
+                    disk_usage_window.kill_thread()
         self.encompassing_uis_manager.on_ui_close(self)
 
     def keyPressEvent(self, e):
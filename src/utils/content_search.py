@@ -0,0 +1,206 @@
+"""Pure, UI-agnostic "contains text" search over the files of a folder tree.
+
+Kept free of Qt and pyobjc: besides being unit-testable, the functions run inside
+worker *processes* (``ProcessPoolExecutor``), which import this module on their own
+and must not pull in the UI. The Qt glue lives in
+``src/ui_components/misc_widgets/search_box_window.py``.
+"""
+
+import mmap
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterator, Optional
+
+from src.utils.prune_rules import PruneRules
+from src.utils.search_utils import iter_file_entries
+
+
+BINARY_SNIFF_BYTES = 8192              # A NUL byte in the first 8 KB marks a file as binary
+MMAP_THRESHOLD_BYTES = 1024 ** 2       # Larger files are memory-mapped instead of read
+DEFAULT_MAX_FILE_SIZE_BYTES = 100 * 1024 ** 2
+MAX_PREVIEWS_PER_FILE = 3
+MAX_PREVIEW_LENGTH = 200
+FILES_PER_TASK = 64                    # Files handed to a worker process at once
+BYTES_PER_TASK = 32 * 1024 ** 2        # ... unless they add up to more than this
+
+
+def compile_content_pattern(text: str, case_sensitive: bool = False) -> re.Pattern:
+    flags = 0 if case_sensitive else re.IGNORECASE
+    return re.compile(re.escape(text.encode('utf-8')), flags)
+
+
+def is_binary_header(header: bytes) -> bool:
+    return b'\0' in header
+
+
+def _line_preview(data, match_start: int) -> str:
+    line_start = data.rfind(b'\n', 0, match_start) + 1
+    line_end = data.find(b'\n', match_start)
+    if line_end < 0:
+        line_end = len(data)
+    line_end = min(line_end, line_start + MAX_PREVIEW_LENGTH * 4)
+    preview = bytes(data[line_start:line_end]).decode('utf-8', errors='replace').strip()
+    return preview[:MAX_PREVIEW_LENGTH]
+
+
+def _find_in_buffer(data, pattern: re.Pattern, max_previews: int) -> list[tuple[int, str]]:
+    previews = []
+    line_num = 1
+    last_pos = 0
+    for m in pattern.finditer(data):
+        line_num += data.count(b'\n', last_pos, m.start()) if isinstance(data, bytes) \
+            else bytes(data[last_pos:m.start()]).count(b'\n')
+        last_pos = m.start()
+        previews.append((line_num, _line_preview(data, m.start())))
+        if len(previews) >= max_previews:
+            break
+    return previews
+
+
+def search_file(path: str, pattern: re.Pattern,
+                max_previews: int = MAX_PREVIEWS_PER_FILE) -> tuple[int, list[tuple[int, str]]]:
+    """Return ``(bytes_scanned, [(line_number, line_preview), ...])`` for a single file.
+
+    Binary files (detected by sniffing the first few KB) are skipped after the header
+    read. Files above ``MMAP_THRESHOLD_BYTES`` are memory-mapped so they are never copied
+    into the Python heap in full. Unreadable files count as zero bytes with no matches.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(BINARY_SNIFF_BYTES)
+            if is_binary_header(header):
+                return len(header), []
+            size = os.fstat(f.fileno()).st_size
+            if size <= MMAP_THRESHOLD_BYTES:
+                data = header + f.read()
+                return len(data), _find_in_buffer(data, pattern, max_previews)
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                return size, _find_in_buffer(data, pattern, max_previews)
+    except (OSError, ValueError):
+        return 0, []
+
+
+def search_files_chunk(paths: list[str], pattern: re.Pattern,
+                       max_previews: int = MAX_PREVIEWS_PER_FILE):
+    """Worker-process entry point: search a batch of files, returning
+    ``(files_scanned, bytes_scanned, [(path, [(line_number, preview), ...]), ...])``."""
+    bytes_scanned = 0
+    matches = []
+    for path in paths:
+        n_bytes, previews = search_file(path, pattern, max_previews)
+        bytes_scanned += n_bytes
+        if previews:
+            matches.append((path, previews))
+    return len(paths), bytes_scanned, matches
+
+
+def iter_file_chunks(root: str, max_file_size: int = DEFAULT_MAX_FILE_SIZE_BYTES,
+                     stop_event: threading.Event = None,
+                     prune_rules: PruneRules = None) -> Iterator[list[str]]:
+    """Group the files under `root` (skipping those larger than `max_file_size`) into
+    batches of about ``FILES_PER_TASK`` files / ``BYTES_PER_TASK`` bytes."""
+    chunk = []
+    chunk_bytes = 0
+    for entry in iter_file_entries(root, prune_rules):
+        if stop_event is not None and stop_event.is_set():
+            return
+        try:
+            size = entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+        if size > max_file_size:
+            continue
+        chunk.append(entry.path)
+        chunk_bytes += size
+        if len(chunk) >= FILES_PER_TASK or chunk_bytes >= BYTES_PER_TASK:
+            yield chunk
+            chunk = []
+            chunk_bytes = 0
+    if chunk:
+        yield chunk
+
+
+class ContentSearch:
+    """
+    Scans the contents of every file under a root folder on a process pool and yields
+    ``(path, [(line_number, preview), ...])`` for each file containing the text, as soon as
+    the batch it belongs to is done. The number of batches in flight is bounded, so the
+    walk never runs far ahead of the workers. `cancel()` may be called from any thread.
+    """
+    def __init__(self, root: str, text: str, case_sensitive: bool = False,
+                 max_file_size: int = DEFAULT_MAX_FILE_SIZE_BYTES, num_workers: int = None,
+                 prune_rules: PruneRules = None):
+        self.root = root
+        self.prune_rules = prune_rules
+        self.pattern = compile_content_pattern(text, case_sensitive)
+        self.max_file_size = max_file_size
+        self.num_workers = num_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.stop_event = threading.Event()
+        self.files_scanned = 0
+        self.bytes_scanned = 0
+        self.started_at = None
+        self.finished_at = None
+
+    def cancel(self):
+        self.stop_event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self.stop_event.is_set()
+
+    @property
+    def elapsed_seconds(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def files_per_second(self) -> float:
+        elapsed = self.elapsed_seconds
+        return self.files_scanned / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        elapsed = self.elapsed_seconds
+        return self.bytes_scanned / elapsed if elapsed > 0 else 0.0
+
+    def run(self, executor: Optional[ProcessPoolExecutor] = None) -> Iterator[tuple]:
+        self.started_at = time.monotonic()
+        own_executor = executor is None
+        if own_executor:
+            executor = ProcessPoolExecutor(max_workers=self.num_workers)
+        max_in_flight = 2 * self.num_workers
+        in_flight = set()
+        chunks = iter_file_chunks(self.root, self.max_file_size, self.stop_event, self.prune_rules)
+        try:
+            walk_exhausted = False
+            while not self.is_cancelled:
+                while not walk_exhausted and len(in_flight) < max_in_flight:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        walk_exhausted = True
+                        break
+                    in_flight.add(executor.submit(search_files_chunk, chunk, self.pattern))
+                if not in_flight:
+                    break
+                done, in_flight = wait(in_flight, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        n_files, n_bytes, matches = future.result()
+                    except Exception:
+                        continue
+                    self.files_scanned += n_files
+                    self.bytes_scanned += n_bytes
+                    for match in matches:
+                        if self.is_cancelled:
+                            return
+                        yield match
+        finally:
+            for future in in_flight:
+                future.cancel()
+            if own_executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+            self.finished_at = time.monotonic()
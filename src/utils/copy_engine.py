@@ -0,0 +1,823 @@
+"""Copy engine used by the pasting threads: copies files in large chunks and reports
+byte-level progress (bytes done, total, current file, throughput, ETA).
+
+File data is copied by the fastest means available, falling back in order:
+
+- a copy-on-write clone, which shares the data blocks until either copy is modified and
+  is near-instant whatever the size: ``clonefile()`` on APFS (whole folders at once) or
+  the ``FICLONE`` ioctl on Btrfs/XFS. Only possible within one volume.
+- ``os.copy_file_range`` (Linux), copying in the kernel without passing through Python
+- ``os.sendfile`` (Linux; on macOS it only sends to sockets)
+- a buffered copy: ``readinto`` one reused ``bytearray``
+
+A job is copied in three phases: its folders are created (parents first), its files are
+copied by a pool of threads - many small files are bound by per-file system calls rather
+than bandwidth - and the folders' metadata is set last, as adding entries changes it.
+
+Copying can be paused mid-file and its bandwidth capped (a TokenBucket shared by the
+job's threads; clones move no data and aren't limited). Both apply from the next chunk,
+so throttled copies use smaller chunks.
+
+In verify mode every file is copied through the buffer and hashed as it goes (xxHash when
+the ``xxhash`` package is installed, SHA-256 otherwise - see verify_algorithm_used); the
+copy is then read back and its hash compared, and a mismatching file is copied again. The
+read-back is usually served from the page cache, so it catches what went wrong on the way
+to the destination (the copy itself, its filesystem), not what the disk stores.
+
+Kept free of Qt and pyobjc so it is unit-testable; the Qt glue is ``PasteItemsThread``
+(``src/utils/pasting_items.py``).
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import hashlib
+import os
+import shutil
+import stat as stat_module
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from src.utils.copy_journal import partial_path
+from src.utils.token_bucket import TokenBucket
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+
+try:
+    import xxhash
+except ImportError:     # Optional: SHA-256 is used instead
+    xxhash = None
+
+
+COPY_BUFFER_SIZE = 8 * 1024 ** 2
+# Files of one job copied at the same time
+COPY_WORKERS = 8
+PROGRESS_INTERVAL_SECONDS = 0.1
+# When the bandwidth is capped, chunks hold about this long of it (but at least
+# MIN_THROTTLED_CHUNK_SIZE), so that the cap is kept smoothly rather than in bursts
+THROTTLED_CHUNK_SECONDS = 0.1
+MIN_THROTTLED_CHUNK_SIZE = 64 * 1024
+
+# How file data was copied (CopyEngine.methods_used counts them)
+COPY_METHOD_CLONE = 'clone'
+COPY_METHOD_COPY_FILE_RANGE = 'copy_file_range'
+COPY_METHOD_SENDFILE = 'sendfile'
+COPY_METHOD_BUFFERED = 'buffered'
+COPY_METHOD_RENAME = 'rename'     # A move within one volume (no data copied)
+
+# Kinds of the entries of a folder already walked (see CopyPlan)
+ENTRY_DIR = 'dir'
+ENTRY_FILE = 'file'
+ENTRY_SYMLINK = 'symlink'
+ENTRY_SPECIAL = 'special'   # FIFOs, sockets and device nodes
+
+# Content verification (CopyEngine(verify=...)): each file's data is hashed as it is
+# copied, then the copy is read back and its hash compared
+VERIFY_XXHASH = 'xxh3'      # Needs the xxhash package, otherwise SHA-256 is used
+VERIFY_SHA256 = 'sha256'
+VERIFY_ALGORITHMS = [VERIFY_XXHASH, VERIFY_SHA256]
+# Times a file whose copy doesn't match is copied again before its item fails
+VERIFY_RETRIES = 1
+
+# ioctl(dest_fd, FICLONE, src_fd) - _IOW(0x94, 9, int) on Linux
+FICLONE = 0x40049409
+# clonefile(2) flag: clone a symlink itself rather than its target
+CLONE_NOFOLLOW = 0x0001
+# errno values meaning "this file system / kernel can't do that", i.e. try the next method
+_UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSUP,
+                       errno.EBADF, errno.ENOTTY, errno.EPERM}
+
+
+def _load_clonefile():
+    if sys.platform != 'darwin':
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libSystem.dylib', use_errno=True)
+        clonefile = libc.clonefile
+    except (OSError, AttributeError):
+        return None
+    clonefile.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.c_uint32]
+    clonefile.restype = ctypes.c_int
+    return clonefile
+
+
+_clonefile = _load_clonefile()
+
+
+def can_clone(src: str, dest_dir: str) -> bool:
+    """Whether copying `src` into the folder `dest_dir` can be a clonefile() (macOS, within
+    one APFS volume), which takes no space until either copy is changed."""
+    return _clonefile is not None and is_same_device(src, dest_dir)
+
+
+class CopyProgress:
+    """Progress of a copy job. `bytes_total`/`files_total` are known once the sources were
+    measured (before the first byte is copied). Time spent paused doesn't count towards the
+    elapsed time (nor, so, the speed)."""
+    __slots__ = ('bytes_done', 'bytes_total', 'files_done', 'files_total', 'current_file',
+                 'started_at', 'finished', 'paused_at', 'paused_seconds')
+
+    def __init__(self, bytes_done: int = 0, bytes_total: int = 0, files_done: int = 0,
+                 files_total: int = 0, current_file: str = '', started_at: float = None,
+                 finished: bool = False, paused_at: float = None, paused_seconds: float = 0.0):
+        self.bytes_done = bytes_done
+        self.bytes_total = bytes_total
+        self.files_done = files_done
+        self.files_total = files_total
+        self.current_file = current_file
+        self.started_at = time.monotonic() if started_at is None else started_at
+        self.finished = finished
+        self.paused_at = paused_at      # None while running
+        self.paused_seconds = paused_seconds
+
+    def copy(self) -> 'CopyProgress':
+        return CopyProgress(self.bytes_done, self.bytes_total, self.files_done, self.files_total,
+                            self.current_file, self.started_at, self.finished, self.paused_at,
+                            self.paused_seconds)
+
+    @property
+    def is_paused(self) -> bool:
+        return self.paused_at is not None
+
+    @property
+    def elapsed_seconds(self) -> float:
+        now = self.paused_at if self.paused_at is not None else time.monotonic()
+        return now - self.started_at - self.paused_seconds
+
+    @property
+    def bytes_per_second(self) -> float:
+        elapsed = self.elapsed_seconds
+        return self.bytes_done / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        """Seconds left at the average speed so far; None until there's a speed to go by."""
+        rate = self.bytes_per_second
+        if rate <= 0:
+            return None
+        return max(0.0, (self.bytes_total - self.bytes_done) / rate)
+
+    @property
+    def fraction_done(self) -> float:
+        if self.bytes_total > 0:
+            return min(1.0, self.bytes_done / self.bytes_total)
+        if self.files_total > 0:
+            return min(1.0, self.files_done / self.files_total)
+        return 1.0 if self.finished else 0.0
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '--:--'
+    seconds = int(seconds + 0.5)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def measure_item(path: str) -> tuple[int, int]:
+    """(bytes, files) a copy of `path` will write. Symlinks are copied as links (0 bytes)."""
+    try:
+        st = os.stat(path, follow_symlinks=False)
+    except OSError:
+        return 0, 0
+    if not stat_module.S_ISDIR(st.st_mode):
+        return (st.st_size if stat_module.S_ISREG(st.st_mode) else 0), 1
+    total_bytes = total_files = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        else:
+                            total_files += 1
+                            if entry.is_file(follow_symlinks=False):
+                                total_bytes += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+    return total_bytes, total_files
+
+
+def is_same_device(path: str, dest_dir: str) -> bool:
+    """Whether `path` (not followed if a symlink) and the folder `dest_dir` are on one volume,
+    i.e. `path` can be moved into it with a rename."""
+    try:
+        return os.stat(path, follow_symlinks=False).st_dev == os.stat(dest_dir or '.').st_dev
+    except OSError:
+        return False
+
+
+def verify_algorithm_used(algorithm: str) -> str:
+    """The algorithm `algorithm` is verified with here: xxh3 needs the xxhash package."""
+    if algorithm == VERIFY_XXHASH and xxhash is None:
+        return VERIFY_SHA256
+    return algorithm
+
+
+def new_hasher(algorithm: str):
+    if verify_algorithm_used(algorithm) == VERIFY_XXHASH:
+        return xxhash.xxh3_64()
+    return hashlib.sha256()
+
+
+class CopyCancelled(Exception):
+    pass
+
+
+class VerificationFailed(OSError):
+    pass
+
+
+def _is_copyable_file(st: os.stat_result) -> bool:
+    return stat_module.S_ISREG(st.st_mode) or stat_module.S_ISLNK(st.st_mode)
+
+
+class CopyPlan:
+    """
+    A job's (src, dest) pairs expanded, with one walk of the sources, into what has to be
+    done: the folders to create (parents before their children), then the files and
+    symlinks to copy (in any order), then the folders whose metadata is set once their
+    contents are in. Items which couldn't be walked are in `failed_items`.
+
+    Only regular files, symlinks and folders are copied: FIFOs, sockets and device nodes
+    inside a folder are skipped and listed in `special_files` (opening a FIFO to read it
+    would block until something writes to it), and an item which is one of them fails.
+
+    A folder found in `listings` ({src: [(path relative to src, ENTRY_* kind, size), ...]},
+    each folder before what it holds - see paste_planner) isn't walked again: its entries
+    are taken from there, as they were when it was listed.
+    """
+    def __init__(self, pairs: list[tuple[str, str]],
+                 listings: Optional[dict[str, list[tuple[str, str, int]]]] = None):
+        self.pairs = list(pairs)
+        self.listings = listings if listings is not None else {}
+        self.dirs = []          # (src_dir, dest_dir, item_index)
+        self.files = []         # (src, dest, size, item_index, is_symlink)
+        self.entries_per_item = [0] * len(self.pairs)
+        self.bytes_total = 0
+        self.failed_items = set()
+        self.special_files = []     # Sources skipped
+        for item_index, (src, dest) in enumerate(self.pairs):
+            try:
+                self._add_item(item_index, src, dest)
+            except OSError:
+                self.failed_items.add(item_index)
+
+    def _add_dir(self, item_index: int, src: str, dest: str):
+        self.dirs.append((src, dest, item_index))
+        self.entries_per_item[item_index] += 1
+
+    def _add_file(self, item_index: int, src: str, dest: str, size: int, is_symlink: bool):
+        self.files.append((src, dest, size, item_index, is_symlink))
+        self.entries_per_item[item_index] += 1
+        self.bytes_total += size
+
+    def _add_stat_file(self, item_index: int, src: str, dest: str, st: os.stat_result):
+        self._add_file(item_index, src, dest, st.st_size if stat_module.S_ISREG(st.st_mode) else 0,
+                       stat_module.S_ISLNK(st.st_mode))
+
+    def _add_item(self, item_index: int, src: str, dest: str):
+        st = os.stat(src, follow_symlinks=False)
+        if not stat_module.S_ISDIR(st.st_mode):
+            if not _is_copyable_file(st):
+                raise OSError(errno.EINVAL, "Not a regular file", src)
+            self._add_stat_file(item_index, src, dest, st)
+            return
+        self._add_dir(item_index, src, dest)
+        if src in self.listings:
+            self._add_listing(item_index, src, dest, self.listings[src])
+            return
+        stack = [(src, dest)]
+        while stack:
+            current_src, current_dest = stack.pop()
+            with os.scandir(current_src) as it:
+                for entry in it:
+                    dest_path = os.path.join(current_dest, entry.name)
+                    if entry.is_dir(follow_symlinks=False):
+                        self._add_dir(item_index, entry.path, dest_path)
+                        stack.append((entry.path, dest_path))
+                    else:
+                        st = entry.stat(follow_symlinks=False)
+                        if _is_copyable_file(st):
+                            self._add_stat_file(item_index, entry.path, dest_path, st)
+                        else:
+                            self.special_files.append(entry.path)
+
+    def _add_listing(self, item_index: int, src: str, dest: str,
+                     entries: list[tuple[str, str, int]]):
+        for relative_path, kind, size in entries:
+            src_path = os.path.join(src, relative_path)
+            dest_path = os.path.join(dest, relative_path)
+            if kind == ENTRY_DIR:
+                self._add_dir(item_index, src_path, dest_path)
+            elif kind == ENTRY_SPECIAL:
+                self.special_files.append(src_path)
+            else:
+                self._add_file(item_index, src_path, dest_path, size, kind == ENTRY_SYMLINK)
+
+
+class CopyEngine:
+    """
+    Copies files and folders (by the fastest method available, see above; with
+    `fast_copy=False` always through a reused buffer), calling `on_progress` with a
+    CopyProgress snapshot at most every `progress_interval` seconds.
+
+    `copy_items()` expands the job into a CopyPlan and copies its files on a pool of
+    `num_workers` threads (each with its own buffer), so a folder of many small files
+    isn't copied one file at a time. Call `start()` before a job and `finish()` after it.
+    `cancel()` may be called from any thread: copies stop within a chunk and items not
+    completely copied are removed. So may `pause()` / `resume()` and setting
+    `bandwidth_limit` (bytes per second, None for no limit), which apply from the next chunk.
+
+    With `verify` set to one of VERIFY_ALGORITHMS, files are copied through the buffer and
+    hashed on the way (the source is read once), then each copy is read back and compared.
+    A copy that doesn't match is copied again (VERIFY_RETRIES times) and listed in
+    `verify_failures`; `verify_seconds` is the time spent hashing and reading back.
+
+    A file's data is written to a temporary name (see copy_journal.partial_path) and renamed
+    once complete. With a `journal` (a CopyJournal) every completed file is recorded, and
+    `checkpoint()` stops like `cancel()` but keeps what was copied, recording how far each
+    file got; copying the same pairs with the same journal later resumes from there. Only
+    a resumed journal (see CopyJournal.resumed) lets a job reuse what's in its destination:
+    otherwise a folder or file which appeared there since the job was planned fails its item,
+    and is left alone.
+    """
+    def __init__(self, on_progress: Optional[Callable[[CopyProgress], None]] = None,
+                 progress_interval: float = PROGRESS_INTERVAL_SECONDS,
+                 buffer_size: int = COPY_BUFFER_SIZE, fast_copy: bool = True,
+                 num_workers: int = COPY_WORKERS, verify: Optional[str] = None):
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.buffer_size = buffer_size
+        # Kernel-assisted copying (clones, copy_file_range, sendfile); off = buffered only
+        self.fast_copy = fast_copy
+        self.num_workers = num_workers
+        self.verify = verify
+        self.verify_failures = []
+        self.verify_seconds = 0.0
+        # FIFOs, sockets and device nodes found in the folders copied, which were skipped
+        self.skipped_files = []
+        self.journal = None
+        self._checkpointing = False
+        self.methods_used = {}
+        self.progress = CopyProgress()
+        self._stop_event = threading.Event()
+        self._running_event = threading.Event()     # Cleared while paused
+        self._running_event.set()
+        self._bucket = TokenBucket()
+        self._lock = threading.Lock()
+        self._thread_local = threading.local()
+        self._next_progress = 0.0
+
+    def cancel(self):
+        self._stop_event.set()
+        self._running_event.set()   # Wakes up paused copies, to stop
+
+    def checkpoint(self):
+        self._checkpointing = True
+        self.cancel()
+
+    def pause(self):
+        with self._lock:
+            if self.progress.paused_at is None:
+                self.progress.paused_at = time.monotonic()
+            self._running_event.clear()
+        self._report(force=True)
+
+    def resume(self):
+        with self._lock:
+            if self.progress.paused_at is not None:
+                self.progress.paused_seconds += time.monotonic() - self.progress.paused_at
+                self.progress.paused_at = None
+            self._running_event.set()
+        self._report(force=True)
+
+    @property
+    def is_paused(self) -> bool:
+        return not self._running_event.is_set()
+
+    @property
+    def bandwidth_limit(self) -> Optional[float]:
+        return self._bucket.rate
+
+    @bandwidth_limit.setter
+    def bandwidth_limit(self, bytes_per_second: Optional[float]):
+        self._bucket.rate = bytes_per_second
+
+    @property
+    def is_checkpointed(self) -> bool:
+        return self._checkpointing and self.is_cancelled
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._stop_event.is_set()
+
+    def start(self):
+        self._stop_event.clear()
+        self._running_event.set()
+        self._checkpointing = False
+        self.progress = CopyProgress()
+        self.verify_failures = []
+        self.verify_seconds = 0.0
+        self.skipped_files = []
+        self._report(force=True)
+
+    def finish(self):
+        self.progress.finished = True
+        self._report(force=True)
+
+    def _report(self, force: bool = False):
+        with self._lock:
+            snapshot = self._due_snapshot(force)
+        if snapshot is not None:
+            self.on_progress(snapshot)
+
+    def _due_snapshot(self, force: bool = False) -> Optional[CopyProgress]:
+        # Called with the lock held
+        if self.on_progress is None:
+            return None
+        now = time.monotonic()
+        if force or now >= self._next_progress:
+            self._next_progress = now + self.progress_interval
+            return self.progress.copy()
+        return None
+
+    def _add_progress(self, num_bytes: int = 0, num_files: int = 0, current_file: str = None):
+        with self._lock:
+            self.progress.bytes_done += num_bytes
+            self.progress.files_done += num_files
+            if current_file is not None:
+                self.progress.current_file = current_file
+            snapshot = self._due_snapshot()
+        if snapshot is not None:
+            self.on_progress(snapshot)
+
+    def _count_method(self, method: str):
+        with self._lock:
+            self.methods_used[method] = self.methods_used.get(method, 0) + 1
+
+    def _chunk_size(self, size: int) -> int:
+        rate = self._bucket.rate
+        if rate is None:
+            return size
+        return min(size, max(MIN_THROTTLED_CHUNK_SIZE, int(rate * THROTTLED_CHUNK_SECONDS)))
+
+    def _pace(self, num_bytes: int):
+        """After a chunk of `num_bytes` was copied: wait for as long as the bandwidth limit
+        requires, and while paused. Raises CopyCancelled once cancelled."""
+        wait_seconds = self._bucket.take(num_bytes)
+        if wait_seconds > 0:
+            self._stop_event.wait(wait_seconds)
+        self._running_event.wait()
+        if self.is_cancelled:
+            raise CopyCancelled()
+
+    def _buffer(self) -> bytearray:
+        buffer = getattr(self._thread_local, 'buffer', None)
+        if buffer is None:
+            buffer = self._thread_local.buffer = bytearray(self.buffer_size)
+        return buffer
+
+    def copy_item(self, src: str, dest: str) -> int:
+        """Copy the file/folder `src` to `dest` (which shouldn't exist). Returns 1 when
+        copied, 0 when cancelled (nothing is left at `dest`) and -1 on error."""
+        return self.copy_items([(src, dest)])[0]
+
+    def copy_items(self, pairs: list[tuple[str, str]],
+                   listings: Optional[dict[str, list[tuple[str, str, int]]]] = None) -> list[int]:
+        """Copy every (src, dest) pair, returning a 1 / 0 / -1 result per pair as
+        `copy_item` does. A failed item is removed from its destination, as is every item
+        left incomplete by a cancel; the other items are copied regardless. Folders in
+        `listings` were walked already (see CopyPlan)."""
+        results = [0] * len(pairs)
+        to_plan = []
+        journal = self.journal
+        resuming = self._is_resuming
+        for i, (src, dest) in enumerate(pairs):
+            if src == dest or self.is_cancelled:
+                continue
+            if journal is not None and i in journal.completed_items:
+                results[i] = 1
+                continue
+            if self.fast_copy and not self.verify and _clonefile is not None and \
+                    self._clone_item(src, dest):
+                results[i] = 1
+                continue
+            to_plan.append(i)
+
+        plan = CopyPlan([pairs[i] for i in to_plan], listings)
+        self.skipped_files.extend(plan.special_files)
+        with self._lock:
+            self.progress.bytes_total += plan.bytes_total
+            self.progress.files_total += len(plan.files)
+        failed = set(plan.failed_items)
+        # Items whose destination was already there: not removed when they fail
+        not_created = set()
+        # Folders and files of each item not created yet
+        entries_left = list(plan.entries_per_item)
+
+        # 1. Folders, parents first
+        for _, dest_dir, item_index in plan.dirs:
+            if item_index in failed or self.is_cancelled:
+                continue
+            try:
+                os.mkdir(dest_dir)
+            except FileExistsError:
+                # Already created by the job being resumed
+                if resuming and os.path.isdir(dest_dir):
+                    entries_left[item_index] -= 1
+                else:
+                    failed.add(item_index)
+                    if dest_dir == plan.pairs[item_index][1]:
+                        not_created.add(item_index)
+            except OSError:
+                failed.add(item_index)
+            else:
+                entries_left[item_index] -= 1
+
+        # 2. Files, in parallel
+        def copy_planned_file(planned_file) -> Optional[bool]:
+            src, dest, size, item_index, is_symlink = planned_file
+            if self.is_cancelled or item_index in failed:
+                return None
+            if journal is not None and dest in journal.completed_files and os.path.lexists(dest):
+                self._add_progress(size, 1)
+                with self._lock:
+                    entries_left[item_index] -= 1
+                return True
+            try:
+                self._copy_file(src, dest, is_symlink)
+            except CopyCancelled:
+                return None
+            except FileExistsError:
+                failed.add(item_index)
+                if dest == plan.pairs[item_index][1]:
+                    not_created.add(item_index)
+                return False
+            except OSError:
+                failed.add(item_index)
+                return False
+            with self._lock:
+                entries_left[item_index] -= 1
+            return True
+
+        files = [f for f in plan.files if f[3] not in failed]
+        if files and not self.is_cancelled:
+            if len(files) == 1:
+                copy_planned_file(files[0])
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.num_workers, len(files))) as executor:
+                    for _ in executor.map(copy_planned_file, files):
+                        pass
+
+        # 3. Folder metadata last, children before parents, as creating their entries
+        # changed the folders' times
+        for src_dir, dest_dir, item_index in reversed(plan.dirs):
+            if item_index not in failed and entries_left[item_index] == 0:
+                try:
+                    shutil.copystat(src_dir, dest_dir)
+                except OSError:
+                    pass
+
+        for plan_index, i in enumerate(to_plan):
+            if plan_index in failed:
+                results[i] = -1
+            elif entries_left[plan_index] == 0:
+                results[i] = 1
+            # A checkpoint keeps incomplete items, for the job to be resumed
+            if (results[i] == -1 or (results[i] == 0 and not self.is_checkpointed)) and \
+                    plan_index not in not_created:
+                _remove_partial(pairs[i][1])
+        return results
+
+    def rename_item(self, src: str, dest: str) -> bool:
+        """Move `src` to `dest` with a single (atomic) rename when both are on the same volume.
+        False when that isn't possible - another volume, or `dest` exists - and the item
+        should be copied (and the copy verified) instead."""
+        if self.is_cancelled or os.path.lexists(dest) or \
+                not is_same_device(src, os.path.dirname(dest)):
+            return False
+        try:
+            os.rename(src, dest)
+        except OSError:     # EXDEV for a mount point within the folder, permissions, ...
+            return False
+        with self._lock:
+            self.progress.files_total += 1
+        self._count_method(COPY_METHOD_RENAME)
+        self._add_progress(num_files=1, current_file=src)
+        return True
+
+    @staticmethod
+    def verify_copy(src: str, dest: str) -> bool:
+        """Whether the copy `dest` holds as many files and bytes as `src`, so that `src`
+        may be removed."""
+        return os.path.lexists(dest) and measure_item(src) == measure_item(dest)
+
+    @property
+    def _is_resuming(self) -> bool:
+        return self.journal is not None and self.journal.resumed
+
+    def _clone_item(self, src: str, dest: str) -> bool:
+        """clonefile() a file or a whole folder (macOS, within one APFS volume); False when
+        it isn't possible and the item should be copied instead."""
+        if not is_same_device(src, os.path.dirname(dest)):
+            return False
+        if _clonefile(os.fsencode(src), os.fsencode(dest), CLONE_NOFOLLOW) != 0:
+            return False
+        num_bytes, num_files = measure_item(dest)
+        with self._lock:
+            self.progress.bytes_total += num_bytes
+            self.progress.files_total += num_files
+        self._count_method(COPY_METHOD_CLONE)
+        self._add_progress(num_bytes, num_files, current_file=src)
+        return True
+
+    def _copy_file(self, src: str, dest: str, is_symlink: bool):
+        self._running_event.wait()
+        if self.is_cancelled:
+            raise CopyCancelled()
+        if is_symlink:
+            if self._is_resuming and os.path.lexists(dest):
+                os.remove(dest)     # Left by the job being resumed
+            os.symlink(os.readlink(src), dest)
+        else:
+            if not self._is_resuming and os.path.lexists(dest):
+                # Appeared since the job was planned: never renamed over
+                raise FileExistsError(errno.EEXIST, "Already exists", dest)
+            temp_path = partial_path(dest)
+            # What the source was when copying started, for the journal to tell if it changed
+            src_st = os.stat(src) if self.journal is not None else None
+            # A verified copy can't resume: the hash of the data already copied is lost
+            offset = self.journal.resume_offset(dest, src_st) if self.journal is not None and not self.verify else 0
+            attempt = 0
+            while True:
+                try:
+                    self._copy_file_data(src, temp_path, offset)
+                    break
+                except VerificationFailed:
+                    with self._lock:
+                        self.verify_failures.append(src)
+                    if attempt >= VERIFY_RETRIES:
+                        raise
+                    attempt += 1
+                    # The bytes are copied again
+                    self._add_progress(-os.stat(src).st_size)
+                except CopyCancelled:
+                    if self.is_checkpointed and self.journal is not None and os.path.exists(temp_path):
+                        self.journal.checkpoint_partial(dest, os.path.getsize(temp_path), src_st)
+                    raise
+            shutil.copystat(src, temp_path)
+            os.replace(temp_path, dest)
+        if self.journal is not None:
+            self.journal.file_completed(dest)
+        self._add_progress(num_files=1, current_file=src)
+
+    def _copy_file_data(self, src: str, dest: str, offset: int = 0):
+        """Copy the data of `src` to `dest`; from byte `offset` when `dest` already holds
+        that many bytes of it."""
+        try:
+            with open(src, 'rb') as f_src, open(dest, 'r+b' if offset > 0 else 'wb') as f_dest:
+                if offset > 0:
+                    f_dest.truncate(offset)
+                    f_src.seek(offset)
+                    f_dest.seek(offset)
+                    self._add_progress(offset)
+                if self.verify:
+                    # Hashed on the way, so through the buffer rather than in the kernel
+                    hasher = new_hasher(self.verify)
+                    self._copy_buffered(f_src, f_dest, hasher)
+                    self._count_method(COPY_METHOD_BUFFERED)
+                else:
+                    if self.fast_copy:
+                        if offset == 0 and self._clone_file_data(f_src, f_dest):
+                            return
+                        for method, copy_chunk in ((COPY_METHOD_COPY_FILE_RANGE, _copy_file_range_chunk),
+                                                   (COPY_METHOD_SENDFILE, _sendfile_chunk)):
+                            if copy_chunk is not None and \
+                                    self._copy_in_kernel(f_src, f_dest, copy_chunk, offset):
+                                self._count_method(method)
+                                return
+                    self._copy_buffered(f_src, f_dest)
+                    self._count_method(COPY_METHOD_BUFFERED)
+            if self.verify:
+                self._verify_file(dest, hasher.digest())
+        except CopyCancelled:
+            if not self.is_checkpointed:
+                _remove_partial(dest)
+            raise
+        except OSError:
+            _remove_partial(dest)
+            raise
+
+    def _verify_file(self, dest: str, expected_digest: bytes):
+        # Read back through the page cache (the copy was just written), not from the disk
+        started = time.perf_counter()
+        hasher = new_hasher(self.verify)
+        buffer = self._buffer()
+        view = memoryview(buffer)
+        try:
+            with open(dest, 'rb') as f:
+                while True:
+                    num_read = f.readinto(buffer)
+                    if not num_read:
+                        break
+                    hasher.update(view[:num_read])
+                    if self.is_cancelled:
+                        raise CopyCancelled()
+        finally:
+            view.release()
+            self._add_verify_seconds(time.perf_counter() - started)
+        if hasher.digest() != expected_digest:
+            raise VerificationFailed(errno.EIO, "The copy doesn't match its source", dest)
+
+    def _add_verify_seconds(self, seconds: float):
+        with self._lock:
+            self.verify_seconds += seconds
+
+    def _clone_file_data(self, f_src, f_dest) -> bool:
+        # FICLONE (Linux, Btrfs/XFS/...): the destination shares the source's blocks
+        if fcntl is None or not sys.platform.startswith('linux'):
+            return False
+        try:
+            fcntl.ioctl(f_dest.fileno(), FICLONE, f_src.fileno())
+        except OSError:
+            return False
+        self._count_method(COPY_METHOD_CLONE)
+        self._add_progress(os.fstat(f_src.fileno()).st_size)
+        return True
+
+    def _copy_in_kernel(self, f_src, f_dest, copy_chunk, offset: int = 0) -> bool:
+        """Copy from byte `offset` on in chunks with `copy_chunk` (copy_file_range /
+        sendfile). False when the method isn't supported here (nothing was copied yet)."""
+        src_fd, dest_fd = f_src.fileno(), f_dest.fileno()
+        copied = offset
+        while True:
+            try:
+                num_copied = copy_chunk(src_fd, dest_fd, copied, self._chunk_size(COPY_BUFFER_SIZE))
+            except OSError as e:
+                if copied == offset and e.errno in _UNSUPPORTED_ERRNOS:
+                    return False
+                raise
+            if num_copied == 0:
+                return True
+            copied += num_copied
+            self._add_progress(num_copied)
+            self._pace(num_copied)
+
+    def _copy_buffered(self, f_src, f_dest, hasher=None):
+        buffer = self._buffer()
+        view = memoryview(buffer)
+        hash_seconds = 0.0
+        try:
+            while True:
+                num_read = f_src.readinto(view[:self._chunk_size(self.buffer_size)])
+                if not num_read:
+                    break
+                f_dest.write(view[:num_read])
+                if hasher is not None:
+                    started = time.perf_counter()
+                    hasher.update(view[:num_read])
+                    hash_seconds += time.perf_counter() - started
+                self._add_progress(num_read)
+                self._pace(num_read)
+        finally:
+            view.release()
+            if hasher is not None:
+                self._add_verify_seconds(hash_seconds)
+
+
+def _copy_file_range_chunk(src_fd: int, dest_fd: int, offset: int, count: int) -> int:
+    return os.copy_file_range(src_fd, dest_fd, count, offset, offset)
+
+
+def _sendfile_chunk(src_fd: int, dest_fd: int, offset: int, count: int) -> int:
+    os.lseek(dest_fd, offset, os.SEEK_SET)
+    return os.sendfile(dest_fd, src_fd, offset, count)
+
+
+if not hasattr(os, 'copy_file_range'):
+    _copy_file_range_chunk = None
+# sendfile() only writes to regular files on Linux
+if not (hasattr(os, 'sendfile') and sys.platform.startswith('linux')):
+    _sendfile_chunk = None
+
+
+def _remove_partial(path: str):
+    try:
+        if os.path.isdir(path) and not os.path.islink(path):
+            shutil.rmtree(path)
+        elif os.path.lexists(path):
+            os.remove(path)
+    except OSError:
+        pass
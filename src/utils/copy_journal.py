@@ -0,0 +1,193 @@
+"""On-disk journal of a paste job, so that a paste stopped by quitting (or a crash) can be
+resumed on the next launch instead of starting over.
+
+Kept free of Qt and pyobjc so it is unit-testable; the Qt glue is ``PasteItemsThread`` and
+``PastingManager`` (``src/utils/pasting_items.py``).
+
+A journal is a JSON-lines file: its first record is the job (the (src, dest) pairs being
+copied), then one record per file copied, per item finished, and - when the job is
+checkpointed - per file left partly copied with the number of bytes already in it and the
+size and modification time its source had (a source changed since starts over). Each
+record is appended and flushed as it happens, so a crash loses at most the record being
+written (a torn last line is ignored when the journal is loaded). The journal is deleted
+once the job is done.
+
+While a file is being copied its data goes to a hidden temporary name next to its
+destination (``partial_path()``), renamed over the destination once complete, so a
+destination name never holds a partial file.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Optional
+
+
+JOURNAL_EXTENSION = '.jsonl'
+PARTIAL_SUFFIX = '.cfpartial'
+
+
+def partial_path(dest: str) -> str:
+    """Where the data of `dest` is written until it is complete."""
+    return os.path.join(os.path.dirname(dest), f".{os.path.basename(dest)}{PARTIAL_SUFFIX}")
+
+
+class CopyJournal:
+    def __init__(self, path: str, pairs: list[tuple[str, str]] = None, dest_path: str = '',
+                 delete_source_after_paste: bool = False, created_at: float = None):
+        self.path = path
+        self.pairs = [tuple(pair) for pair in (pairs or [])]
+        self.dest_path = dest_path
+        self.delete_source_after_paste = delete_source_after_paste
+        self.created_at = created_at if created_at is not None else time.time()
+        self.completed_files = set()    # Destination paths
+        self.completed_items = set()    # Indices into `pairs`
+        self.partial_offsets = {}       # Destination path -> bytes in its partial file
+        self.partial_sources = {}       # Destination path -> (size, mtime_ns) of its source
+        # Loaded from disk: the job was interrupted, and what's in its destination is its own
+        self.resumed = False
+        self._file = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, journal_dir: str, pairs: list[tuple[str, str]], dest_path: str,
+               delete_source_after_paste: bool) -> 'CopyJournal':
+        os.makedirs(journal_dir, exist_ok=True)
+        journal = cls(os.path.join(journal_dir, uuid.uuid4().hex + JOURNAL_EXTENSION), pairs,
+                      dest_path, delete_source_after_paste)
+        journal._append({'type': 'job', 'pairs': journal.pairs, 'dest_path': dest_path,
+                         'delete_source_after_paste': delete_source_after_paste,
+                         'created_at': journal.created_at})
+        return journal
+
+    @classmethod
+    def load(cls, path: str) -> Optional['CopyJournal']:
+        """The journal at `path`; None if it can't be read or has no job record."""
+        journal = None
+        try:
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:      # Torn by a crash while being written
+                        break
+                    if record.get('type') == 'job':
+                        journal = cls(path, record['pairs'], record.get('dest_path', ''),
+                                      record.get('delete_source_after_paste', False),
+                                      record.get('created_at'))
+                        journal.resumed = True
+                    elif journal is not None:
+                        journal._apply(record)
+        except (OSError, KeyError, TypeError):
+            return None
+        return journal
+
+    def _apply(self, record: dict):
+        if record['type'] == 'file':
+            self.completed_files.add(record['dest'])
+            self.partial_offsets.pop(record['dest'], None)
+            self.partial_sources.pop(record['dest'], None)
+        elif record['type'] == 'item':
+            self.completed_items.add(record['index'])
+        elif record['type'] == 'partial':
+            self.partial_offsets[record['dest']] = record['offset']
+            if 'src_size' in record and 'src_mtime_ns' in record:
+                self.partial_sources[record['dest']] = (record['src_size'], record['src_mtime_ns'])
+
+    def _append(self, record: dict, sync: bool = False):
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            self._file.write(json.dumps(record) + '\n')
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+
+    def file_completed(self, dest: str):
+        self.completed_files.add(dest)
+        self._append({'type': 'file', 'dest': dest})
+
+    def item_completed(self, index: int):
+        self.completed_items.add(index)
+        self._append({'type': 'item', 'index': index})
+
+    def checkpoint_partial(self, dest: str, offset: int, src_st: os.stat_result):
+        """`offset` bytes of `dest` are in its partial file, copied from a source which
+        had the size and modification time of `src_st`."""
+        self.partial_offsets[dest] = offset
+        self.partial_sources[dest] = (src_st.st_size, src_st.st_mtime_ns)
+        self._append({'type': 'partial', 'dest': dest, 'offset': offset,
+                      'src_size': src_st.st_size, 'src_mtime_ns': src_st.st_mtime_ns}, sync=True)
+
+    def resume_offset(self, dest: str, src_st: os.stat_result) -> int:
+        """Bytes of `dest` already in its partial file (0 to start over), never more than
+        the partial file actually holds. A source (`src_st`) whose size or modification
+        time changed since it was checkpointed starts over: its partial data may be stale."""
+        offset = self.partial_offsets.get(dest, 0)
+        if offset <= 0:
+            return 0
+        if self.partial_sources.get(dest) != (src_st.st_size, src_st.st_mtime_ns):
+            return 0
+        try:
+            return min(offset, os.path.getsize(partial_path(dest)))
+        except OSError:
+            return 0
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+    def remove(self, remove_partial_files: bool = False):
+        self.close()
+        if remove_partial_files:
+            for dest in self.partial_offsets:
+                try:
+                    os.remove(partial_path(dest))
+                except OSError:
+                    pass
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def discard(self):
+        """Give up on the job: remove what it left of the items it didn't finish, and the
+        journal."""
+        for index, (_, dest) in enumerate(self.pairs):
+            if index in self.completed_items:
+                continue
+            try:
+                if os.path.isdir(dest) and not os.path.islink(dest):
+                    shutil.rmtree(dest)
+                elif os.path.lexists(dest):
+                    os.remove(dest)
+            except OSError:
+                pass
+        self.remove(remove_partial_files=True)
+
+
+def pending_journals(journal_dir: str) -> list[CopyJournal]:
+    """Journals of paste jobs which didn't finish, oldest first."""
+    try:
+        names = [name for name in os.listdir(journal_dir) if name.endswith(JOURNAL_EXTENSION)]
+    except OSError:
+        return []
+    journals = []
+    for name in names:
+        journal = CopyJournal.load(os.path.join(journal_dir, name))
+        if journal is not None:
+            journals.append(journal)
+        else:
+            try:
+                os.remove(os.path.join(journal_dir, name))
+            except OSError:
+                pass
+    journals.sort(key=lambda journal: journal.created_at)
+    return journals
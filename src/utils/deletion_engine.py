@@ -0,0 +1,309 @@
+"""Deletion engine used by the deletion threads: moves items to the trash in batches, or
+deletes them permanently with folders removed in parallel, and reports progress (entries
+removed, items left, entries per second) and the error of every item which couldn't be
+deleted.
+
+Moving to the trash goes through ``send2trash`` a batch of paths per call rather than one
+call per path. A permanent delete of a folder is a bottom-up removal spread over a pool of
+threads: each folder is listed once (``os.scandir``) by a task of the pool, which removes its
+files and hands its subfolders to the pool; a folder is removed by whichever task removed its
+last subfolder, so the tree is never walked twice. Huge trees are bound by per-entry system
+calls, which the threads issue in parallel.
+
+Kept free of Qt and pyobjc so it is unit-testable; the Qt glue is ``DeletionThread``
+(``src/utils/file_explorer_utils.py``).
+"""
+
+import errno
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+try:
+    from send2trash import send2trash
+except ImportError:     # The trash is then unavailable; permanent deletes still work
+    send2trash = None
+
+
+DELETION_WORKERS = 8
+# Paths moved to the trash per send2trash call
+TRASH_BATCH_SIZE = 64
+PROGRESS_INTERVAL_SECONDS = 0.1
+
+
+class DeletionProgress:
+    """Progress of a deletion job: `items_done` of `items_total` are the paths given (a
+    folder counts once), `entries_removed` every file and folder removed so far."""
+    __slots__ = ('items_done', 'items_total', 'entries_removed', 'num_errors', 'current_item',
+                 'started_at', 'finished')
+
+    def __init__(self, items_done: int = 0, items_total: int = 0, entries_removed: int = 0,
+                 num_errors: int = 0, current_item: str = '', started_at: float = None,
+                 finished: bool = False):
+        self.items_done = items_done
+        self.items_total = items_total
+        self.entries_removed = entries_removed
+        self.num_errors = num_errors
+        self.current_item = current_item
+        self.started_at = time.monotonic() if started_at is None else started_at
+        self.finished = finished
+
+    def copy(self) -> 'DeletionProgress':
+        return DeletionProgress(self.items_done, self.items_total, self.entries_removed,
+                                self.num_errors, self.current_item, self.started_at,
+                                self.finished)
+
+    @property
+    def items_left(self) -> int:
+        return self.items_total - self.items_done
+
+    @property
+    def entries_per_second(self) -> float:
+        elapsed = time.monotonic() - self.started_at
+        return self.entries_removed / elapsed if elapsed > 0 else 0.0
+
+
+class DeletionEngine:
+    """
+    Deletes items - to the trash with `trash_items()`, permanently with `delete_items()` -
+    calling `on_progress` with a DeletionProgress snapshot at most every
+    `progress_interval` seconds. Both return a 1 / 0 / -1 result per path (deleted / not
+    reached because cancelled / failed) and collect a (path, error message) pair for every
+    entry which couldn't be removed in `errors`; an item failing doesn't stop the others.
+    `cancel()` may be called from any thread.
+    """
+    def __init__(self, on_progress: Optional[Callable[[DeletionProgress], None]] = None,
+                 progress_interval: float = PROGRESS_INTERVAL_SECONDS,
+                 num_workers: int = DELETION_WORKERS, trash_batch_size: int = TRASH_BATCH_SIZE,
+                 trash: Optional[Callable] = None, worker_initializer: Optional[Callable] = None):
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.num_workers = num_workers
+        self.trash_batch_size = trash_batch_size
+        # Takes a path or a list of paths, like send2trash
+        self.trash = trash if trash is not None else send2trash
+        # Called in each thread of the pool, e.g. to lower its priority
+        self.worker_initializer = worker_initializer
+        self.errors = []
+        self.progress = DeletionProgress()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._next_progress = 0.0
+
+    def cancel(self):
+        self._stop_event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._stop_event.is_set()
+
+    def _start(self, num_items: int):
+        self._stop_event.clear()
+        self.errors = []
+        self.progress = DeletionProgress(items_total=num_items)
+        self._report(force=True)
+
+    def _finish(self):
+        self.progress.finished = True
+        self._report(force=True)
+
+    def _report(self, force: bool = False):
+        if self.on_progress is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if not force and now < self._next_progress:
+                return
+            self._next_progress = now + self.progress_interval
+            snapshot = self.progress.copy()
+        self.on_progress(snapshot)
+
+    def _add_progress(self, num_items: int = 0, num_entries: int = 0, current_item: str = None):
+        with self._lock:
+            self.progress.items_done += num_items
+            self.progress.entries_removed += num_entries
+            if current_item is not None:
+                self.progress.current_item = current_item
+        self._report()
+
+    def _add_error(self, path: str, error: Exception):
+        with self._lock:
+            self.errors.append((path, getattr(error, 'strerror', None) or str(error)))
+            self.progress.num_errors += 1
+
+    """
+    To the trash
+    """
+    def trash_items(self, paths: list[str]) -> list[int]:
+        self._start(len(paths))
+        results = [0] * len(paths)
+        for start in range(0, len(paths), self.trash_batch_size):
+            if self.is_cancelled:
+                break
+            batch = range(start, min(start + self.trash_batch_size, len(paths)))
+            existing = []
+            for i in batch:
+                if os.path.lexists(paths[i]):
+                    existing.append(i)
+                else:
+                    results[i] = -1
+                    self._add_error(paths[i], FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT)))
+                    self._add_progress(1)
+            if not existing:
+                continue
+            try:
+                if self.trash is None:
+                    raise OSError(errno.ENOTSUP, "send2trash isn't installed")
+                self.trash([paths[i] for i in existing])
+            except Exception:
+                # Some path of the batch failed (maybe after others were moved): retried one
+                # by one, for the error of each
+                self._trash_one_by_one(paths, existing, results)
+            else:
+                for i in existing:
+                    results[i] = 1
+                self._add_progress(len(existing), len(existing), paths[existing[-1]])
+        self._finish()
+        return results
+
+    def _trash_one_by_one(self, paths: list[str], indices: list[int], results: list[int]):
+        for i in indices:
+            if not os.path.lexists(paths[i]):
+                # Moved by the failed batch call
+                results[i] = 1
+                self._add_progress(1, 1, paths[i])
+                continue
+            try:
+                if self.trash is None:
+                    raise OSError(errno.ENOTSUP, "send2trash isn't installed")
+                self.trash(paths[i])
+            except Exception as e:
+                results[i] = -1
+                self._add_error(paths[i], e)
+                self._add_progress(1)
+            else:
+                results[i] = 1
+                self._add_progress(1, 1, paths[i])
+
+    """
+    Permanently
+    """
+    def delete_items(self, paths: list[str]) -> list[int]:
+        self._start(len(paths))
+        results = [0] * len(paths)
+        trees = []
+        for i, path in enumerate(paths):
+            if self.is_cancelled:
+                break
+            try:
+                is_folder = os.path.isdir(path) and not os.path.islink(path)
+                if not is_folder:
+                    os.remove(path)
+            except OSError as e:
+                results[i] = -1
+                self._add_error(path, e)
+                self._add_progress(1)
+                continue
+            if is_folder:
+                trees.append(i)
+            else:
+                results[i] = 1
+                self._add_progress(1, 1, path)
+
+        if trees and not self.is_cancelled:
+            with ThreadPoolExecutor(max_workers=self.num_workers,
+                                    initializer=self.worker_initializer) as executor:
+                removals = [_TreeRemoval(self, executor, paths[i]) for i in trees]
+                for removal in removals:
+                    removal.start()
+                for i, removal in zip(trees, removals):
+                    removal.done.wait()
+                    if removal.removed:
+                        results[i] = 1
+                    elif not self.is_cancelled or removal.failed:
+                        results[i] = -1
+                    self._add_progress(1, current_item=paths[i])
+        self._finish()
+        return results
+
+
+class _TreeRemoval:
+    """Removes the folder `root` and everything below it on `executor` (see above)."""
+    def __init__(self, engine: DeletionEngine, executor: ThreadPoolExecutor, root: str):
+        self.engine = engine
+        self.executor = executor
+        self.root = root
+        self.done = threading.Event()
+        self.removed = False
+        self.failed = False
+        self._lock = threading.Lock()
+        self._subfolders_left = {}      # Folder -> its subfolders not removed yet
+        self._parents = {}
+
+    def start(self):
+        self.executor.submit(self._clear_folder, self.root)
+
+    def _clear_folder(self, path: str):
+        # Removes the files of `path`, and hands its subfolders to the pool
+        subfolders = []
+        num_removed = 0
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if self.engine.is_cancelled:
+                        break
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subfolders.append(entry.path)
+                        else:
+                            os.unlink(entry.path)
+                            num_removed += 1
+                    except OSError as e:
+                        self.failed = True
+                        self.engine._add_error(entry.path, e)
+        except OSError as e:
+            self.failed = True
+            self.engine._add_error(path, e)
+        except Exception as e:     # Never leave the item waiting on `done`
+            self.failed = True
+            self.engine._add_error(path, e)
+        self.engine._add_progress(num_entries=num_removed)
+
+        if self.engine.is_cancelled:
+            subfolders = []
+        with self._lock:
+            self._subfolders_left[path] = len(subfolders)
+            for subfolder in subfolders:
+                self._parents[subfolder] = path
+        if subfolders:
+            for subfolder in subfolders:
+                self.executor.submit(self._clear_folder, subfolder)
+        else:
+            self._remove_folder(path)
+
+    def _remove_folder(self, path: str):
+        # `path` is empty (but for entries which failed): removed, then its parent too if
+        # it was the last subfolder left in it
+        while True:
+            try:
+                os.rmdir(path)
+            except OSError as e:
+                # Not empty: an entry below it failed, or the removal was cancelled
+                if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                    self.failed = True
+                    self.engine._add_error(path, e)
+            else:
+                self.engine._add_progress(num_entries=1)
+                if path == self.root:
+                    self.removed = True
+            if path == self.root:
+                self.done.set()
+                return
+            with self._lock:
+                parent = self._parents.pop(path)
+                self._subfolders_left[parent] -= 1
+                if self._subfolders_left[parent] > 0:
+                    return
+            path = parent
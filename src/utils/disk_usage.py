@@ -0,0 +1,339 @@
+"""Disk-usage analysis: a parallel scan building a compact tree of folder totals, and the
+squarified treemap layout drawn from it.
+
+Kept free of Qt and pyobjc so it is unit-testable; the Qt glue is
+``src/ui_components/misc_widgets/disk_usage_window.py``.
+
+The tree holds one ``DirNode`` (a ``__slots__`` object) per folder and nothing per file:
+a folder keeps the totals of the files directly in it and only its
+``LARGEST_FILES_PER_DIR`` largest files, so the memory used grows with the number of
+folders rather than files. The largest files of each folder's whole subtree are kept up
+to date as the scan goes, so showing them never walks the tree. The totals of a folder and all its ancestors are updated as
+soon as the folder is listed, so the tree can be displayed (and drilled into) while the
+scan is still running, and drilling into a sub-folder never scans it again.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from src.utils.prune_rules import PruneRules
+from src.utils.size_engine import (PROGRESS_INTERVAL_SECONDS, SIZE_MODE_ALLOCATED, SIZE_MODE_APPARENT,
+                                   SizeSnapshot, allocated_size)
+
+
+LARGEST_FILES_PER_DIR = 16
+
+
+class DirNode:
+    """A scanned folder. The root node's name is its full path; every other node's name is
+    its folder name. `largest_files` are (size, name) pairs, in no particular order;
+    `largest_below` is a min-heap of the largest files of the whole subtree, as
+    (size, sequence number, name, node of the folder holding it)."""
+    __slots__ = ('name', 'parent', 'children', 'own_bytes', 'own_files', 'total_bytes',
+                 'total_files', 'largest_files', 'largest_below', 'errors')
+
+    def __init__(self, name: str, parent: Optional['DirNode'] = None):
+        self.name = name
+        self.parent = parent
+        self.children = []
+        self.own_bytes = 0
+        self.own_files = 0
+        self.total_bytes = 0
+        self.total_files = 0
+        self.largest_files = []
+        self.largest_below = []
+        self.errors = 0
+
+    @property
+    def path(self) -> str:
+        names = []
+        node = self
+        while node.parent is not None:
+            names.append(node.name)
+            node = node.parent
+        return os.path.join(node.name, *reversed(names))
+
+    def entries(self) -> list[tuple[int, str, Optional['DirNode']]]:
+        """What the folder holds, largest first, as (size, name, node) - `node` is None for
+        files. Files beyond the largest few are summed up into one "N other files" entry."""
+        entries = [(child.total_bytes, child.name, child) for child in list(self.children)]
+        largest_files = list(self.largest_files)
+        entries.extend((size, name, None) for size, name in largest_files)
+        other_files = self.own_files - len(largest_files)
+        if other_files > 0:
+            other_bytes = self.own_bytes - sum(size for size, _ in largest_files)
+            entries.append((other_bytes, f"({other_files:,} other files)", None))
+        entries.sort(key=lambda entry: entry[0], reverse=True)
+        return entries
+
+    def largest_files_below(self, k: int = LARGEST_FILES_PER_DIR) -> list[tuple[int, str]]:
+        """The `k` largest files anywhere under this folder, as (size, path relative to it),
+        largest first. Exact for k <= LARGEST_FILES_PER_DIR. While a scan runs, call it
+        through ``DiskUsageScan.largest_files_below``."""
+        largest = []
+        for size, _, name, node in sorted(self.largest_below, reverse=True)[:k]:
+            names = [name]
+            while node is not self:
+                names.append(node.name)
+                node = node.parent
+            largest.append((size, os.path.join(*reversed(names))))
+        return largest
+
+
+class DiskUsageScan:
+    """
+    Scans `root` into a tree of DirNodes on a thread pool, sharing sub-folders with idle
+    workers the way FolderSizeScan does. Sizes are apparent or allocated according to
+    `size_mode`, and a file with several hard links is counted once.
+
+    `run()` blocks until the scan is done (or cancelled), calling `on_progress` with a
+    SizeSnapshot of the root's totals every `progress_interval` seconds (its `bytes` are in
+    the scan's size mode). `cancel()`, `snapshot()` and reading the tree are safe from any
+    thread while it runs.
+    """
+    def __init__(self, root: str, prune_rules: PruneRules = None, num_workers: int = None,
+                 size_mode: str = SIZE_MODE_APPARENT):
+        self.root = DirNode(os.path.abspath(root))
+        self.prune_rules = prune_rules or PruneRules(patterns=[])
+        self.num_workers = num_workers or min(32, (os.cpu_count() or 2) * 2)
+        self.size_mode = size_mode
+        self.folders = 0
+        self.errors = 0
+        self.finished = False
+        self._seen_hard_links = set()
+        self._file_sequence = itertools.count()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._all_done = threading.Condition(self._lock)
+        self._pending = 0
+        self._executor = None
+
+    def cancel(self):
+        self._stop_event.set()
+        with self._lock:
+            self._all_done.notify_all()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._stop_event.is_set()
+
+    def snapshot(self) -> SizeSnapshot:
+        with self._lock:
+            return self._snapshot()
+
+    def entries(self, node: DirNode) -> list[tuple[int, str, Optional[DirNode]]]:
+        """``node.entries()``, safe while the scan runs."""
+        with self._lock:
+            return node.entries()
+
+    def largest_files_below(self, node: DirNode,
+                            k: int = LARGEST_FILES_PER_DIR) -> list[tuple[int, str]]:
+        """``node.largest_files_below(k)``, safe while the scan runs."""
+        with self._lock:
+            return node.largest_files_below(k)
+
+    def _snapshot(self) -> SizeSnapshot:
+        return SizeSnapshot(self.root.total_bytes, self.root.total_files, self.folders,
+                            self.errors, self.finished)
+
+    def run(self, on_progress: Optional[Callable[[SizeSnapshot], None]] = None,
+            progress_interval: float = PROGRESS_INTERVAL_SECONDS) -> DirNode:
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            self._executor = executor
+            self._submit(self.prune_rules.new_walk(self.root.name), self.root, 0)
+            next_progress = time.monotonic() + progress_interval
+            with self._lock:
+                while self._pending > 0 and not self.is_cancelled:
+                    self._all_done.wait(timeout=max(0.0, next_progress - time.monotonic()))
+                    if on_progress is not None and time.monotonic() >= next_progress:
+                        snapshot = self._snapshot()
+                        self._lock.release()
+                        try:
+                            on_progress(snapshot)
+                        finally:
+                            self._lock.acquire()
+                        next_progress = time.monotonic() + progress_interval
+            executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            self.finished = not self.is_cancelled
+        if on_progress is not None:
+            on_progress(self.snapshot())
+        return self.root
+
+    def _submit(self, prune_walk, node: DirNode, depth: int):
+        with self._lock:
+            self._pending += 1
+        try:
+            self._executor.submit(self._scan_subtree, prune_walk, node, depth)
+        except RuntimeError:    # The executor is shutting down (cancelled)
+            self._task_done()
+
+    def _task_done(self):
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self._all_done.notify_all()
+
+    def _scan_subtree(self, prune_walk, node: DirNode, depth: int):
+        try:
+            stack = [(node, depth)]
+            while stack and not self.is_cancelled:
+                current_node, current_depth = stack.pop()
+                for child in self._list_directory(prune_walk, current_node, current_depth):
+                    # Share work with idle workers, otherwise keep it
+                    if self._pending < self.num_workers:
+                        self._submit(prune_walk, child, current_depth + 1)
+                    else:
+                        stack.append((child, current_depth + 1))
+        finally:
+            self._task_done()
+
+    def _list_directory(self, prune_walk, node: DirNode, depth: int) -> list[DirNode]:
+        path = node.path
+        children = []
+        own_bytes = own_files = errors = 0
+        largest_files = []
+        hard_linked_files = []
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    try:
+                        if prune_walk.should_descend(entry, depth + 1):
+                            children.append(DirNode(entry.name, node))
+                            continue
+                        if entry.is_dir(follow_symlinks=prune_walk.rules.follow_symlinks):
+                            continue
+                        st = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        errors += 1
+                        continue
+                    size = allocated_size(st) if self.size_mode == SIZE_MODE_ALLOCATED else st.st_size
+                    if st.st_nlink > 1:
+                        hard_linked_files.append(((st.st_dev, st.st_ino), size, entry.name))
+                        continue
+                    own_files += 1
+                    own_bytes += size
+                    _keep_largest(largest_files, size, entry.name)
+        except OSError:
+            errors += 1
+
+        with self._lock:
+            for key, size, name in hard_linked_files:
+                if key not in self._seen_hard_links:
+                    self._seen_hard_links.add(key)
+                    own_files += 1
+                    own_bytes += size
+                    _keep_largest(largest_files, size, name)
+            node.own_bytes = own_bytes
+            node.own_files = own_files
+            node.largest_files = largest_files
+            node.children = children
+            node.errors = errors
+            self.folders += len(children)
+            self.errors += errors
+            ancestor = node
+            while ancestor is not None:
+                ancestor.total_bytes += own_bytes
+                ancestor.total_files += own_files
+                ancestor = ancestor.parent
+            # A file which doesn't make it into a folder's largest files doesn't make it into
+            # those of its parent (a superset) either, so this rarely goes far up
+            files = [(size, next(self._file_sequence), name, node) for size, name in largest_files]
+            ancestor = node
+            while ancestor is not None and files:
+                files = [file for file in files if _keep_largest_below(ancestor, file)]
+                ancestor = ancestor.parent
+        return children
+
+
+def _keep_largest(largest_files: list[tuple[int, str]], size: int, name: str):
+    # A min-heap of the folder's LARGEST_FILES_PER_DIR largest files
+    if len(largest_files) < LARGEST_FILES_PER_DIR:
+        heapq.heappush(largest_files, (size, name))
+    elif size > largest_files[0][0]:
+        heapq.heapreplace(largest_files, (size, name))
+
+
+def _keep_largest_below(node: DirNode, file: tuple[int, int, str, DirNode]) -> bool:
+    # A min-heap of the LARGEST_FILES_PER_DIR largest files of the subtree; True if `file`
+    # made it in
+    if len(node.largest_below) < LARGEST_FILES_PER_DIR:
+        heapq.heappush(node.largest_below, file)
+        return True
+    if file[0] > node.largest_below[0][0]:
+        heapq.heapreplace(node.largest_below, file)
+        return True
+    return False
+
+
+"""
+Treemap layout
+"""
+
+
+def _worst_aspect_ratio(row_sum: float, row_max: float, row_min: float, side: float) -> float:
+    if row_min <= 0 or side <= 0:
+        return float('inf')
+    side_sq = side * side
+    sum_sq = row_sum * row_sum
+    return max(side_sq * row_max / sum_sq, sum_sq / (side_sq * row_min))
+
+
+def squarify(sizes: list[float], x: float, y: float, width: float,
+             height: float) -> list[tuple[float, float, float, float]]:
+    """Lay out `sizes` (largest first) as rectangles (x, y, width, height) tiling the given
+    rectangle, with areas proportional to the sizes and aspect ratios kept close to 1 (the
+    squarified algorithm of Bruls, Huizing and van Wijk). Returns one rectangle per size, in
+    the same order; zero sizes get empty rectangles."""
+    rects = [(x, y, 0.0, 0.0)] * len(sizes)
+    n = 0
+    while n < len(sizes) and sizes[n] > 0:
+        n += 1
+    total = sum(sizes[:n])
+    if total <= 0 or width <= 0 or height <= 0:
+        return rects
+    scale = width * height / total
+    areas = [size * scale for size in sizes[:n]]
+
+    i = 0
+    while i < n:
+        side = min(width, height)
+        # Grow the row while that improves its worst aspect ratio
+        row_end = i + 1
+        row_sum = areas[i]
+        worst = _worst_aspect_ratio(row_sum, areas[i], areas[i], side)
+        while row_end < n:
+            new_worst = _worst_aspect_ratio(row_sum + areas[row_end], areas[i], areas[row_end], side)
+            if new_worst > worst:
+                break
+            worst = new_worst
+            row_sum += areas[row_end]
+            row_end += 1
+
+        if width >= height:
+            # A column along the left side
+            column_width = min(width, row_sum / height)
+            offset = y
+            for j in range(i, row_end):
+                item_height = areas[j] / column_width
+                rects[j] = (x, offset, column_width, item_height)
+                offset += item_height
+            x += column_width
+            width = max(0.0, width - column_width)
+        else:
+            # A row along the top
+            row_height = min(height, row_sum / width)
+            offset = x
+            for j in range(i, row_end):
+                item_width = areas[j] / row_height
+                rects[j] = (offset, y, item_width, row_height)
+                offset += item_width
+            y += row_height
+            height = max(0.0, height - row_height)
+        i = row_end
+    return rects
@@ -2,15 +2,39 @@ import os
 import zipfile
 from PySide6 import QtWidgets, QtCore
 from PySide6.QtGui import QFont, QColor, QBrush, QCursor
+import threading
+import time
 from PySide6.QtCore import Qt, QItemSelectionModel, Signal, QThread, QTimer
-from src.shared.vars import conf_manager as conf, logger as logger
-from src.utils.os_utils import (open_application, extract_filename_from_path, delete_item,
-                                move_to_trash, extract_extension_from_path, dir_)
+from src.shared.vars import conf_manager as conf, logger as logger, folder_size_cache
+from src.utils.size_engine import FolderSizeScan
+from src.utils.os_utils import (open_application, extract_filename_from_path,
+                                extract_extension_from_path, dir_)
+from src.utils.deletion_engine import DeletionEngine, DeletionProgress
+from src.utils.staged_deletion import (StagedDeletions, StagedItem, lower_io_priority,
+                                       PURGE_DELAY_SECONDS, PURGE_WORKERS, PENDING_RECHECK_SECONDS)
 from src.utils.utils import get_max_integer_suffix_among_strings_with_prefix
 from src.shared.vars import threads_server
 from PySide6.QtWidgets import (QMessageBox, QLabel, QLineEdit, QPushButton, QHBoxLayout, QDialog,
                                QVBoxLayout)
-from src.ui_components.misc_widgets.dialogs_and_messages import message_box_w_arrow_keys_enabled
+from src.ui_components.misc_widgets.dialogs_and_messages import message_box_w_arrow_keys_enabled, \
+    QDialogFreeTextButtons
+
+
+# Threads told to stop which haven't finished yet (see release_stopping_thread)
+_stopping_threads = set()
+
+
+def release_stopping_thread(thread: QThread):
+    """Let a thread which was told to stop (and whose signals were disconnected) finish on its
+    own, rather than wait() for it on the GUI thread - which would freeze until the folder it
+    is listing is done. It's kept referenced until it finishes, as a running QThread mustn't
+    be destroyed, then deleted."""
+    _stopping_threads.add(thread)
+    thread.finished.connect(lambda: _stopping_threads.discard(thread))
+    thread.finished.connect(thread.deleteLater)
+    if thread.isFinished():
+        _stopping_threads.discard(thread)
+        thread.deleteLater()
 
 
 def map_shortcut_name_to_func(file_explorer_obj, action_name: str):
@@ -336,27 +360,237 @@ class MyStyledItem(QtWidgets.QStyledItemDelegate):
 
 class DeletionThread(QThread):
     """
-    Supports deleting items in a separate thread to avoid blocking the UI
+    Supports deleting items in a separate thread to avoid blocking the UI (see DeletionEngine).
+    Emits `progress` (a DeletionProgress) while deleting, then `finished_deleting` with the
+    paths deleted and the (path, error message) pairs of what couldn't be.
     """
+    progress = Signal(object)
+    finished_deleting = Signal(list, list)
+
     def __init__(self, paths, permanently):
         super().__init__()
         self.paths = paths
         self.permanently = permanently
         self.currently_running = False
+        self.engine = DeletionEngine(on_progress=self.progress.emit)
+
+    def cancel(self):
+        self.engine.cancel()
 
     def run(self):
         self.currently_running = True
-        success = 0
-        for path in self.paths:
-            if success == -1:
-                break
-            if self.permanently:
-                success = delete_item(path)
-            else:
-                success = move_to_trash(path)
+        if self.permanently:
+            results = self.engine.delete_items(self.paths)
+        else:
+            results = self.engine.trash_items(self.paths)
         self.currently_running = False
+        self.finished_deleting.emit([path for path, result in zip(self.paths, results) if result == 1],
+                                    self.engine.errors)
+
+
+class ItemsDeleter:
+    """
+    Runs a DeletionThread, showing its progress (with a Cancel button) once it takes more
+    than a second, and calls `when_done(deleted_paths, errors)` when it's over.
+    """
+    def __init__(self, paths, permanently, when_done):
+        self.deletion_thread = DeletionThread(paths, permanently)
+        self.when_done = when_done
+        self.message_box = QDialogFreeTextButtons(button_texts=["Cancel"],
+                                                  title_text="Deleting items",
+                                                  message_text="Deleting...",
+                                                  btn_width=100)
+        self.message_box.accepted.connect(self.deletion_thread.cancel)
+
+    @property
+    def currently_running(self):
+        return self.deletion_thread.currently_running
+
+    def quit(self):
+        self.deletion_thread.quit()
+
+    def run(self):
+        self.deletion_thread.progress.connect(self.update_progress)
+        self.deletion_thread.finished_deleting.connect(self.deletion_finished)
+        self.deletion_thread.start()
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.message_box.show)
+        self.timer.start(1000)
+
+    def update_progress(self, progress: DeletionProgress):
+        self.message_box.set_message_text(
+            f"{progress.items_done:,} of {progress.items_total:,} items deleted"
+            f" ({progress.items_left:,} left) - {progress.entries_removed:,} files and folders"
+            f" removed, {progress.entries_per_second:,.0f}/s"
+            + (f" - {progress.num_errors:,} errors" if progress.num_errors > 0 else ""))
+
+    def deletion_finished(self, deleted_paths: list[str], errors: list[tuple[str, str]]):
+        self.timer.stop()
+        self.message_box.hide()
+        self.when_done(deleted_paths, errors)
+
 
 
+class StagedPurgeThread(QThread):
+    """
+    Purges staged deletes (see staged_deletion) in the background, with few threads at the
+    lowest I/O priority, each once it was staged for `delay_seconds` - until then it can be
+    restored. Items left staged by an earlier run are purged as soon as the thread starts,
+    and the pending items are looked for again every PENDING_RECHECK_SECONDS (those on a
+    volume which wasn't mounted, or whose purge failed).
+    """
+    def __init__(self, staged_deletions: StagedDeletions, delay_seconds: float = PURGE_DELAY_SECONDS):
+        super().__init__()
+        self.staged_deletions = staged_deletions
+        self.delay_seconds = delay_seconds
+        self.queue = []
+        self.queue_lock = threading.Lock()
+        self.wake_event = threading.Event()
+        self.stopped = False
+        self.current_engine = None
+        self.next_pending_check = 0.0
+
+    def add(self, items: list[StagedItem]):
+        with self.queue_lock:
+            self.queue.extend(items)
+        self.wake_event.set()
+
+    def stop(self):
+        # A purge cut short is recorded again, and finished on the next launch
+        self.stopped = True
+        if self.current_engine is not None:
+            self.current_engine.cancel()
+        self.wake_event.set()
+
+    def _take_due_items(self):
+        # Returns the items due for purging, and the seconds until the next one is
+        now = time.time()
+        with self.queue_lock:
+            due = [item for item in self.queue if item.staged_at + self.delay_seconds <= now]
+            self.queue = [item for item in self.queue if item.staged_at + self.delay_seconds > now]
+            wait_seconds = min((item.staged_at + self.delay_seconds - now for item in self.queue),
+                               default=None)
+        return due, wait_seconds
+
+    def _add_pending_items(self):
+        with self.queue_lock:
+            queued_tokens = {item.token for item in self.queue}
+        self.add([item for item in self.staged_deletions.pending() if item.token not in queued_tokens])
+        self.next_pending_check = time.monotonic() + PENDING_RECHECK_SECONDS
+
+    def run(self):
+        lower_io_priority()
+        while not self.stopped:
+            self.wake_event.clear()
+            if time.monotonic() >= self.next_pending_check:
+                self._add_pending_items()
+            due, wait_seconds = self._take_due_items()
+            for item in due:
+                if self.stopped:
+                    break
+                self.current_engine = DeletionEngine(num_workers=PURGE_WORKERS,
+                                                     worker_initializer=lower_io_priority)
+                if self.staged_deletions.purge(item, self.current_engine):
+                    logger.info(f"StagedPurgeThread: purged {item.original_path}")
+                self.current_engine = None
+            if not due:
+                recheck_seconds = max(0.0, self.next_pending_check - time.monotonic())
+                self.wake_event.wait(recheck_seconds if wait_seconds is None
+                                     else min(wait_seconds, recheck_seconds))
+
+
+class SavedSearchRefreshThread(QThread):
+    """
+    Brings a saved search up to date off the GUI thread (``SavedSearch.refresh`` walks the
+    whole tree the first time), then emits `refreshed` with the search and its results.
+    """
+    refreshed = Signal(object, list)
+
+    def __init__(self, saved_search, parent=None):
+        super().__init__(parent)
+        self.saved_search = saved_search
+
+    def run(self):
+        results = self.saved_search.refresh(conf.prune_rules)
+        self.refreshed.emit(self.saved_search, results)
+
+
+class FolderSizesThread(QThread):
+    """
+    Computes the sizes of the folders shown in a table, one folder at a time (each on a
+    small, bounded thread pool), in the order set by `set_order` - the table keeps it
+    "nearest to the visible rows first" as the user scrolls. Sizes go through the shared
+    folder-size cache, so revisiting a folder is nearly free. Each size is emitted with the
+    folder's mtime as of when its scan started, by which the table tells it's still valid.
+    Folders can be added while it runs (`add_folders`), so a refresh of the table doesn't
+    start over.
+    """
+    size_ready = Signal(str, object, object)     # item name, size in bytes, mtime_ns
+    NUM_WORKERS = 4
+
+    def __init__(self, parent_path: str, folder_names: list[str]):
+        super().__init__()
+        self.parent_path = parent_path
+        self.pending = set(folder_names)
+        self.order = list(folder_names)
+        self.order_lock = threading.Lock()
+        self.exhausted = False
+        # Guards `stopped` and `current_scan`, so that stop() never misses the scan
+        # being started
+        self.scan_lock = threading.Lock()
+        self.stopped = False
+        self.current_scan = None
+
+    def set_order(self, ordered_folder_names: list[str]):
+        with self.order_lock:
+            self.order = ordered_folder_names
+
+    def add_folders(self, folder_names: list[str]) -> bool:
+        """Queue more folders; False if the thread is done (or stopped) and won't get to
+        them."""
+        with self.order_lock:
+            if self.exhausted or self.stopped:
+                return False
+            new_names = [name for name in folder_names if name not in self.pending]
+            self.pending.update(new_names)
+            self.order = self.order + new_names
+        return True
+
+    def _next_folder_name(self):
+        with self.order_lock:
+            for name in self.order:
+                if name in self.pending:
+                    self.pending.discard(name)
+                    return name
+            self.exhausted = True
+        return None
+
+    def run(self):
+        while True:
+            name = self._next_folder_name()
+            if name is None:
+                break
+            path = os.path.join(self.parent_path, name)
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                continue
+            with self.scan_lock:
+                if self.stopped:
+                    break
+                self.current_scan = FolderSizeScan([path], conf.full_tree_prune_rules,
+                                                   self.NUM_WORKERS, folder_size_cache)
+            snapshot = self.current_scan.run()
+            if snapshot.finished and not self.stopped:
+                self.size_ready.emit(name, snapshot.size(conf.size_mode), mtime_ns)
+
+    def stop(self):
+        with self.scan_lock:
+            self.stopped = True
+            if self.current_scan is not None:
+                self.current_scan.cancel()
+
 
 class ItemsZipper:
 
@@ -422,7 +656,7 @@ class ItemsZipThread(QThread):
                 for item_path in item_paths:
                     zipf.write(item_path, os.path.basename(item_path))
                     if recursive:
-                        for root, dirs, files in os.walk(item_path):
+                        for root, dirs, files in conf.full_tree_prune_rules.walk(item_path):
                             for file in files:
                                 zipf.write(os.path.join(root, file))
                             for directory in dirs:
@@ -0,0 +1,212 @@
+"""Device-aware scheduling of paste jobs: jobs touching the same volume are limited to a
+few at a time (one for a spinning disk, where concurrent streams make the head seek
+back and forth), while jobs on different volumes run in parallel.
+
+Kept free of Qt and pyobjc so it is unit-testable; the Qt glue is ``PastingManager``
+(``src/utils/pasting_items.py``).
+
+A job's devices are the ``st_dev`` of its sources and of its destination folder. Queued
+jobs start in order per device: a job never overtakes an earlier queued job sharing one of
+its devices, so a stream of small jobs can't starve a large one, but it may start before
+earlier jobs on other devices. All methods are meant to be called from one thread.
+"""
+
+import os
+import plistlib
+import subprocess
+import sys
+from typing import Callable, Optional
+
+
+# Jobs running at the same time on one device
+SSD_JOBS_PER_DEVICE = 2
+ROTATIONAL_JOBS_PER_DEVICE = 1
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+
+
+def device_of(path: str) -> Optional[int]:
+    """st_dev of `path` (not followed if a symlink), or of its closest existing parent."""
+    while path:
+        try:
+            return os.stat(path, follow_symlinks=False).st_dev
+        except OSError:
+            parent = os.path.dirname(path)
+            if parent == path:
+                return None
+            path = parent
+    return None
+
+
+def mount_point_of(path: str) -> str:
+    path = os.path.realpath(path)
+    while not os.path.ismount(path):
+        path = os.path.dirname(path)
+    return path
+
+
+def is_rotational_device(path: str) -> bool:
+    """Whether the volume holding `path` is a spinning disk. False (an SSD) when unknown."""
+    try:
+        if sys.platform.startswith('linux'):
+            return _is_rotational_linux(os.stat(path).st_dev)
+        if sys.platform == 'darwin':
+            return _is_rotational_macos(mount_point_of(path))
+    except (OSError, ValueError, subprocess.SubprocessError):
+        pass
+    return False
+
+
+def _is_rotational_linux(dev: int) -> bool:
+    block_dir = os.path.realpath(f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}")
+    # A partition's queue/ is in its disk's folder
+    for folder in (block_dir, os.path.dirname(block_dir)):
+        flag_path = os.path.join(folder, 'queue', 'rotational')
+        if os.path.exists(flag_path):
+            with open(flag_path) as f:
+                return f.read().strip() == '1'
+    return False
+
+
+def _is_rotational_macos(mount_point: str) -> bool:
+    output = subprocess.run(['diskutil', 'info', '-plist', mount_point],
+                            capture_output=True, timeout=5).stdout
+    info = plistlib.loads(output) if output else {}
+    return info.get('SolidState') is False
+
+
+class IOJob:
+    __slots__ = ('job_id', 'devices', 'state', 'bytes_done', 'bytes_total', 'bytes_per_second')
+
+    def __init__(self, job_id, devices: frozenset):
+        self.job_id = job_id
+        self.devices = devices
+        self.state = JOB_QUEUED
+        self.bytes_done = 0
+        self.bytes_total = 0
+        self.bytes_per_second = 0.0
+
+    @property
+    def remaining_seconds(self) -> Optional[float]:
+        """Time left for a running job at its speed so far; None when not known yet."""
+        if self.state != JOB_RUNNING or self.bytes_per_second <= 0:
+            return None
+        return max(0.0, (self.bytes_total - self.bytes_done) / self.bytes_per_second)
+
+
+class IOScheduler:
+    """
+    Decides which queued jobs may start: `add()` a job with the paths it reads and writes,
+    start the jobs `runnable_jobs()` returns (calling `start()` for each), report their
+    progress with `update()` and call `finish()` when they are done or cancelled.
+    """
+    def __init__(self, ssd_limit: int = SSD_JOBS_PER_DEVICE,
+                 rotational_limit: int = ROTATIONAL_JOBS_PER_DEVICE,
+                 is_rotational: Callable[[str], bool] = is_rotational_device,
+                 get_device: Callable[[str], Optional[int]] = device_of):
+        self.ssd_limit = ssd_limit
+        self.rotational_limit = rotational_limit
+        self.is_rotational = is_rotational
+        self.get_device = get_device
+        self._jobs = {}         # job_id -> IOJob, in the order they were added
+        self._limits = {}       # st_dev -> jobs allowed at once
+
+    def add(self, job_id, paths: list[str]) -> IOJob:
+        devices = set()
+        for path in paths:
+            dev = self.get_device(path)
+            if dev is None:
+                continue
+            devices.add(dev)
+            if dev not in self._limits:
+                self._limits[dev] = self.rotational_limit if self.is_rotational(path) \
+                    else self.ssd_limit
+        job = self._jobs[job_id] = IOJob(job_id, frozenset(devices))
+        return job
+
+    def limit(self, dev: int) -> int:
+        return self._limits.get(dev, self.ssd_limit)
+
+    def _running_per_device(self) -> dict:
+        running = {}
+        for job in self._jobs.values():
+            if job.state == JOB_RUNNING:
+                for dev in job.devices:
+                    running[dev] = running.get(dev, 0) + 1
+        return running
+
+    def runnable_jobs(self) -> list:
+        """Ids of the queued jobs which may start now, in the order to start them."""
+        running = self._running_per_device()
+        blocked = set()     # Devices an earlier queued job is waiting for
+        runnable = []
+        for job in self._jobs.values():
+            if job.state != JOB_QUEUED:
+                continue
+            if any(dev in blocked or running.get(dev, 0) >= self.limit(dev) for dev in job.devices):
+                blocked |= job.devices
+                continue
+            for dev in job.devices:
+                running[dev] = running.get(dev, 0) + 1
+            runnable.append(job.job_id)
+        return runnable
+
+    def start(self, job_id):
+        self._jobs[job_id].state = JOB_RUNNING
+
+    def finish(self, job_id):
+        self._jobs.pop(job_id, None)
+
+    def update(self, job_id, bytes_done: int, bytes_total: int, bytes_per_second: float):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job.bytes_done = bytes_done
+            job.bytes_total = bytes_total
+            job.bytes_per_second = bytes_per_second
+
+    def is_queued(self, job_id) -> bool:
+        job = self._jobs.get(job_id)
+        return job is not None and job.state == JOB_QUEUED
+
+    def _queued_ahead(self, job: IOJob) -> list[IOJob]:
+        # Queued jobs added before `job` which share one of its devices
+        ahead = []
+        for other in self._jobs.values():
+            if other is job:
+                break
+            if other.state == JOB_QUEUED and other.devices & job.devices:
+                ahead.append(other)
+        return ahead
+
+    def queue_position(self, job_id) -> Optional[int]:
+        """0 for a running job, 1 for the next queued job to start on its devices, ...;
+        None for an unknown (finished) job."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.state == JOB_RUNNING:
+            return 0
+        return 1 + len(self._queued_ahead(job))
+
+    def eta_seconds(self, job_id) -> Optional[float]:
+        """For a running job, the time it has left. For a queued job, the time until it is
+        expected to start: the time left of the jobs ahead of it on its busiest device,
+        shared between the device's slots. None when that isn't known yet (a job ahead
+        hasn't reported a speed)."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if job.state == JOB_RUNNING:
+            return job.remaining_seconds
+        ahead = self._queued_ahead(job)
+        running = [other for other in self._jobs.values() if other.state == JOB_RUNNING]
+        wait = 0.0
+        for dev in job.devices:
+            jobs_on_device = [other for other in running + ahead if dev in other.devices]
+            if len(jobs_on_device) < self.limit(dev):
+                continue
+            if any(other.remaining_seconds is None for other in jobs_on_device):
+                return None
+            wait = max(wait, sum(other.remaining_seconds for other in jobs_on_device) / self.limit(dev))
+        return wait
@@ -0,0 +1,65 @@
+"""Unique "keep both" names for a batch of items pasted into one folder: 'a.txt' becomes
+'a 2.txt', or 'a 4.txt' when 'a 3.txt' is the highest numbered copy already there - the
+same names ``increment_max_item_name`` gives one item at a time.
+
+Kept free of Qt and pyobjc so it is unit-testable; used by ``PasteItemsThread``
+(``src/utils/pasting_items.py``).
+
+The folder is listed once and indexed by (extension, lower-cased name without the number)
+-> highest number, so each name handed out costs O(1) instead of a new listing and a scan
+of every name in it.
+"""
+
+import os
+
+
+def _numbered_bases(stem: str):
+    # Every (base, number) such that stem == base + optional whitespace + number,
+    # e.g. 'v23' -> ('v2', 3), ('v', 23)
+    end = len(stem)
+    i = end
+    while i > 0 and stem[i - 1].isdigit():
+        i -= 1
+        number = int(stem[i:end])
+        j = i
+        yield stem[:j], number
+        while j > 0 and stem[j - 1].isspace():
+            j -= 1
+            yield stem[:j], number
+
+
+class UniqueNameAllocator:
+    def __init__(self, existing_names: list[str]):
+        self._taken = set()
+        self._max_numbers = {}      # (extension, base.lower()) -> highest number in use
+        for name in existing_names:
+            self._add(name)
+
+    def _add(self, name: str):
+        self._taken.add(name)
+        stem, extension = os.path.splitext(name)
+        for base, number in _numbered_bases(stem):
+            key = (extension, base.lower())
+            if number > self._max_numbers.get(key, 0):
+                self._max_numbers[key] = number
+
+    def allocate(self, name: str) -> str:
+        """`name` itself if free, otherwise its next numbered variant. The name returned is
+        counted as taken."""
+        if name in self._taken:
+            stem, extension = os.path.splitext(name)
+            key = (extension, stem.lower())
+            number = max(self._max_numbers.get(key, 1), 1) + 1
+            name = f"{stem} {number}{extension}"
+            while name in self._taken:
+                number += 1
+                name = f"{stem} {number}{extension}"
+        self._add(name)
+        return name
+
+    @classmethod
+    def for_directory(cls, path: str) -> 'UniqueNameAllocator':
+        try:
+            return cls(os.listdir(path))
+        except OSError:
+            return cls([])
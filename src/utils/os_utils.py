@@ -24,8 +24,11 @@ from PySide6.QtWidgets import QApplication, QLabel, QFrame, QItemDelegate
 from PIL import Image, ImageCms
 pillow_profile = ImageCms.createProfile("sRGB")
 
-from src.shared.vars import conf_manager as conf, extensions_to_icons_mapper, logger as logger
+from src.shared.vars import conf_manager as conf, extensions_to_icons_mapper, logger as logger, \
+    folder_size_cache
 from src.shared.locations import SYSTEM_ROOT_DIR, ICONS_DIR
+from src.utils.prune_rules import PruneRules
+from src.utils.size_engine import get_total_size_bytes, SIZE_MODE_APPARENT
 from src.utils.utils import get_max_integer_suffix_among_strings_with_prefix, \
     search_all_key_paths_in_dict
 
@@ -107,14 +110,9 @@ Item sizes
 """
 
 
-def folder_size(path: str = '.') -> int:
-    total = 0
-    for entry in os.scandir(path):
-        if entry.is_file():
-            total += entry.stat().st_size
-        elif entry.is_dir():
-            total += folder_size(entry.path)
-    return total
+def folder_size(path: str = '.', size_mode: str = SIZE_MODE_APPARENT) -> int:
+    # Everything under `path` (no pruning), each hard-linked file counted once
+    return get_total_size_bytes([path], size_mode=size_mode)
 
 
 def beautify_bytes_size(size_in_bytes: int) -> str:
@@ -129,37 +127,17 @@ def beautify_bytes_size(size_in_bytes: int) -> str:
 
 
 def get_item_size_pretty(fs) -> str:
-    bytes = 0
     if isinstance(fs, str):
         fs = [fs]
-    for f in fs:
-        if os.path.isdir(f):
-            bytes = bytes + get_folder_size_bytes(f)
-        else:
-            bytes = bytes + os.path.getsize(f)
-
-    return beautify_bytes_size(bytes)
-
+    return beautify_bytes_size(get_total_size_bytes(fs, conf.full_tree_prune_rules,
+                                                    folder_size_cache, conf.size_mode))
 
 
-def get_folder_size_bytes(folder_path: str) -> int:
-    total_size = 0
-    stack = [folder_path]
-    while stack:
-        current_path = stack.pop()
-        try:
-            scandir = os.scandir(current_path)
-        except:
-            print(1)
-        for entry in scandir:
-            try:
-                if entry.is_file():
-                    total_size += os.path.getsize(entry.path)
-                elif entry.is_dir():
-                    stack.append(entry.path)
-            except:
-                print(1)
-    return total_size
+def get_folder_size_bytes(folder_path: str, prune_rules: PruneRules = None) -> int:
+    # Sub-folders excluded by the prune rules aren't counted; by default only symlink loops
+    # are (conf.full_tree_prune_rules)
+    return get_total_size_bytes([folder_path], prune_rules or conf.full_tree_prune_rules,
+                                folder_size_cache, conf.size_mode)
 
 
 def size_bytes_to_string(size_bytes: int) -> str:
@@ -562,22 +540,6 @@ def copy_item(item_full_path: str, dest_item_full_path: str):
         return -1
 
 
-def copy_and_paste_item(item_full_path: str,
-                        dest_item_full_path: str = None,
-                        dest_path_excluding_filename: str = None):
-
-    if dest_item_full_path is None and dest_path_excluding_filename is None:
-        raise ValueError("Both dest_item_full_path and dest_path_excluding_filename are None.")
-        return
-
-    if dest_item_full_path is not None:
-        if item_full_path == dest_item_full_path:
-            return 0
-        return copy_item(item_full_path, dest_item_full_path)
-    else:
-        return copy_item_to_dir(item_full_path, dest_path_excluding_filename)
-
-
 def get_clipboard_copied_files_paths():
     logger.info(f"get_clipboard_copied_files_paths")
     clipboard = QApplication.clipboard()
@@ -636,6 +598,15 @@ def rename_file_or_dir(path_to_file_or_dir: str, new_name: str):
 
 def get_dataframe_of_file_names_in_directory(directory_path: str) -> pd.DataFrame:
     if not os.path.exists(directory_path):
+        return get_dataframe_of_items_in_directory(directory_path, [])
+    return get_dataframe_of_items_in_directory(directory_path,
+                                               [x.name for x in Path(directory_path).iterdir()])
+
+
+# item_names are relative to directory_path, and may include sub-folders (e.g., for the
+# results of a saved search shown as a virtual folder)
+def get_dataframe_of_items_in_directory(directory_path: str, item_names: list[str]) -> pd.DataFrame:
+    if len(item_names) == 0:
         return pd.DataFrame({conf.FILE_EXPLORER_FILENAME_COL_NAME: [],
                              'Date modified': [],
                              'Size': [],
@@ -647,7 +618,6 @@ def get_dataframe_of_file_names_in_directory(directory_path: str) -> pd.DataFram
                              'is_folder': [],
                              'is_hidden': [],
                              })
-    p = Path(directory_path)
     file_name = []
     date_modified = []
     date_modified_raw = []
@@ -658,10 +628,10 @@ def get_dataframe_of_file_names_in_directory(directory_path: str) -> pd.DataFram
     extension_n_char = []
     is_folder_ = []
     is_hidden_ = []
-    for x in p.iterdir():
-        new_path = os.path.join(directory_path, x.name)
+    for item_name in item_names:
+        new_path = os.path.join(directory_path, item_name)
         try:
-            file_name_ = x.name
+            file_name_ = item_name
             date_modified_ = get_item_date_modified(new_path)
             type_icon = get_type_as_icon_string(Path(new_path))
             type_ = get_file_type(new_path)
@@ -0,0 +1,251 @@
+"""Pre-flight planning of a paste: what will be copied (bytes and files), which items clash
+with what is already in the destination - at every level, not only by top-level name - and
+whether the destination volume has room for it. Computed before any data is copied, so a
+paste that can't fit is refused up front rather than failing halfway.
+
+Kept free of Qt and pyobjc so it is unit-testable; the Qt glue is ``PastePlanningThread``
+(``src/utils/pasting_items.py``).
+
+Each pasted item is scanned once, the items in parallel. While a source folder is walked,
+the matching destination folder (if there is one) is listed once and compared by name, so
+the conflicts below a clashing folder come for free with the size. What a folder holds is
+kept (`ItemPlan.entries`), so the copy (see copy_engine.CopyPlan) doesn't walk it again -
+as long as it starts soon after and none of the folders listed changed since (see
+`PastePlan.listings`).
+"""
+
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from src.utils.copy_engine import is_same_device, can_clone, ENTRY_DIR, ENTRY_FILE, ENTRY_SYMLINK, \
+    ENTRY_SPECIAL
+
+
+# Kept free on the destination volume on top of what the paste needs
+FREE_SPACE_MARGIN_BYTES = 64 * 1024 ** 2
+PLANNING_WORKERS = 8
+PROGRESS_INTERVAL_SECONDS = 0.1
+# The planner's listings are reused by a copy which starts within this long of planning
+LISTING_MAX_AGE_SECONDS = 30
+
+
+class ItemPlan:
+    """A pasted item: its size, whether its name is taken in the destination (`conflict`),
+    and the paths (relative to the item) of the files below it which are also in the
+    destination's folder of that name (`nested_conflicts`). A folder walked without errors
+    lists what it holds in `entries` (see copy_engine.CopyPlan), otherwise it's None, and
+    the mtime of each of its folders when listed in `dir_mtimes`."""
+    __slots__ = ('src', 'dest', 'bytes', 'files', 'conflict', 'nested_conflicts', 'is_rename',
+                 'is_clone', 'errors', 'entries', 'dir_mtimes')
+
+    def __init__(self, src: str, dest: str):
+        self.src = src
+        self.dest = dest
+        self.bytes = 0
+        self.files = 0
+        self.conflict = False
+        self.nested_conflicts = []
+        self.is_rename = False      # A cut within one volume: needs no space
+        self.is_clone = False       # A copy within one APFS volume: cloned, needs no space
+        self.errors = 0
+        self.entries = None
+        self.dir_mtimes = {}        # Path relative to the item -> st_mtime_ns
+
+
+class PastePlan:
+    def __init__(self, items: list[ItemPlan], dest_path: str, free_bytes: Optional[int],
+                 planned_at: float = None):
+        self.items = items
+        self.dest_path = dest_path
+        self.free_bytes = free_bytes
+        self.planned_at = planned_at if planned_at is not None else time.monotonic()
+
+    @property
+    def bytes_total(self) -> int:
+        return sum(item.bytes for item in self.items)
+
+    @property
+    def files_total(self) -> int:
+        return sum(item.files for item in self.items)
+
+    @property
+    def required_bytes(self) -> int:
+        return sum(item.bytes for item in self.items if not item.is_rename and not item.is_clone)
+
+    @property
+    def has_enough_space(self) -> bool:
+        """False when the destination is known to lack room (items it replaces aren't
+        counted as freed)."""
+        if self.free_bytes is None or self.required_bytes == 0:
+            return True
+        return self.required_bytes + FREE_SPACE_MARGIN_BYTES <= self.free_bytes
+
+    @property
+    def conflicting_names(self) -> list[str]:
+        return [os.path.basename(item.src) for item in self.items if item.conflict]
+
+    def nested_conflicts_of(self, name: str) -> list[str]:
+        for item in self.items:
+            if os.path.basename(item.src) == name:
+                return item.nested_conflicts
+        return []
+
+    def bytes_for(self, src_paths: list[str]) -> int:
+        src_paths = set(src_paths)
+        return sum(item.bytes for item in self.items if item.src in src_paths)
+
+    def listings(self, max_age_seconds: float = LISTING_MAX_AGE_SECONDS) -> dict[str, list[tuple[str, str, int]]]:
+        """The folders' entries by source path, for copy_engine.CopyPlan - of the folders
+        still as they were listed: none when planned more than `max_age_seconds` ago, and
+        none of a folder any of whose folders' mtime changed (entries were added, removed
+        or renamed in it). The others are walked again by the copy."""
+        if time.monotonic() - self.planned_at > max_age_seconds:
+            return {}
+        return {item.src: item.entries for item in self.items
+                if item.entries is not None and _is_unchanged(item)}
+
+
+class _PlanningProgress:
+    """Files and bytes scanned so far by all the items' walks, reported to `on_progress`
+    at most every PROGRESS_INTERVAL_SECONDS."""
+    def __init__(self, on_progress: Optional[Callable[[int, int], None]]):
+        self.on_progress = on_progress
+        self.files = 0
+        self.bytes = 0
+        self._next_report = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, files: int, num_bytes: int):
+        if self.on_progress is None:
+            return
+        with self._lock:
+            self.files += files
+            self.bytes += num_bytes
+            now = time.monotonic()
+            if now < self._next_report:
+                return
+            self._next_report = now + PROGRESS_INTERVAL_SECONDS
+            files, num_bytes = self.files, self.bytes
+        self.on_progress(files, num_bytes)
+
+
+def plan_paste(copied_file_paths: list[str], dest_path: str,
+               delete_source_after_paste: bool = False,
+               num_workers: int = PLANNING_WORKERS,
+               stop_event: Optional[threading.Event] = None,
+               on_progress: Optional[Callable[[int, int], None]] = None,
+               verify: Optional[str] = None) -> Optional[PastePlan]:
+    """Plan pasting `copied_file_paths` into `dest_path`, calling `on_progress(files, bytes)`
+    with what was scanned so far. Returns None when `stop_event` is set before it's done.
+    `verify` is the CopyEngine's: verified copies are never clones."""
+    planned_at = time.monotonic()
+    stop_event = stop_event if stop_event is not None else threading.Event()
+    progress = _PlanningProgress(on_progress)
+    items = [ItemPlan(src, os.path.join(dest_path, os.path.basename(src)))
+             for src in copied_file_paths]
+    if len(items) > 1:
+        with ThreadPoolExecutor(max_workers=min(num_workers, len(items))) as executor:
+            for _ in executor.map(lambda item: _plan_item(item, delete_source_after_paste, verify,
+                                                          stop_event, progress), items):
+                pass
+    elif items:
+        _plan_item(items[0], delete_source_after_paste, verify, stop_event, progress)
+    if stop_event.is_set():
+        return None
+    try:
+        free_bytes = shutil.disk_usage(dest_path).free
+    except OSError:
+        free_bytes = None
+    return PastePlan(items, dest_path, free_bytes, planned_at)
+
+
+def _plan_item(item: ItemPlan, delete_source_after_paste: bool, verify: Optional[str],
+               stop_event: threading.Event, progress: _PlanningProgress):
+    if stop_event.is_set():
+        return
+    try:
+        st = os.stat(item.src, follow_symlinks=False)
+    except OSError:
+        item.errors += 1
+        return
+    item.conflict = os.path.lexists(item.dest)
+    item.is_rename = delete_source_after_paste and is_same_device(item.src, os.path.dirname(item.dest))
+    # As CopyEngine.copy_items does it, when not verifying
+    item.is_clone = not delete_source_after_paste and verify is None and \
+        can_clone(item.src, os.path.dirname(item.dest))
+    if not os.path.isdir(item.src) or os.path.islink(item.src):
+        item.bytes = st.st_size if os.path.isfile(item.src) else 0
+        item.files = 1
+        progress.add(1, item.bytes)
+        return
+
+    # (source folder, path relative to the item, matching destination folder or None)
+    stack = [(item.src, '', item.dest if item.conflict and os.path.isdir(item.dest) else None)]
+    # (path relative to the item, kind, size), each folder before what it holds
+    entries = []
+    dir_mtimes = {}
+    while stack:
+        if stop_event.is_set():
+            return
+        src_dir, relative_dir, dest_dir = stack.pop()
+        dest_names = _list_names(dest_dir) if dest_dir is not None else set()
+        files_before, bytes_before = item.files, item.bytes
+        try:
+            # Before it's listed: a change while listing it shows too
+            dir_mtimes[relative_dir] = os.stat(src_dir).st_mtime_ns
+            with os.scandir(src_dir) as it:
+                for entry in it:
+                    relative_path = os.path.join(relative_dir, entry.name) if relative_dir else entry.name
+                    in_dest = entry.name in dest_names
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            dest_child = os.path.join(dest_dir, entry.name) if in_dest else None
+                            if dest_child is not None and not os.path.isdir(dest_child):
+                                item.nested_conflicts.append(relative_path)
+                                dest_child = None
+                            stack.append((entry.path, relative_path, dest_child))
+                            entries.append((relative_path, ENTRY_DIR, 0))
+                            continue
+                        item.files += 1
+                        if entry.is_symlink():
+                            entries.append((relative_path, ENTRY_SYMLINK, 0))
+                        elif entry.is_file(follow_symlinks=False):
+                            size = entry.stat(follow_symlinks=False).st_size
+                            item.bytes += size
+                            entries.append((relative_path, ENTRY_FILE, size))
+                        else:
+                            entries.append((relative_path, ENTRY_SPECIAL, 0))
+                    except OSError:
+                        item.errors += 1
+                        continue
+                    if in_dest:
+                        item.nested_conflicts.append(relative_path)
+        except OSError:
+            item.errors += 1
+        progress.add(item.files - files_before, item.bytes - bytes_before)
+    item.nested_conflicts.sort()
+    # A folder which couldn't be walked entirely is walked again by the copy, to report it
+    if item.errors == 0:
+        item.entries = entries
+        item.dir_mtimes = dir_mtimes
+
+
+def _is_unchanged(item: ItemPlan) -> bool:
+    for relative_dir, mtime_ns in item.dir_mtimes.items():
+        try:
+            if os.stat(os.path.join(item.src, relative_dir)).st_mtime_ns != mtime_ns:
+                return False
+        except OSError:
+            return False
+    return True
+
+
+def _list_names(path: str) -> set[str]:
+    try:
+        return set(os.listdir(path))
+    except OSError:
+        return set()
@@ -1,44 +1,53 @@
 import os
 import random
+import threading
 import time
 from typing import Callable
-from queue import Queue
 from PySide6.QtGui import Qt
 from PySide6.QtCore import Signal, QThread, QMargins, QTimer, QFileSystemWatcher, QObject
 from PySide6.QtWidgets import QMainWindow, QTableWidget, QTableWidgetItem, QRadioButton, QWidget,\
-    QHBoxLayout, QButtonGroup, QVBoxLayout, QPushButton, QCheckBox, QFrame, QScrollArea, QLabel
-from src.utils.os_utils import move_to_trash, extract_filename_from_path, copy_and_paste_item, \
-    get_all_item_names_in_directory, extract_parent_path_from_path, increment_max_item_name, \
-    delete_item
+    QHBoxLayout, QButtonGroup, QVBoxLayout, QPushButton, QCheckBox, QFrame, QScrollArea, QLabel, \
+    QProgressBar, QComboBox
+from src.utils.os_utils import move_to_trash, extract_filename_from_path, \
+    extract_parent_path_from_path, delete_item, beautify_bytes_size
+from src.utils.copy_engine import CopyEngine, CopyProgress, format_duration
+from src.utils.io_scheduler import IOScheduler
+from src.utils.paste_planner import PastePlan, plan_paste
+from src.utils.name_allocator import UniqueNameAllocator
+from src.utils.copy_journal import CopyJournal, pending_journals
 from src.ui_components.misc_widgets.dialogs_and_messages import QDialogFreeTextButtons
 from src.non_ui_components.user_actions import (UserAction_CopyPasteItemsUsingThread,
                                                 UserAction_MoveFilesUsingThread)
-from src.shared.vars import logger as logger
+from src.shared.vars import conf_manager as conf, logger as logger
+from src.shared.locations import PASTE_JOURNALS_PATH
 
 
 class PastingManager:
     """
     Orchestrates several pasters (each responsible for a unique thread), and maintains a queue
-    of pasting tasks in case all pasters are busy.
+    of pasting tasks waiting for a paster, or for a device busy with other pastes (see
+    IOScheduler).
     """
-    def __init__(self, caller, num_threads: int = 6, sample_every_ms: int = 3000):
+    def __init__(self, caller, num_threads: int = 6):
         self.caller = caller
         self.paster_objects = {}
         self.update_ui_timers = {}
         for i in range(num_threads):
             paster_object = PasterObject(self.caller)
             paster_object.pasting_finished.connect(self.pasting_finished)
+            paster_object.progress.connect(self.update_pasting_progress)
             paster_object.id = i
             self.paster_objects[i] = paster_object
             self.update_ui_timers[i] = QTimer()
         self.tasks_queue = []
-        self.start_next_queue_timer = QTimer()
-        self.start_next_queue_timer.timeout.connect(self.handle_next_task_if_thread_available)
-        self.sample_every_ms = sample_every_ms
+        self.io_scheduler = IOScheduler()
+        self.next_job_id = 0
 
         self.running_processes_ui = PastingProcessesUi()
         # self.running_processes_ui.show()
         self.running_processes_ui.break_pasting_signal.connect(self.break_pasting_process)
+        self.running_processes_ui.pause_pasting_signal.connect(self.pause_pasting_process)
+        self.running_processes_ui.throttle_pasting_signal.connect(self.throttle_pasting_process)
 
         self.queue_msg = QDialogFreeTextButtons(
             button_texts=["Cancel all"],
@@ -48,11 +57,13 @@ class PastingManager:
             btn_width=100
             )
 
-    def add_pasting_process_to_ui(self, paster, copied_file_paths, dest_path):
+    def add_pasting_process_to_ui(self, paster, copied_file_paths, dest_path, plan: PastePlan = None):
         if not paster.is_available:
             self.running_processes_ui.show()
             num_items = str(len(copied_file_paths))
-            self.running_processes_ui.add_widget(paster.id, f"Pasting {num_items} items to {dest_path}")
+            size_text = f" ({beautify_bytes_size(plan.bytes_for(copied_file_paths))[2]})" \
+                if plan is not None else ""
+            self.running_processes_ui.add_widget(paster.id, f"Pasting {num_items} items{size_text} to {dest_path}")
 
     def paste(self,
               copied_file_paths: list[str],
@@ -60,29 +71,29 @@ class PastingManager:
               delete_source_after_paste: bool,  # copy-paste VS cut-paste
               when_done: Callable = None,
               # rename_item_names_in_dest: list[tuple[str, str]] = [],
-              source_dest_pairs: list[tuple[str, str, str]] = []):
+              source_dest_pairs: list[tuple[str, str, str]] = [],
+              plan: PastePlan = None,
+              resume_journal: CopyJournal = None):
         logger.info("paste_items_via_thread")
-        available_paster = self.take_first_available_paster()
-        if available_paster is None:
-            # All pasters are busy -> add task to queue and wait for a paster to become available
-            logger.info("All pasters are busy")
-            self.tasks_queue.append({'copied_file_paths': copied_file_paths,
-                                     'dest_path': dest_path,
-                                     'delete_source_after_paste': delete_source_after_paste,
-                                     'when_done': when_done,
-                                     # 'rename_item_names_in_dest': rename_item_names_in_dest,
-                                     'source_dest_pairs': source_dest_pairs})
+        # Every paste is queued with the devices it reads and writes; it starts as soon as
+        # a paster is free and its devices have a free slot (see IOScheduler)
+        job_id = self.next_job_id
+        self.next_job_id += 1
+        self.io_scheduler.add(job_id, list(copied_file_paths) + [dest_path])
+        self.tasks_queue.append({'job_id': job_id,
+                                 'copied_file_paths': copied_file_paths,
+                                 'dest_path': dest_path,
+                                 'delete_source_after_paste': delete_source_after_paste,
+                                 'when_done': when_done,
+                                 # 'rename_item_names_in_dest': rename_item_names_in_dest,
+                                 'source_dest_pairs': source_dest_pairs,
+                                 'plan': plan,
+                                 'resume_journal': resume_journal})
+        self.handle_next_task_if_thread_available()
+        if self.io_scheduler.is_queued(job_id):
+            logger.info("Paste request queued")
+            self.update_queue_msg()
             self.queue_msg.show()
-            self.start_next_queue_timer.start(self.sample_every_ms)
-        else:
-            # Idle paster found -> use it to paste items
-            logger.info("Idle paster found")
-            self.update_ui_timers[available_paster.id].singleShot(1000, lambda: self.add_pasting_process_to_ui(available_paster, copied_file_paths, dest_path))
-            self.paste_using_paster(available_paster,
-                                    copied_file_paths, dest_path, delete_source_after_paste,
-                                    when_done,
-                                    # rename_item_names_in_dest,
-                                    source_dest_pairs)
 
     def take_first_available_paster(self):
         logger.info("take_first_available_paster")
@@ -101,53 +112,121 @@ class PastingManager:
                            delete_source_after_paste: bool,  # copy-paste VS cut-paste
                            when_done: Callable = None,
                            # rename_item_names_in_dest: list[tuple[str, str]] = [],
-                           source_dest_pairs: list[tuple[str, str, str]] = []):
+                           source_dest_pairs: list[tuple[str, str, str]] = [],
+                           resume_journal: CopyJournal = None,
+                           plan: PastePlan = None):
         logger.info("paste_using_paster")
         paster.run(copied_file_paths, dest_path, delete_source_after_paste, when_done,
                    # rename_item_names_in_dest,
-                   source_dest_pairs)
+                   source_dest_pairs, resume_journal, plan)
 
     def handle_next_task_if_thread_available(self):
         logger.info("handle_next_task_if_thread_available")
-        if len(self.tasks_queue) >= 1:
+        for job_id in self.io_scheduler.runnable_jobs():
             available_paster = self.take_first_available_paster()
-            if available_paster is not None:
-                task = self.tasks_queue.pop(0)
-                self.paste_using_paster(available_paster,
-                                        task['copied_file_paths'],
-                                        task['dest_path'],
-                                        task['delete_source_after_paste'],
-                                        task['when_done'],
-                                        # task['rename_item_names_in_dest'],
-                                        task['source_dest_pairs'],
-                                        )
+            if available_paster is None:
+                break
+            task = [t for t in self.tasks_queue if t['job_id'] == job_id][0]
+            self.tasks_queue.remove(task)
+            self.io_scheduler.start(job_id)
+            available_paster.job_id = job_id
+            self.update_ui_timers[available_paster.id].singleShot(
+                1000, lambda paster=available_paster, task=task:
+                self.add_pasting_process_to_ui(paster, task['copied_file_paths'], task['dest_path'],
+                                               task['plan']))
+            self.paste_using_paster(available_paster,
+                                    task['copied_file_paths'],
+                                    task['dest_path'],
+                                    task['delete_source_after_paste'],
+                                    task['when_done'],
+                                    # task['rename_item_names_in_dest'],
+                                    task['source_dest_pairs'],
+                                    task['resume_journal'],
+                                    task['plan'],
+                                    )
         if len(self.tasks_queue)==0:
             self.queue_msg.hide()
-            self.start_next_queue_timer.stop()
+        else:
+            self.update_queue_msg()
+
+    def queued_job_status(self, job_id: int) -> str:
+        position = self.io_scheduler.queue_position(job_id)
+        eta = self.io_scheduler.eta_seconds(job_id)
+        return f"#{position} in its devices' queue, starts in {format_duration(eta)}"
+
+    def update_queue_msg(self):
+        lines = [f"Pasting {len(task['copied_file_paths'])} items to {task['dest_path']}: "
+                 f"{self.queued_job_status(task['job_id'])}" for task in self.tasks_queue]
+        self.queue_msg.set_message_text(
+            "Pastes to or from a busy disk wait for it, so they don't slow each other down. "
+            "Queued paste requests will start automatically when possible:\n" + "\n".join(lines))
+
+    def resume_interrupted_pastes(self, when_done: Callable = None):
+        """Offer to resume each paste that was interrupted by quitting (or a crash), or to
+        discard what it copied."""
+        for journal in pending_journals(PASTE_JOURNALS_PATH):
+            num_left = len(journal.pairs) - len(journal.completed_items)
+            dialog = QDialogFreeTextButtons(
+                button_texts=["Resume", "Discard"],
+                title_text="Interrupted paste",
+                message_text=f"Pasting {num_left} items to {journal.dest_path} was interrupted. "
+                             f"Resume it, or discard the items it didn't finish?",
+                btn_width=100
+            )
+            dialog.exec()
+            if dialog.selected_button_ == "Resume":
+                self.paste([src for src, _ in journal.pairs], journal.dest_path,
+                           journal.delete_source_after_paste, when_done, resume_journal=journal)
+            else:
+                journal.discard()
 
     def safetly_kill_all_threads(self):
         logger.info("safetly_kill_all_threads")
         while len(self.paster_objects) > 0:
             k = list(self.paster_objects.keys())[0]
             paster_object = self.paster_objects.pop(k)
-            paster_object.break_thread_run()
+            # Interrupted pastes are offered to be resumed on the next launch
+            paster_object.checkpoint_thread_run()
 
     def break_pasting_process(self, paster_obj_id: int):
         logger.info(f"break_pasting_process ({paster_obj_id})")
         self.paster_objects[paster_obj_id].break_thread_run()
         self.pasting_finished(paster_obj_id)
     
+    def pause_pasting_process(self, paster_obj_id: int, paused: bool):
+        logger.info(f"pause_pasting_process ({paster_obj_id}, {paused})")
+        self.paster_objects[paster_obj_id].pause_thread_run(paused)
+
+    def throttle_pasting_process(self, paster_obj_id: int, bytes_per_second):
+        logger.info(f"throttle_pasting_process ({paster_obj_id}, {bytes_per_second})")
+        self.paster_objects[paster_obj_id].set_bandwidth_limit(bytes_per_second)
+
+    def update_pasting_progress(self, paster_obj_id: int, progress: CopyProgress):
+        self.running_processes_ui.update_progress(paster_obj_id, progress)
+        paster = self.paster_objects.get(paster_obj_id)
+        if paster is not None:
+            self.io_scheduler.update(paster.job_id, progress.bytes_done, progress.bytes_total,
+                                     progress.bytes_per_second)
+        if len(self.tasks_queue) > 0:
+            self.update_queue_msg()
+
     def pasting_finished(self, paster_obj_id: int):
         logger.info(f"pasting_finished ({paster_obj_id})")
         self.update_ui_timers[paster_obj_id].stop()
         self.running_processes_ui.remove_widget(paster_obj_id)
         if len(self.running_processes_ui.widgets_list) == 0:
             self.running_processes_ui.hide()
+        paster = self.paster_objects.get(paster_obj_id)
+        if paster is not None:
+            self.io_scheduler.finish(paster.job_id)
+        # The paster, and its devices, are free now: start what was waiting for them
+        self.handle_next_task_if_thread_available()
 
 
 
 class PasterObject(QWidget):
     pasting_finished = Signal(int)
+    progress = Signal(int, object)    # paster id, CopyProgress
 
     """
     Wrapper over a thread which does the actual pasting
@@ -155,10 +234,10 @@ class PasterObject(QWidget):
     def __init__(self, caller=None):
         super().__init__()
         self.caller = caller
-        self.queue = Queue()
         self.pasting_thread = None
         self._is_available = True
         self.id = random.randint(0, 1000000)
+        self.job_id = None     # The IOScheduler job being pasted
 
 
     @property
@@ -173,19 +252,48 @@ class PasterObject(QWidget):
     def break_thread_run(self, wait=True):
         if self.pasting_thread is not None:
             self.pasting_thread._forced_to_stop = True
+            # Stops the copy mid-file (the partly copied file is removed)
+            self.pasting_thread.copy_engine.cancel()
             if wait:
                 self.pasting_thread.wait()
 
+    def pause_thread_run(self, paused: bool):
+        if self.pasting_thread is not None:
+            if paused:
+                self.pasting_thread.copy_engine.pause()
+            else:
+                self.pasting_thread.copy_engine.resume()
+
+    def set_bandwidth_limit(self, bytes_per_second):
+        if self.pasting_thread is not None:
+            self.pasting_thread.copy_engine.bandwidth_limit = bytes_per_second
+
+    def checkpoint_thread_run(self):
+        if self.pasting_thread is not None:
+            self.pasting_thread._forced_to_stop = True
+            # Stops the copy mid-file, keeping what was copied for the journal to resume
+            self.pasting_thread.copy_engine.checkpoint()
+            self.pasting_thread.wait()
+
     def _init_pasting_thread(self):
-        self.pasting_thread = PasteItemsThread(results_queue = self.queue)
+        self.pasting_thread = PasteItemsThread()
+        self.pasting_thread.finished_all.connect(self.handle_finished_all)
+        self.pasting_thread.paste_error.connect(self.handle_paste_error)
+        self.pasting_thread.item_already_exist.connect(self.handle_item_already_exist)
         self.pasting_thread.finished.connect(self.pasting_thread_finished)
+        self.pasting_thread.progress.connect(self.emit_progress)
+
+    def emit_progress(self, progress: CopyProgress):
+        self.progress.emit(self.id, progress)
 
     def run(self,
             copied_file_paths: list[str] = [],
             dest_path: str = "",
             delete_source_after_paste: bool = False,  # copy-paste VS cut-paste
             when_done: Callable = None,
-            source_dest_pairs: list[tuple[str, str, str]] = [],):
+            source_dest_pairs: list[tuple[str, str, str]] = [],
+            resume_journal: CopyJournal = None,
+            plan: PastePlan = None):
 
         self.copied_file_paths = copied_file_paths.copy()
         self.dest_path = dest_path
@@ -195,116 +303,184 @@ class PasterObject(QWidget):
 
         self.items_pasted = []
 
-        if len(self.source_dest_pairs) >= 1:
+        if len(self.source_dest_pairs) >= 1 or resume_journal is not None:
             if self.pasting_thread is None:
                 self._init_pasting_thread()
+            # Capped per paste, from its widget
+            self.pasting_thread.copy_engine.bandwidth_limit = None
             self.pasting_thread.set_run_params(self.source_dest_pairs,
-                                               self.delete_source_after_paste)
+                                               self.delete_source_after_paste,
+                                               resume_journal,
+                                               plan)
             self.pasting_thread.start()    # NOTE THERE'S A DIFFERENCE BETWEEN start() and run().
                                            # run() will not emit the finished signal in the end
                                            # and therefore both isRunning and isFinished will
                                            # always return False
 
-    def pasting_thread_finished(self, thread_id: int = 0):
-        logger.info(f"pasting_thread_finished ({thread_id})")
+    def handle_paste_error(self, item_name: str):
+        self.dialog = QDialogPasteExistingItem(self,
+                                               button_texts=['Ok'],
+                                               title_text = f'File {item_name} Could not be pasted. Aborting paste operation.',
+                                               message_text = 'Paste error',
+                                               item_name=item_name,
+                                               encompassing_obj=self)
+        if self.position_on_screen is not None:
+            self.dialog.move(self.position_on_screen)
+        self.dialog.show()
+
+    def handle_finished_all(self, items_pasted: list[tuple[str, str]]):
+        self.items_pasted = self.items_pasted + items_pasted
+        if len(self.items_pasted) > 0:
+            if self.delete_source_after_paste:
+                self.caller.keep_last_action(
+                    UserAction_MoveFilesUsingThread(self.items_pasted,
+                                                    self.caller))
+            else:
+                self.caller.keep_last_action(
+                    UserAction_CopyPasteItemsUsingThread(self.items_pasted,
+                                                         self.caller))
+            self.caller.select_pasted_items_where_ui_is_in_path(
+                path = self.dest_path,
+                items = [extract_filename_from_path(i[1]) for i in self.items_pasted]
+            )
+
+    def handle_item_already_exist(self, item_name: str):
+        self.dialog = QDialogPasteExistingItem(self,
+                                               button_texts=['Skip', 'Replace', 'Keep both'],
+                                               title_text = f'File {item_name} already exists in the destination folder',
+                                               message_text = 'What do you want to do?',
+                                               item_name=item_name,
+                                               encompassing_obj=self,
+                                               include_checkbox=True)
+        if self.position_on_screen is not None:
+            self.dialog.move(self.position_on_screen)
+        self.dialog.show()
+
+    def pasting_thread_finished(self):
+        # The thread's result signal (if any) was delivered before its `finished`
+        logger.info(f"pasting_thread_finished ({self.id})")
         self.time_finished = time.time()
 
         if self.when_done is not None:
             self.when_done()
 
-        result = self.queue.get()
-        if len(result) == 0:
-            self._is_available = True
-            return
-
-        if result['call_type'] == 'paste_error':
-            item_name = result['item_name']
-            self.dialog = QDialogPasteExistingItem(self,
-                                                   button_texts=['Ok'],
-                                                   title_text = f'File {item_name} Could not be pasted. Aborting paste operation.',
-                                                   message_text = 'Paste error',
-                                                   item_name=item_name,
-                                                   encompassing_obj=self)
-            if self.position_on_screen is not None:
-                self.dialog.move(self.position_on_screen)
-            self.dialog.show()
-
-        elif result['call_type'] == 'finished_all':
-            print("result['call_type'] == 'finished_all' ", time.time())
-            self.items_pasted = self.items_pasted + result['items_pasted']
-            if len(self.items_pasted) > 0:
-                if self.delete_source_after_paste:
-                    print("self.caller.keep_last_action - UserAction_MoveFilesUsingThread ", time.time())
-                    self.caller.keep_last_action(
-                        UserAction_MoveFilesUsingThread(self.items_pasted,
-                                                        self.caller))
-                else:
-                    print("self.caller.keep_last_action - UserAction_CopyPasteItemsUsingThread ", time.time())
-                    self.caller.keep_last_action(
-                        UserAction_CopyPasteItemsUsingThread(self.items_pasted,
-                                                             self.caller))
-                print("self.caller.select_pasted_items_where_ui_is_in_path ", time.time())
-                self.caller.select_pasted_items_where_ui_is_in_path(
-                    path = self.dest_path,
-                    items = [extract_filename_from_path(i[1]) for i in self.items_pasted]
-                )
-
-        elif result['call_type'] == 'item_already_exist':
-            item_name = result['item_name']
-            # 'items_skipped': items_skipped,
-            # 'items_not_pasted': items_not_pasted,
-            # 'items_pasted': items_pasted})
-            self.dialog = QDialogPasteExistingItem(self,
-                                                   button_texts=['Skip', 'Replace', 'Keep both'],
-                                                   title_text = f'File {item_name} already exists in the destination folder',
-                                                   message_text = 'What do you want to do?',
-                                                   item_name=item_name,
-                                                   encompassing_obj=self,
-                                                   include_checkbox=True)
-            if self.position_on_screen is not None:
-                self.dialog.move(self.position_on_screen)
-            self.dialog.show()
-
         self._is_available = True
         self.pasting_finished.emit(self.id)
 
 
 
+class PastePlanningThread(QThread):
+    """Plans a paste (sizes, conflicts at every level, free space - see paste_planner) off
+    the UI thread, emitting `progress` (files and bytes scanned so far) while it walks the
+    items, then `planned` with the PastePlan - or nothing when cancelled."""
+    progress = Signal(int, object)
+    planned = Signal(object)
+
+    def __init__(self, copied_file_paths: list[str], dest_path: str,
+                 delete_source_after_paste: bool, parent=None):
+        super().__init__(parent)
+        self.copied_file_paths = copied_file_paths
+        self.dest_path = dest_path
+        self.delete_source_after_paste = delete_source_after_paste
+        self.stop_event = threading.Event()
+
+    def cancel(self):
+        self.stop_event.set()
+
+    def run(self):
+        plan = plan_paste(self.copied_file_paths, self.dest_path, self.delete_source_after_paste,
+                          stop_event=self.stop_event, on_progress=self.progress.emit,
+                          verify=conf.verify_algorithm)
+        if plan is not None:
+            self.planned.emit(plan)
+
+
+class PastePlanner:
+    """
+    Runs a PastePlanningThread, showing what it scanned so far (with a Cancel button) once
+    it takes more than a second, and calls `when_planned(plan)` unless it was cancelled.
+    """
+    def __init__(self, copied_file_paths: list[str], dest_path: str,
+                 delete_source_after_paste: bool, when_planned: Callable):
+        self.planning_thread = PastePlanningThread(copied_file_paths, dest_path,
+                                                   delete_source_after_paste)
+        self.when_planned = when_planned
+        self.message_box = QDialogFreeTextButtons(button_texts=["Cancel"],
+                                                  title_text="Preparing to paste",
+                                                  message_text="Scanning the items to paste...",
+                                                  btn_width=100)
+        self.message_box.accepted.connect(self.planning_thread.cancel)
+
+    @property
+    def finished(self):
+        return self.planning_thread.finished
+
+    def run(self):
+        self.planning_thread.progress.connect(self.update_progress)
+        self.planning_thread.planned.connect(self.when_planned)
+        self.planning_thread.finished.connect(self.planning_finished)
+        self.planning_thread.start()
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.message_box.show)
+        self.timer.start(1000)
+
+    def update_progress(self, files_scanned: int, bytes_scanned: int):
+        self.message_box.set_message_text(
+            f"Scanning the items to paste: {files_scanned:,} files, "
+            f"{beautify_bytes_size(bytes_scanned)[2]} so far")
+
+    def planning_finished(self):
+        self.timer.stop()
+        self.message_box.hide()
+
+
 class PasteItemsThread(QThread):
     """
     Wrapper which performs the actual pasting of items from source to destination.
+    Emits `progress` (a CopyProgress) about every 100 ms while copying, then one of
+    `finished_all` (the (src, dest) pairs pasted), `paste_error` or `item_already_exist`
+    (the item's name) - or none when stopped.
     """
-    def __init__(self,
-                 results_queue: Queue = None,  # queue used to send output to the caller class
-                 parent=None):
+    progress = Signal(object)
+    finished_all = Signal(list)
+    paste_error = Signal(str)
+    item_already_exist = Signal(str)
+
+    def __init__(self, parent=None):
         super().__init__(parent)
-        self.results_queue = results_queue
+        self.copy_engine = CopyEngine(on_progress=self.progress.emit)
 
     def set_run_params(self,
                        source_dest_pairs: list[tuple[str, str, str]],  # [(from, to, when_conflicting), ...]
-                       delete_source_after_paste: bool):
+                       delete_source_after_paste: bool,
+                       resume_journal: CopyJournal = None,
+                       plan: PastePlan = None):
         self.source_dest_pairs = source_dest_pairs
         self.delete_source_after_paste = delete_source_after_paste
+        self.resume_journal = resume_journal
+        self.plan = plan
 
     def run(self):
         self._forced_to_stop = False
 
-        success = 0  # Nothing happened
-        items_skipped = []
-        items_not_pasted = []
         items_pasted = []
+        self.copy_engine.verify = conf.verify_algorithm
+        self.copy_engine.start()
+
+        if self.resume_journal is not None:
+            # Conflicts were settled and renames done before the job was interrupted
+            journal = self.resume_journal
+            self.delete_source_after_paste = journal.delete_source_after_paste
+            self._copy_journaled(journal.pairs, journal, items_pasted)
+            return
 
-        for i, d in enumerate(self.source_dest_pairs):
-            # time.sleep(0.3)
+        # 1. Settle conflicts with items already in the destination
+        pairs_to_paste = []
+        name_allocators = {}    # Destination folder -> UniqueNameAllocator, listed once
+        for src, dest, when_conflicting in self.source_dest_pairs:
             if self._forced_to_stop:
-                self.results_queue.put({'call_type': 'forced_to_stop',
-                                        'items_skipped': items_skipped,
-                                        'items_not_pasted': items_not_pasted,
-                                        'items_pasted': items_pasted})
-                print("PasteItemsThread.run - 'forced_to_stop' ", time.time())
-                break
-
-            src, dest, when_conflicting = d
+                return
             if not os.path.exists(src):
                 continue
             filename = extract_filename_from_path(src)
@@ -312,57 +488,89 @@ class PasteItemsThread(QThread):
             # Item with identical name already in destination path
             if os.path.exists(dest):
                 if when_conflicting == 'skip_item':
-                    print("items_skipped.append((src, dest)) ", time.time())
-                    items_skipped.append((src, dest))
                     continue
                 elif when_conflicting == 'keep_both':
                     # change dest path to indicate duplication
                     dest_dir = extract_parent_path_from_path(dest)
-                    dest = increment_max_item_name(get_all_item_names_in_directory(dest_dir),
-                                                   extract_parent_path_from_path(dest), filename)
+                    if dest_dir not in name_allocators:
+                        name_allocators[dest_dir] = UniqueNameAllocator.for_directory(dest_dir)
+                    dest = os.path.join(dest_dir, name_allocators[dest_dir].allocate(filename))
                 elif when_conflicting == 'replace':
-                    print("delete_item ", time.time())
                     delete_item(dest)
                 # This part should never be reached:
                 else:
-                    self.results_queue.put({'call_type': 'item_already_exist',
-                                            'item_name': dest,
-                                            'items_skipped': items_skipped,
-                                            'items_not_pasted': items_not_pasted,
-                                            'items_pasted': items_pasted})
-                    print("self.results_queue.put - 'item_already_exist' ", time.time())
+                    self.item_already_exist.emit(dest)
                     return
 
-            # Perform the actual pasting
             if src != dest:
-                print("success = copy_and_paste_item ", time.time())
-                success = copy_and_paste_item(src, dest_item_full_path=dest)
-
-            if success >= 0:
-                # self.items_finished.emit()
-                if success == 1:
-                    print("items_pasted.append ", time.time())
-                    items_pasted.append((src, dest))
-                elif success == 0:
-                    print("items_not_pasted.append ", time.time())
-                    items_not_pasted.append((src, dest))
-                if self.delete_source_after_paste:
-                    print("move_to_trash(src) ", time.time())
+                pairs_to_paste.append((src, dest))
+
+        # 2. A cut/paste within one volume is a rename of the item
+        pairs_to_copy = []
+        for src, dest in pairs_to_paste:
+            if self.delete_source_after_paste and self.copy_engine.rename_item(src, dest):
+                items_pasted.append((src, dest))
+            else:
+                pairs_to_copy.append((src, dest))
+
+        # 3. Everything else is copied as one job, journaled so that it can be resumed if the
+        # app quits (or crashes) before it's done
+        journal = None
+        if len(pairs_to_copy) > 0:
+            journal = CopyJournal.create(PASTE_JOURNALS_PATH, pairs_to_copy,
+                                         extract_parent_path_from_path(pairs_to_copy[0][1]),
+                                         self.delete_source_after_paste)
+        self._copy_journaled(pairs_to_copy, journal, items_pasted)
+
+    def _copy_journaled(self, pairs_to_copy: list[tuple[str, str]], journal: CopyJournal,
+                        items_pasted: list[tuple[str, str]]):
+        # The files are copied in parallel (hashed and checked when verifying pastes), and when
+        # cutting the source is removed only once its copy was verified
+        already_done = set(journal.completed_items) if journal is not None else set()
+        self.copy_engine.journal = journal
+        # The folders the planner listed aren't walked again, if they didn't change since
+        # (taken now, after any conflict dialog and wait in the queue)
+        listings = self.plan.listings() if self.plan is not None else None
+        results = self.copy_engine.copy_items(pairs_to_copy, listings)
+        self.copy_engine.journal = None
+        if self.copy_engine.is_checkpointed:
+            # The app is quitting: keep the journal, to resume on the next launch
+            if journal is not None:
+                journal.close()
+            return
+        if self.copy_engine.is_cancelled:
+            if journal is not None:
+                journal.remove(remove_partial_files=True)
+            return
+        failed_item_name = None
+        for i, ((src, dest), success) in enumerate(zip(pairs_to_copy, results)):
+            if i in already_done:
+                items_pasted.append((src, dest))
+                continue
+            if success == 1 and self.delete_source_after_paste:
+                if self.copy_engine.verify_copy(src, dest):
                     move_to_trash(src)
-                    print("Finished move_to_trash(src) ", time.time())
-            elif success == -1:
-                self.results_queue.put({'call_type': 'paste_error', 'item_name': filename,
-                                        'items_skipped': items_skipped,
-                                        'items_not_pasted': items_not_pasted,
-                                        'items_pasted': items_pasted})
-                print("self.results_queue.put - 'paste_error' ", time.time())
-                return
-
-        self.results_queue.put({'call_type': 'finished_all',
-                                'items_skipped': items_skipped,
-                                'items_not_pasted': items_not_pasted,
-                                'items_pasted': items_pasted})
-        print("self.results_queue.put - 'finished_all' ", time.time())
+                else:
+                    # Keep the source: it's the only complete copy
+                    success = -1
+            if success == 1:
+                items_pasted.append((src, dest))
+                if journal is not None:
+                    journal.item_completed(i)
+            elif success == -1 and failed_item_name is None:
+                failed_item_name = extract_filename_from_path(src)
+
+        if journal is not None:
+            journal.remove()
+        self.copy_engine.finish()
+        if len(self.copy_engine.verify_failures) > 0:
+            logger.warning(f"Copies which didn't match their source: {self.copy_engine.verify_failures}")
+        if len(self.copy_engine.skipped_files) > 0:
+            logger.warning(f"Special files (FIFOs, sockets, devices) not copied: {self.copy_engine.skipped_files}")
+        if failed_item_name is not None:
+            self.paste_error.emit(failed_item_name)
+            return
+        self.finished_all.emit(items_pasted)
 
 
 
@@ -402,10 +610,12 @@ class RadioButtonGroupWidget(QWidget):
 
 
 class TableWithRadioButtons(QMainWindow):
-    def __init__(self, caller, dest_path: str, conflicting_item_names: list[str] = [], copied_file_paths: list[str] = [], delete_source_after_paste: bool = False):
+    def __init__(self, caller, dest_path: str, conflicting_item_names: list[str] = [], copied_file_paths: list[str] = [], delete_source_after_paste: bool = False,
+                 plan: PastePlan = None):
         super().__init__()
 
         self.caller = caller
+        self.plan = plan
         self.dest_path = dest_path
         self.copied_file_paths = copied_file_paths
         self.conflicting_item_names = conflicting_item_names
@@ -445,8 +655,14 @@ class TableWithRadioButtons(QMainWindow):
         # Populate the table
         default_row_height = self.table.verticalHeader().defaultSectionSize()
         for i, item in enumerate(item_names):
-            # Set item in the first column
-            self.table.setItem(i, 0, QTableWidgetItem(item))
+            # Set item in the first column. A folder also lists what's below it in both places
+            nested_conflicts = self.plan.nested_conflicts_of(item) if self.plan is not None else []
+            if len(nested_conflicts) > 0:
+                table_item = QTableWidgetItem(f"{item}  ({len(nested_conflicts):,} items inside also exist)")
+                table_item.setToolTip("\n".join(nested_conflicts[:50]))
+            else:
+                table_item = QTableWidgetItem(item)
+            self.table.setItem(i, 0, table_item)
 
             # Add radio button group in the second column
             radio_buttons_widget = RadioButtonGroupWidget()
@@ -507,7 +723,8 @@ class TableWithRadioButtons(QMainWindow):
             self.caller.paste_items_via_thread(self.copied_file_paths,
                                                self.dest_path,
                                                self.delete_source_after_paste,
-                                               item_names_to_keep_both=item_names_to_keep_both)
+                                               item_names_to_keep_both=item_names_to_keep_both,
+                                               plan=self.plan)
 
 
 class QDialogPasteExistingItem(QDialogFreeTextButtons):
@@ -557,8 +774,18 @@ class QDialogPasteExistingItem(QDialogFreeTextButtons):
 
 
 
+# Bandwidth caps offered per paste (bytes per second; None for no limit)
+BANDWIDTH_LIMIT_CHOICES = [("Full speed", None),
+                           ("100 MB/s", 100 * 1024 ** 2),
+                           ("25 MB/s", 25 * 1024 ** 2),
+                           ("5 MB/s", 5 * 1024 ** 2),
+                           ("1 MB/s", 1024 ** 2)]
+
+
 class SinglePasteProcessUiWidget(QFrame):
     btn_clicked = Signal()
+    pause_toggled = Signal(bool)                # True to pause
+    bandwidth_limit_changed = Signal(object)    # Bytes per second, or None
 
     def __init__(self, button_text: str = "", top_text: str = "", width: int = 300, height: int = 150):
         super().__init__()
@@ -575,25 +802,73 @@ class SinglePasteProcessUiWidget(QFrame):
         # Create the QLabel for the top-left corner
         label = QLabel(top_text, self)
 
+        # Live progress: bytes done out of total, current file, throughput and ETA
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 1000)
+        self.progress_bar.setFixedHeight(12)
+        self.progress_bar.setTextVisible(False)
+        self.progress_label = QLabel("Preparing...")
+
         self.button = QPushButton(button_text)
         self.button.setFixedWidth(80)
         self.button.setFixedHeight(20)
         self.button.clicked.connect(self.emitButtonClickedSignal)
 
+        # Pausing takes effect mid-file; the bandwidth cap keeps a long paste from
+        # starving other work on its disks
+        self.pause_button = QPushButton("Pause")
+        self.pause_button.setFixedWidth(80)
+        self.pause_button.setFixedHeight(20)
+        self.pause_button.setCheckable(True)
+        self.pause_button.toggled.connect(self.handle_pause_toggled)
+        self.bandwidth_combo = QComboBox()
+        self.bandwidth_combo.setFixedHeight(20)
+        for text, limit in BANDWIDTH_LIMIT_CHOICES:
+            self.bandwidth_combo.addItem(text, limit)
+        self.bandwidth_combo.currentIndexChanged.connect(
+            lambda index: self.bandwidth_limit_changed.emit(BANDWIDTH_LIMIT_CHOICES[index][1]))
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(self.button)
+        buttons_layout.addWidget(self.pause_button)
+        buttons_layout.addWidget(self.bandwidth_combo)
+        buttons_layout.addStretch()
+
         layout = QVBoxLayout(self)
         layout.addWidget(label, 2, Qt.AlignLeft | Qt.AlignTop)
-        layout.addWidget(self.button, 2, Qt.AlignLeft | Qt.AlignBottom)
+        layout.addWidget(self.progress_bar)
+        layout.addWidget(self.progress_label, 0, Qt.AlignLeft)
+        layout.addLayout(buttons_layout, 2)
         layout.setContentsMargins(5, 10, 5, 10)
         self.setLayout(layout)
 
+    def set_progress(self, progress: CopyProgress):
+        self.progress_bar.setValue(int(progress.fraction_done * 1000))
+        text = (f"{beautify_bytes_size(progress.bytes_done)[2]} of "
+                f"{beautify_bytes_size(progress.bytes_total)[2]}"
+                f" ({progress.files_done:,} of {progress.files_total:,} items)"
+                f" - {beautify_bytes_size(int(progress.bytes_per_second))[2]}/s"
+                f" - {format_duration(progress.eta_seconds)} left")
+        if progress.is_paused:
+            text += " - paused"
+        if progress.current_file:
+            text += f"\n{extract_filename_from_path(progress.current_file)}"
+        self.progress_label.setText(text)
+
+    def handle_pause_toggled(self, paused: bool):
+        self.pause_button.setText("Resume" if paused else "Pause")
+        self.pause_toggled.emit(paused)
+
     def emitButtonClickedSignal(self):
         self.btn_clicked.emit()
 
 
 class PastingProcessesUi(QWidget):
     break_pasting_signal = Signal(int)
+    pause_pasting_signal = Signal(int, bool)            # widget id, True to pause
+    throttle_pasting_signal = Signal(int, object)       # widget id, bytes per second or None
     
-    def __init__(self, width_per_widget: int = 1000, height_per_widget: int = 80):
+    def __init__(self, width_per_widget: int = 1000, height_per_widget: int = 120):
         super().__init__()
         self.setWindowTitle("Currently running pasting processes")
         self.height_per_widget = height_per_widget
@@ -628,12 +903,22 @@ class PastingProcessesUi(QWidget):
             # self.resize(self.width(), widget.height() - 100)
             self.resize(self.width(), (1 + len(self.widgets_list)) * self.height_per_widget)
 
+    def update_progress(self, widget_id: int, progress: CopyProgress):
+        for widget in self.widgets_list:
+            if widget.id == widget_id:
+                widget.set_progress(progress)
+                break
+
     def add_widget(self, id: int, text: str = ""):
         new_widget = SinglePasteProcessUiWidget("Cancel", text,
                                                 width=self.width_per_widget,
                                                 height=self.height_per_widget)
         new_widget.id = id
         new_widget.btn_clicked.connect(self.emit_stop_pasting_signal(self, id))
+        new_widget.pause_toggled.connect(
+            lambda paused, id=id: self.pause_pasting_signal.emit(id, paused))
+        new_widget.bandwidth_limit_changed.connect(
+            lambda limit, id=id: self.throttle_pasting_signal.emit(id, limit))
         self.scroll_layout.addWidget(new_widget)
         self.widgets_list.append(new_widget)
         self.resize(self.width(), (1 + len(self.widgets_list)) * self.height_per_widget)
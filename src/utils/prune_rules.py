@@ -0,0 +1,130 @@
+"""Rules deciding which sub-folders the recursive walkers (search, folder sizes, zipping)
+descend into. The name patterns, max depth and staying on one disk only filter searches; walks
+which must see every item (sizes, zipping) keep only the loop protection
+(``conf.full_tree_prune_rules``).
+
+Kept free of Qt and pyobjc so it is unit-testable and usable from worker threads and
+processes. The rules themselves are stored in ``ConfigurationsManager`` (``conf.prune_rules``).
+"""
+
+import fnmatch
+import os
+import re
+import threading
+from typing import Iterator, Optional
+
+
+# Folders which are expensive to walk and practically never contain what we're after
+DEFAULT_PRUNE_PATTERNS = ['.git', 'node_modules', '__pycache__', '.venv',
+                          'Backups.backupdb', '.Trashes', '.Spotlight-V100', '.fseventsd',
+                          '.DocumentRevisions-V100']
+
+
+class PruneRules:
+    """
+    - patterns: globs matched (case-insensitively) against folder names; matching folders
+      are skipped entirely
+    - max_depth: items deeper than this (the root's children are at depth 1) are not
+      visited; None means no limit
+    - stay_on_filesystem: don't descend into folders on another device (mounted volumes,
+      Time Machine disks, network shares)
+    - follow_symlinks: descend into symlinked folders. Every folder is recorded by its
+      (st_dev, st_ino), so symlink (or directory hard-link) loops are entered only once.
+    """
+    def __init__(self, patterns: Optional[list[str]] = None, max_depth: Optional[int] = None,
+                 stay_on_filesystem: bool = False, follow_symlinks: bool = False):
+        self.patterns = list(DEFAULT_PRUNE_PATTERNS if patterns is None else patterns)
+        self.max_depth = max_depth
+        self.stay_on_filesystem = stay_on_filesystem
+        self.follow_symlinks = follow_symlinks
+        self._name_regex = re.compile('|'.join(fnmatch.translate(p) for p in self.patterns),
+                                      re.IGNORECASE) if self.patterns else None
+
+    def is_pruned_name(self, name: str) -> bool:
+        return self._name_regex is not None and self._name_regex.match(name) is not None
+
+    def new_walk(self, root: str) -> 'PruneWalk':
+        return PruneWalk(self, root)
+
+    def walk(self, root: str) -> Iterator[tuple[str, list[str], list[str]]]:
+        """Drop-in replacement for a top-down ``os.walk(root)`` which applies the rules.
+        Folders with a pruned name are left out of `dirs` altogether."""
+        prune_walk = self.new_walk(root)
+        stack = [(root, 0)]
+        while stack:
+            current_path, depth = stack.pop()
+            dirs, files, descend = [], [], []
+            try:
+                with os.scandir(current_path) as it:
+                    for entry in it:
+                        try:
+                            is_dir = entry.is_dir(follow_symlinks=self.follow_symlinks)
+                        except OSError:
+                            is_dir = False
+                        if not is_dir:
+                            files.append(entry.name)
+                            continue
+                        if self.is_pruned_name(entry.name):
+                            continue
+                        dirs.append(entry.name)
+                        if prune_walk.should_descend(entry, depth + 1):
+                            descend.append(entry.path)
+            except OSError:
+                continue
+            yield current_path, dirs, files
+            stack.extend((path, depth + 1) for path in reversed(descend))
+
+
+class PruneWalk:
+    """Per-walk state of a set of PruneRules: the root's device and the folders visited."""
+    def __init__(self, rules: PruneRules, root: str):
+        self.rules = rules
+        self.visited = set()
+        # A walk may be shared by several threads (e.g., the parallel folder-size scan)
+        self._visited_lock = threading.Lock()
+        self.root_dev = None
+        try:
+            st = os.stat(root)
+            self.root_dev = st.st_dev
+            self.visited.add((st.st_dev, st.st_ino))
+        except OSError:
+            pass
+
+    def should_descend(self, entry: os.DirEntry, depth: int) -> bool:
+        """Whether the folder `entry`, found at `depth` below the root, should be listed.
+        Costs at most one stat() per folder (none for pruned names)."""
+        rules = self.rules
+        if rules.max_depth is not None and depth >= rules.max_depth:
+            return False
+        if rules.is_pruned_name(entry.name):
+            return False
+        try:
+            if not entry.is_dir(follow_symlinks=rules.follow_symlinks):
+                return False
+            st = entry.stat(follow_symlinks=rules.follow_symlinks)
+        except OSError:
+            return False
+        if rules.stay_on_filesystem and self.root_dev is not None and st.st_dev != self.root_dev:
+            return False
+        return self.mark_visited((st.st_dev, st.st_ino))
+
+    def mark_visited(self, key: tuple[int, int]) -> bool:
+        """Record the folder with this (st_dev, st_ino) as visited; False if it already was."""
+        with self._visited_lock:
+            if key in self.visited:
+                return False
+            self.visited.add(key)
+        return True
+
+    def was_visited(self, entry: os.DirEntry) -> bool:
+        """Whether the folder `entry` was left out because the walk had already visited it
+        (through a symlink or another hard link) - i.e. because of the walk's state rather
+        than of the rules."""
+        if self.rules.is_pruned_name(entry.name):
+            return False
+        try:
+            st = entry.stat(follow_symlinks=self.rules.follow_symlinks)
+        except OSError:
+            return False
+        with self._visited_lock:
+            return (st.st_dev, st.st_ino) in self.visited
@@ -0,0 +1,144 @@
+"""Saved searches, opened as virtual folders in the file explorer.
+
+Kept free of Qt and pyobjc so the incremental refresh is unit-testable. The Qt glue lives
+in ``FileExplorerTable.open_saved_search`` and the search window.
+
+A saved search remembers, per directory it walked, the directory's mtime, its sub-folders
+and the entries whose *names* matched. Adding, removing or renaming an entry changes the
+mtime of the directory holding it, so a refresh only lists the directories whose mtime
+changed and reuses everything else; stat-based predicates ("size > 1 GB") are re-checked
+for the cached name matches only.
+"""
+
+import os
+import pickle
+from typing import Optional
+
+from src.utils.prune_rules import PruneRules
+from src.utils.search_predicates import SearchQuery, PathEntry
+from src.utils.search_utils import MATCH_MODE_SUBSTRING, Matcher, compile_matcher, parse_search
+
+
+class _CachedDirectory:
+    __slots__ = ('mtime_ns', 'sub_dirs', 'name_matches')
+
+    def __init__(self, mtime_ns: int, sub_dirs: list[str], name_matches: list[str]):
+        self.mtime_ns = mtime_ns
+        self.sub_dirs = sub_dirs
+        self.name_matches = name_matches
+
+
+class SavedSearch:
+    def __init__(self, name: str, root: str, text: str, match_mode: str = MATCH_MODE_SUBSTRING):
+        self.name = name
+        self.root = root
+        self.text = text
+        self.match_mode = match_mode
+        self.results = []           # Paths relative to root, as of the last refresh
+        self._dir_cache = {}        # Relative directory path -> _CachedDirectory
+        self._query = None
+        self._matcher = None
+        # Counters of the last refresh
+        self.dirs_listed = 0
+        self.dirs_reused = 0
+
+    def __getstate__(self):
+        # The compiled query/matcher hold lambdas; they're rebuilt on first use
+        state = self.__dict__.copy()
+        state['_query'] = None
+        state['_matcher'] = None
+        return state
+
+    def _compiled(self) -> tuple[SearchQuery, Optional[Matcher]]:
+        if self._query is None:
+            self._query = parse_search(self.text, self.match_mode)
+            self._matcher = compile_matcher(self._query.name_text, self.match_mode) \
+                if self._query.name_text else None
+        return self._query, self._matcher
+
+    def _list_directory(self, abs_path: str, mtime_ns: int, depth: int,
+                        prune_walk) -> Optional[_CachedDirectory]:
+        query, matcher = self._compiled()
+        sub_dirs = []
+        name_matches = []
+        try:
+            with os.scandir(abs_path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=prune_walk.rules.follow_symlinks):
+                            if prune_walk.rules.is_pruned_name(entry.name):
+                                continue
+                            if prune_walk.should_descend(entry, depth + 1):
+                                sub_dirs.append(entry.name)
+                    except OSError:
+                        pass
+                    if matcher is not None and matcher(entry.name) is None:
+                        continue
+                    if query.name_passes(entry):
+                        name_matches.append(entry.name)
+        except OSError:
+            return None
+        return _CachedDirectory(mtime_ns, sub_dirs, name_matches)
+
+    def refresh(self, prune_rules: PruneRules = None) -> list[str]:
+        """Bring `results` up to date, listing only directories changed since the last
+        refresh (all of them the first time), and return them."""
+        query, _ = self._compiled()
+        prune_walk = (prune_rules or PruneRules(patterns=[])).new_walk(self.root)
+        new_cache = {}
+        results = []
+        self.dirs_listed = 0
+        self.dirs_reused = 0
+        stack = [('', 0)]
+        while stack:
+            relative_dir, depth = stack.pop()
+            abs_dir = os.path.join(self.root, relative_dir) if relative_dir else self.root
+            cached = self._dir_cache.get(relative_dir)
+            try:
+                mtime_ns = os.stat(abs_dir).st_mtime_ns
+            except OSError:
+                continue
+            if cached is not None and cached.mtime_ns == mtime_ns:
+                self.dirs_reused += 1
+            else:
+                # The mtime is taken before listing, so a change made meanwhile is seen next time
+                cached = self._list_directory(abs_dir, mtime_ns, depth, prune_walk)
+                if cached is None:
+                    continue
+                self.dirs_listed += 1
+            new_cache[relative_dir] = cached
+
+            for name in cached.name_matches:
+                relative_path = os.path.join(relative_dir, name) if relative_dir else name
+                if query.stat_predicates and \
+                        not query.stat_passes(PathEntry(os.path.join(self.root, relative_path))):
+                    continue
+                results.append(relative_path)
+            for name in reversed(cached.sub_dirs):
+                stack.append((os.path.join(relative_dir, name) if relative_dir else name, depth + 1))
+
+        self._dir_cache = new_cache
+        self.results = results
+        return results
+
+    def watched_directories(self) -> list[str]:
+        """Absolute paths of the root and of every directory the last refresh walked: a
+        new match anywhere changes the mtime of one of them, so they're the directories
+        worth watching for changes."""
+        return [os.path.join(self.root, relative_dir) if relative_dir else self.root
+                for relative_dir in self._dir_cache]
+
+
+def load_saved_searches(file_path: str) -> dict[str, SavedSearch]:
+    if not os.path.exists(file_path):
+        return {}
+    try:
+        with open(file_path, 'rb') as f:
+            return pickle.load(f)
+    except Exception:
+        return {}
+
+
+def save_saved_searches(file_path: str, saved_searches: dict[str, SavedSearch]):
+    with open(file_path, 'wb') as f:
+        pickle.dump(saved_searches, f)
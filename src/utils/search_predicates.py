@@ -0,0 +1,195 @@
+"""Metadata predicates for the search window: "size > 1 GB", "modified in last 3 days",
+"ext in {mp4, mov}", "type = folder".
+
+Kept free of Qt and pyobjc so the parser is unit-testable. The Qt glue lives in
+``src/ui_components/misc_widgets/search_box_window.py``.
+
+A query is free text (matched against item names using the selected match mode) mixed
+with any number of predicate clauses, e.g. ``report ext in {pdf, docx} size > 2 MB``;
+in the regex and glob modes the whole text is the pattern (``search_utils.parse_search``).
+Predicates are evaluated against the ``os.DirEntry`` the walker already has: those that
+only need the name/type are checked first, and the (cached) ``entry.stat()`` is only
+called for entries that passed them.
+"""
+
+import datetime
+import os
+import re
+import stat as stat_module
+import time
+from typing import Callable, Optional
+
+
+SIZE_UNITS = {
+    'b': 1, 'bytes': 1,
+    'k': 1024, 'kb': 1024,
+    'm': 1024 ** 2, 'mb': 1024 ** 2,
+    'g': 1024 ** 3, 'gb': 1024 ** 3,
+    't': 1024 ** 4, 'tb': 1024 ** 4,
+}
+TIME_UNITS_SECONDS = {
+    'minute': 60,
+    'hour': 60 * 60,
+    'day': 24 * 60 * 60,
+    'week': 7 * 24 * 60 * 60,
+    'month': 30 * 24 * 60 * 60,
+    'year': 365 * 24 * 60 * 60,
+}
+_COMPARISONS = {
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+}
+
+_SIZE_RE = re.compile(r'\bsize\s*(>=|<=|!=|>|<|=)\s*(\d+(?:\.\d+)?)\s*([a-z]+)?\b', re.IGNORECASE)
+_MODIFIED_LAST_RE = re.compile(
+    r'\bmodified\s+(?:in\s+)?(?:the\s+)?last\s+(\d+)\s*(minute|hour|day|week|month|year)s?\b',
+    re.IGNORECASE)
+_MODIFIED_DATE_RE = re.compile(r'\bmodified\s+(before|after)\s+(\d{4}-\d{2}-\d{2})\b', re.IGNORECASE)
+_EXT_IN_RE = re.compile(r'\b(?:ext|extension)\s+in\s*\{([^}]*)\}', re.IGNORECASE)
+_EXT_EQ_RE = re.compile(r'\b(?:ext|extension)\s*=\s*\.?([\w-]+)', re.IGNORECASE)
+_TYPE_RE = re.compile(r'\btype\s*=\s*(file|folder)\b', re.IGNORECASE)
+_LEFTOVER_AND_RE = re.compile(r'^(?:and\b\s*)+|(?:\s*\band)+$', re.IGNORECASE)
+
+# Name predicates take the entry; stat predicates take the entry and its stat result
+NamePredicate = Callable[[os.DirEntry], bool]
+StatPredicate = Callable[[os.DirEntry, os.stat_result], bool]
+
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir(follow_symlinks=False)
+    except OSError:
+        return False
+
+
+def _extension(name: str) -> str:
+    return os.path.splitext(name)[1][1:].lower()
+
+
+class SearchQuery:
+    """
+    A parsed query: the free text left for the name matcher plus the predicates.
+    `entry_passes` is the single check the walker runs per entry.
+    """
+    def __init__(self, name_text: str, name_predicates: list[NamePredicate] = None,
+                 stat_predicates: list[StatPredicate] = None):
+        self.name_text = name_text
+        self.name_predicates = name_predicates or []
+        self.stat_predicates = stat_predicates or []
+
+    @property
+    def has_predicates(self) -> bool:
+        return bool(self.name_predicates or self.stat_predicates)
+
+    def entry_passes(self, entry: os.DirEntry) -> bool:
+        return self.name_passes(entry) and self.stat_passes(entry)
+
+    def name_passes(self, entry: os.DirEntry) -> bool:
+        for predicate in self.name_predicates:
+            if not predicate(entry):
+                return False
+        return True
+
+    def stat_passes(self, entry: os.DirEntry) -> bool:
+        if not self.stat_predicates:
+            return True
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except OSError:
+            return False
+        for predicate in self.stat_predicates:
+            if not predicate(entry, stat):
+                return False
+        return True
+
+
+class PathEntry:
+    """The bits of ``os.DirEntry`` the predicates use, for a path known from a cache
+    rather than from a directory listing."""
+    __slots__ = ('name', 'path', '_stat')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        self._stat = None
+
+    def stat(self, follow_symlinks: bool = True) -> os.stat_result:
+        if self._stat is None:
+            self._stat = os.stat(self.path, follow_symlinks=follow_symlinks)
+        return self._stat
+
+    def is_dir(self, follow_symlinks: bool = True) -> bool:
+        return stat_module.S_ISDIR(self.stat(follow_symlinks).st_mode)
+
+
+def parse_query(text: str, now: Optional[float] = None) -> SearchQuery:
+    """Split `text` into predicates and the remaining name text.
+
+    Raises ``ValueError`` (with a message fit for the user) for a malformed predicate,
+    such as an unknown size unit or an invalid date.
+    """
+    now = time.time() if now is None else now
+    name_predicates = []
+    stat_predicates = []
+    spans = []
+
+    for m in _SIZE_RE.finditer(text):
+        op, number, unit = m.group(1), float(m.group(2)), (m.group(3) or 'b').lower()
+        if unit not in SIZE_UNITS:
+            raise ValueError(f"Unknown size unit '{m.group(3)}' (use B, KB, MB, GB or TB)")
+        threshold = number * SIZE_UNITS[unit]
+        compare = _COMPARISONS[op]
+        # Folders have no meaningful st_size, so size predicates only ever match files
+        stat_predicates.append(
+            lambda entry, stat, compare=compare, threshold=threshold:
+                not _is_dir(entry) and compare(stat.st_size, threshold))
+        spans.append(m.span())
+
+    for m in _MODIFIED_LAST_RE.finditer(text):
+        since = now - int(m.group(1)) * TIME_UNITS_SECONDS[m.group(2).lower()]
+        stat_predicates.append(lambda entry, stat, since=since: stat.st_mtime >= since)
+        spans.append(m.span())
+
+    for m in _MODIFIED_DATE_RE.finditer(text):
+        try:
+            date = datetime.datetime.strptime(m.group(2), '%Y-%m-%d').timestamp()
+        except ValueError:
+            raise ValueError(f"Invalid date '{m.group(2)}' (expected YYYY-MM-DD)")
+        if m.group(1).lower() == 'before':
+            stat_predicates.append(lambda entry, stat, date=date: stat.st_mtime < date)
+        else:
+            stat_predicates.append(
+                lambda entry, stat, date=date: stat.st_mtime >= date + TIME_UNITS_SECONDS['day'])
+        spans.append(m.span())
+
+    extensions = set()
+    for m in _EXT_IN_RE.finditer(text):
+        extensions.update(x.strip().lstrip('.').lower() for x in m.group(1).split(',') if x.strip())
+        spans.append(m.span())
+    for m in _EXT_EQ_RE.finditer(text):
+        extensions.add(m.group(1).lower())
+        spans.append(m.span())
+    if extensions:
+        # Only files have an extension ("photos.mp4" may well be a folder)
+        name_predicates.append(
+            lambda entry: not _is_dir(entry) and _extension(entry.name) in extensions)
+
+    for m in _TYPE_RE.finditer(text):
+        want_folder = m.group(1).lower() == 'folder'
+        name_predicates.append(lambda entry, want_folder=want_folder: _is_dir(entry) == want_folder)
+        spans.append(m.span())
+
+    # Whatever isn't a predicate is the name text ("and" between clauses is dropped)
+    fragments = []
+    last_end = 0
+    for start, end in sorted(spans):
+        fragments.append(text[last_end:start])
+        last_end = max(last_end, end)
+    fragments.append(text[last_end:])
+    name_text = ' '.join(f for f in (_LEFTOVER_AND_RE.sub('', f.strip()).strip() for f in fragments) if f)
+
+    return SearchQuery(name_text, name_predicates, stat_predicates)
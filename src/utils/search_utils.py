@@ -0,0 +1,346 @@
+"""Pure, UI-agnostic helpers for the search window.
+
+Kept free of Qt and pyobjc so the matching/walking logic is unit-testable and
+usable from worker threads. The Qt glue lives in
+``src/ui_components/misc_widgets/search_box_window.py``.
+"""
+
+import fnmatch
+import heapq
+import itertools
+import os
+import re
+import threading
+import time
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from src.utils.prune_rules import PruneRules
+from src.utils.search_predicates import SearchQuery, parse_query
+
+
+# Match modes offered by the search window, in the order they are displayed.
+MATCH_MODE_SUBSTRING = 'substring'
+MATCH_MODE_CASE_INSENSITIVE = 'case_insensitive'
+MATCH_MODE_GLOB = 'glob'
+MATCH_MODE_REGEX = 'regex'
+MATCH_MODE_FUZZY = 'fuzzy'
+MATCH_MODES = {
+    MATCH_MODE_SUBSTRING: "Contains",
+    MATCH_MODE_CASE_INSENSITIVE: "Contains (ignore case)",
+    MATCH_MODE_GLOB: "Glob (*.txt)",
+    MATCH_MODE_REGEX: "Regular expression",
+    MATCH_MODE_FUZZY: "Fuzzy",
+}
+
+# Modes whose text may hold metadata predicates ("size > 1 GB"); in the others (regex, glob)
+# the whole text is the pattern, e.g. a regex like "ext=[0-9]+" or "size>1" isn't split up
+PREDICATE_MATCH_MODES = (MATCH_MODE_SUBSTRING, MATCH_MODE_CASE_INSENSITIVE, MATCH_MODE_FUZZY)
+
+# A matcher takes an entry name and returns None (no match) or a score (higher is better).
+# Non-fuzzy modes always score 0, so results keep the order in which they were found.
+Matcher = Callable[[str], Optional[int]]
+
+
+"""
+Fuzzy (fzf-style) scoring
+"""
+
+FUZZY_SCORE_MATCH = 16
+FUZZY_SCORE_GAP_START = -3
+FUZZY_SCORE_GAP_EXTENSION = -1
+FUZZY_BONUS_BOUNDARY = 8        # Match right after a separator ('my_file' -> 'f')
+FUZZY_BONUS_CAMEL = 7           # Match on a lower->upper transition ('myFile' -> 'F')
+FUZZY_BONUS_CONSECUTIVE = 4     # Match right after the previous matched character
+FUZZY_BONUS_FIRST_CHAR_MULTIPLIER = 2
+_FUZZY_SEPARATORS = set(' _-./\\')
+
+
+def _char_bonus(prev_char: str, char: str) -> int:
+    if prev_char in _FUZZY_SEPARATORS:
+        return FUZZY_BONUS_BOUNDARY
+    if prev_char.islower() and char.isupper():
+        return FUZZY_BONUS_CAMEL
+    if not prev_char.isdigit() and char.isdigit():
+        return FUZZY_BONUS_CAMEL
+    return 0
+
+
+def fuzzy_score(pattern: str, text: str, case_sensitive: bool = False) -> Optional[int]:
+    """Score `text` against `pattern` the way fzf's v1 algorithm does, or return None if the
+    pattern's characters don't all appear in `text` in order.
+
+    A forward scan finds the earliest position the pattern ends at; a backward scan from
+    there finds the shortest window containing it. Characters inside that window are
+    scored with bonuses for word boundaries, camelCase and consecutive runs, and gaps are
+    penalised, so ``fuzzy_score('fb', 'foo_bar')`` beats ``fuzzy_score('fb', 'fooxbar')``.
+    """
+    if pattern == '':
+        return 0
+    if not case_sensitive:
+        pattern_cmp = pattern.lower()
+        text_cmp = text.lower()
+    else:
+        pattern_cmp = pattern
+        text_cmp = text
+
+    # Forward pass: earliest end index of a subsequence match
+    p_idx = 0
+    end_idx = -1
+    for i, c in enumerate(text_cmp):
+        if c == pattern_cmp[p_idx]:
+            p_idx += 1
+            if p_idx == len(pattern_cmp):
+                end_idx = i
+                break
+    if end_idx < 0:
+        return None
+
+    # Backward pass: latest start index that still contains the whole pattern
+    p_idx = len(pattern_cmp) - 1
+    start_idx = end_idx
+    for i in range(end_idx, -1, -1):
+        if text_cmp[i] == pattern_cmp[p_idx]:
+            p_idx -= 1
+            if p_idx < 0:
+                start_idx = i
+                break
+
+    score = 0
+    p_idx = 0
+    in_gap = False
+    consecutive = 0
+    first_bonus = 0
+    for i in range(start_idx, end_idx + 1):
+        prev_char = text[i - 1] if i > 0 else ' '
+        if p_idx < len(pattern_cmp) and text_cmp[i] == pattern_cmp[p_idx]:
+            bonus = _char_bonus(prev_char, text[i])
+            if consecutive > 0:
+                bonus = max(bonus, first_bonus, FUZZY_BONUS_CONSECUTIVE)
+            else:
+                first_bonus = bonus
+            if p_idx == 0:
+                bonus *= FUZZY_BONUS_FIRST_CHAR_MULTIPLIER
+            score += FUZZY_SCORE_MATCH + bonus
+            consecutive += 1
+            in_gap = False
+            p_idx += 1
+        else:
+            score += FUZZY_SCORE_GAP_EXTENSION if in_gap else FUZZY_SCORE_GAP_START
+            in_gap = True
+            consecutive = 0
+            first_bonus = 0
+    return score
+
+
+"""
+Matchers
+"""
+
+
+def compile_matcher(pattern: str, match_mode: str = MATCH_MODE_SUBSTRING) -> Matcher:
+    """Compile `pattern` once into a callable applied to every entry name during a search.
+
+    Raises ``ValueError`` for an unknown mode and ``re.error`` for an invalid regex, so the
+    caller can report a bad pattern before starting the walk.
+    """
+    if match_mode == MATCH_MODE_SUBSTRING:
+        return lambda name: 0 if pattern in name else None
+
+    if match_mode == MATCH_MODE_CASE_INSENSITIVE:
+        folded = pattern.casefold()
+        return lambda name: 0 if folded in name.casefold() else None
+
+    if match_mode == MATCH_MODE_GLOB:
+        # A glob without wildcards behaves like a substring search, as in Finder/Explorer.
+        glob = pattern if any(c in pattern for c in '*?[') else '*' + pattern + '*'
+        regex = re.compile(fnmatch.translate(glob), re.IGNORECASE)
+        return lambda name: 0 if regex.match(name) else None
+
+    if match_mode == MATCH_MODE_REGEX:
+        regex = re.compile(pattern)
+        return lambda name: 0 if regex.search(name) else None
+
+    if match_mode == MATCH_MODE_FUZZY:
+        # Smart case: an upper-case character in the pattern makes the match case-sensitive
+        case_sensitive = pattern != pattern.lower()
+        return lambda name: fuzzy_score(pattern, name, case_sensitive)
+
+    raise ValueError(f"Unknown match mode: {match_mode}")
+
+
+def parse_search(txt: str, match_mode: str = MATCH_MODE_SUBSTRING) -> SearchQuery:
+    """The query of the search text `txt` in `match_mode`: predicates are only parsed in
+    PREDICATE_MATCH_MODES (see ``search_predicates.parse_query``, which may raise
+    ``ValueError``)."""
+    if match_mode in PREDICATE_MATCH_MODES:
+        return parse_query(txt)
+    return SearchQuery(txt)
+
+
+class TopKResults:
+    """
+    Keeps the `k` best-scoring results seen so far in a bounded min-heap, so ranking a
+    stream of n results costs O(n log k) and never holds more than k of them. Among equal
+    scores the earlier result wins (it was found closer to the search root).
+    """
+    def __init__(self, k: int = 500):
+        self.k = k
+        self._heap = []
+        self._counter = itertools.count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, score: int, item) -> bool:
+        """Offer a result; returns True if it made it into the current top-k."""
+        entry = (score, -next(self._counter), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry[:2] <= self._heap[0][:2]:
+            return False
+        heapq.heapreplace(self._heap, entry)
+        return True
+
+    def best_first(self) -> list:
+        return [item for _, _, item in sorted(self._heap, reverse=True)]
+
+
+"""
+Walking
+"""
+
+# Used when the caller doesn't pass any rules: every folder is walked (once)
+_NO_PRUNING = PruneRules(patterns=[])
+
+
+# Folder priorities for the search walk (lower is explored sooner): one unit per level of
+# depth, minus bonuses for recently modified folders and for favorites (and the folders
+# leading to them)
+PRIORITY_RECENT_SECONDS = 7 * 24 * 60 * 60
+PRIORITY_RECENT_BONUS = 1.5
+PRIORITY_FAVORITE_BONUS = 2.0
+
+
+class FavoritePaths:
+    """Answers "is this folder a favorite, inside one, or on the way to one?" in O(depth)."""
+    def __init__(self, favorite_paths: Iterable[str] = ()):
+        self.favorites = set()
+        self.ancestors = set()
+        for favorite in favorite_paths:
+            favorite = os.path.normpath(favorite)
+            self.favorites.add(favorite)
+            parent = os.path.dirname(favorite)
+            while parent and parent not in self.ancestors:
+                self.ancestors.add(parent)
+                if parent == os.path.dirname(parent):
+                    break
+                parent = os.path.dirname(parent)
+
+    def __contains__(self, path: str) -> bool:
+        if not self.favorites:
+            return False
+        if path in self.ancestors:
+            return True
+        while True:
+            if path in self.favorites:
+                return True
+            parent = os.path.dirname(path)
+            if parent == path:
+                return False
+            path = parent
+
+
+def folder_priority(depth: int, mtime: float, is_favorite: bool, now: float) -> float:
+    priority = float(depth)
+    if now - mtime < PRIORITY_RECENT_SECONDS:
+        priority -= PRIORITY_RECENT_BONUS
+    if is_favorite:
+        priority -= PRIORITY_FAVORITE_BONUS
+    return priority
+
+
+def iter_matches(path: str, matcher: Optional[Matcher], query: SearchQuery = None,
+                 prune_rules: PruneRules = None, favorite_paths: Iterable[str] = (),
+                 stop_event: threading.Event = None) -> Iterator[Tuple[str, int]]:
+    """Walk `path`, yielding ``(relative_path, score)`` for every file/folder whose name
+    matches (``matcher=None`` matches every name) and which passes the `query`'s metadata
+    predicates, if any. Predicates are only evaluated for entries whose name matched, and
+    the relative path is only built for entries that passed everything. Folders excluded by
+    `prune_rules` are neither reported nor descended into.
+
+    Folders are explored best-first rather than depth-first: a priority queue ordered by
+    ``folder_priority`` (shallow, recently modified and favorite folders first; ties in
+    listing order) keeps one deep tree from holding back the obvious shallow hits.
+
+    Setting `stop_event` ends the walk at the next entry, whether or not anything matched.
+    """
+    prune_walk = (prune_rules or _NO_PRUNING).new_walk(path)
+    favorites = FavoritePaths(favorite_paths)
+    now = time.time()
+    root_prefix_len = len(os.path.join(path, ''))
+    counter = itertools.count()
+    heap = [(0.0, next(counter), path, 0)]
+    while heap:
+        if stop_event is not None and stop_event.is_set():
+            return
+        _, _, current_path, depth = heapq.heappop(heap)
+        relative_root = current_path[root_prefix_len:]
+        try:
+            with os.scandir(current_path) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        for entry in entries:
+            if stop_event is not None and stop_event.is_set():
+                return
+            try:
+                if entry.is_dir(follow_symlinks=prune_walk.rules.follow_symlinks):
+                    if prune_walk.rules.is_pruned_name(entry.name):
+                        continue
+                    if prune_walk.should_descend(entry, depth + 1):
+                        # stat() was already cached on the entry by should_descend
+                        mtime = entry.stat(follow_symlinks=prune_walk.rules.follow_symlinks).st_mtime
+                        priority = folder_priority(depth + 1, mtime, entry.path in favorites, now)
+                        heapq.heappush(heap, (priority, next(counter), entry.path, depth + 1))
+            except OSError:
+                pass
+            score = matcher(entry.name) if matcher is not None else 0
+            if score is None:
+                continue
+            if query is not None and not query.entry_passes(entry):
+                continue
+            yield (os.path.join(relative_root, entry.name) if relative_root else entry.name), score
+
+
+def iter_file_entries(path: str, prune_rules: PruneRules = None) -> Iterator[os.DirEntry]:
+    """Yield a ``DirEntry`` for every regular file under `path`, skipping folders excluded by
+    `prune_rules` (by default symlinks are not followed). Unreadable directories are skipped."""
+    prune_walk = (prune_rules or _NO_PRUNING).new_walk(path)
+    stack = [(path, 0)]
+    while stack:
+        current_path, depth = stack.pop()
+        try:
+            with os.scandir(current_path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=prune_walk.rules.follow_symlinks):
+                            if prune_walk.should_descend(entry, depth + 1):
+                                stack.append((entry.path, depth + 1))
+                        elif entry.is_file(follow_symlinks=False):
+                            yield entry
+                    except OSError:
+                        continue
+        except OSError:
+            continue
+
+
+def files_iterator(path: str, txt: str, match_mode: str = MATCH_MODE_SUBSTRING,
+                   prune_rules: PruneRules = None,
+                   stop_event: threading.Event = None) -> Iterator[str]:
+    """`txt` may mix name text with metadata predicates (see ``search_predicates``)."""
+    query = parse_search(txt, match_mode)
+    matcher = compile_matcher(query.name_text, match_mode) if query.name_text else None
+    for relative_path, _ in iter_matches(path, matcher, query if query.has_predicates else None,
+                                         prune_rules, stop_event=stop_event):
+        yield relative_path
@@ -0,0 +1,377 @@
+"""Parallel folder-size calculation with progressive (running-total) updates.
+
+Two sizes are summed: the apparent size (``st_size``, what Finder calls "size") and the
+allocated size (``st_blocks * 512``, "on disk"), which is smaller for sparse files such as
+VM images and larger for lots of tiny files. A file with several hard links is counted
+once per scan, by its (st_dev, st_ino), however many of its links the scan comes across.
+
+Kept free of Qt and pyobjc so it is unit-testable; the Qt glue is the properties window
+(``PropertiesWindowCalculateSizeInThread``).
+"""
+
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from src.utils.prune_rules import PruneRules
+
+
+PROGRESS_INTERVAL_SECONDS = 0.1
+
+# Size modes
+SIZE_MODE_APPARENT = 'apparent'
+SIZE_MODE_ALLOCATED = 'allocated'
+
+
+def allocated_size(st: os.stat_result) -> int:
+    # st_blocks is always in 512-byte units (whatever the file system's block size is);
+    # it doesn't exist on Windows, where the apparent size is the best we have
+    blocks = getattr(st, 'st_blocks', None)
+    return st.st_size if blocks is None else blocks * 512
+
+
+class SizeSnapshot:
+    """Running totals of a scan. `errors` counts the folders/items that couldn't be read
+    (mostly permission errors); `hard_links` counts the extra links of files which were
+    only counted once."""
+    __slots__ = ('bytes', 'files', 'folders', 'errors', 'finished', 'allocated_bytes',
+                 'hard_links')
+
+    def __init__(self, bytes: int = 0, files: int = 0, folders: int = 0, errors: int = 0,
+                 finished: bool = False, allocated_bytes: int = 0, hard_links: int = 0):
+        self.bytes = bytes
+        self.files = files
+        self.folders = folders
+        self.errors = errors
+        self.finished = finished
+        self.allocated_bytes = allocated_bytes
+        self.hard_links = hard_links
+
+    def copy(self) -> 'SizeSnapshot':
+        return SizeSnapshot(self.bytes, self.files, self.folders, self.errors, self.finished,
+                            self.allocated_bytes, self.hard_links)
+
+    def size(self, size_mode: str = SIZE_MODE_APPARENT) -> int:
+        return self.allocated_bytes if size_mode == SIZE_MODE_ALLOCATED else self.bytes
+
+
+class FolderSizeScan:
+    """
+    Sums the sizes of `paths` (files and/or folders) on a thread pool. Every task lists one
+    folder and hands its sub-folders to idle workers, or keeps walking them itself when
+    the pool is already busy, so a single huge subtree still gets split up. Symlinks are
+    counted by their own size and not followed (unless the prune rules say so).
+
+    With a FolderSizeCache, folders unchanged since they were last listed aren't listed
+    again. `run()` blocks until the scan is done (or cancelled), calling `on_progress` with a
+    snapshot of the totals every `progress_interval` seconds; `cancel()` and `snapshot()`
+    may be called from any thread.
+    """
+    def __init__(self, paths: list[str], prune_rules: PruneRules = None,
+                 num_workers: int = None, cache: 'FolderSizeCache' = None):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.prune_rules = prune_rules or PruneRules(patterns=[])
+        # Which sub-folders a folder has depends on its depth under a max_depth rule, so
+        # such scans aren't cached
+        self.cache = cache if self.prune_rules.max_depth is None else None
+        if self.cache is not None:
+            self.cache.use_rules(self.prune_rules)
+        self.num_workers = num_workers or min(32, (os.cpu_count() or 2) * 2)
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._all_done = threading.Condition(self._lock)
+        self._pending = 0
+        self._totals = SizeSnapshot()
+        self._seen_hard_links = set()   # (st_dev, st_ino) of the multi-link files counted
+        self._executor = None
+
+    def cancel(self):
+        self._stop_event.set()
+        with self._lock:
+            self._all_done.notify_all()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._stop_event.is_set()
+
+    def snapshot(self) -> SizeSnapshot:
+        with self._lock:
+            return self._totals.copy()
+
+    def run(self, on_progress: Optional[Callable[[SizeSnapshot], None]] = None,
+            progress_interval: float = PROGRESS_INTERVAL_SECONDS) -> SizeSnapshot:
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor:
+            self._executor = executor
+            for path in self.paths:
+                self._add_top_level_item(path)
+            next_progress = time.monotonic() + progress_interval
+            with self._lock:
+                while self._pending > 0 and not self.is_cancelled:
+                    self._all_done.wait(timeout=max(0.0, next_progress - time.monotonic()))
+                    if on_progress is not None and time.monotonic() >= next_progress:
+                        snapshot = self._totals.copy()
+                        self._lock.release()
+                        try:
+                            on_progress(snapshot)
+                        finally:
+                            self._lock.acquire()
+                        next_progress = time.monotonic() + progress_interval
+            executor.shutdown(wait=True, cancel_futures=True)
+        with self._lock:
+            self._totals.finished = not self.is_cancelled
+        snapshot = self.snapshot()
+        if on_progress is not None:
+            on_progress(snapshot)
+        return snapshot
+
+    def _add_top_level_item(self, path: str):
+        try:
+            st = os.stat(path, follow_symlinks=False)
+        except OSError:
+            with self._lock:
+                self._totals.errors += 1
+            return
+        if os.path.isdir(path) and (self.prune_rules.follow_symlinks or not os.path.islink(path)):
+            with self._lock:
+                self._totals.folders += 1
+            self._submit(self.prune_rules.new_walk(path), path, 0)
+        elif st.st_nlink > 1:
+            with self._lock:
+                self._add_hard_linked_file((st.st_dev, st.st_ino, st.st_size, allocated_size(st)))
+        else:
+            with self._lock:
+                self._totals.files += 1
+                self._totals.bytes += st.st_size
+                self._totals.allocated_bytes += allocated_size(st)
+
+    def _add_hard_linked_file(self, linked_file: tuple[int, int, int, int]):
+        # Called with the lock held
+        dev, ino, size, allocated = linked_file
+        if (dev, ino) in self._seen_hard_links:
+            self._totals.hard_links += 1
+            return
+        self._seen_hard_links.add((dev, ino))
+        self._totals.files += 1
+        self._totals.bytes += size
+        self._totals.allocated_bytes += allocated
+
+    def _submit(self, prune_walk, path: str, depth: int):
+        with self._lock:
+            self._pending += 1
+        try:
+            self._executor.submit(self._scan_subtree, prune_walk, path, depth)
+        except RuntimeError:    # The executor is shutting down (cancelled)
+            self._task_done()
+
+    def _task_done(self):
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self._all_done.notify_all()
+
+    def _scan_subtree(self, prune_walk, path: str, depth: int):
+        try:
+            stack = [(path, depth)]
+            while stack and not self.is_cancelled:
+                current_path, current_depth = stack.pop()
+                record, sub_dirs = self._get_directory_record(prune_walk, current_path,
+                                                              current_depth)
+                for name in sub_dirs:
+                    sub_dir = (os.path.join(current_path, name), current_depth + 1)
+                    # Share work with idle workers, otherwise keep it
+                    if self._pending < self.num_workers:
+                        self._submit(prune_walk, *sub_dir)
+                    else:
+                        stack.append(sub_dir)
+                with self._lock:
+                    self._totals.bytes += record.own_bytes
+                    self._totals.allocated_bytes += record.own_allocated_bytes
+                    self._totals.files += record.own_files
+                    self._totals.folders += len(sub_dirs)
+                    self._totals.errors += record.own_errors
+                    for linked_file in record.hard_linked_files:
+                        self._add_hard_linked_file(linked_file)
+        finally:
+            self._task_done()
+
+    def _get_directory_record(self, prune_walk, path: str,
+                              depth: int) -> tuple['_DirectoryRecord', list[str]]:
+        # The record of `path` and the sub-folders to walk into
+        if self.cache is None:
+            record = _list_directory(prune_walk, path, depth)
+            return record, record.sub_dirs
+        try:
+            st = os.stat(path)
+        except OSError:
+            return _DirectoryRecord(0, 0, 0, 1, [], [], 0, [], False), []
+        record = self.cache.get(st, prune_walk)
+        if record is None:
+            record = _list_directory(prune_walk, path, depth, st.st_mtime_ns)
+            # A record which left out a folder already visited (a symlink or hard-link loop,
+            # or a folder reachable twice) depends on this walk, so it isn't kept
+            if record.own_errors == 0 and not record.depends_on_walk:
+                self.cache.put(st, prune_walk, record)
+            return record, record.sub_dirs
+        # The sub-folders of a cached record weren't seen by this walk yet: they're marked
+        # visited, and skipped if this walk already went through them
+        return record, [name for name, key in zip(record.sub_dirs, record.sub_dir_keys)
+                        if prune_walk.mark_visited(key)]
+
+
+class _DirectoryRecord:
+    """What a folder holds directly: the sizes of its files and the names of the
+    sub-folders to walk into. Files with more than one hard link aren't in the own_*
+    totals but in `hard_linked_files`, as (st_dev, st_ino, size, allocated size), since
+    whether they count depends on what else the scan has seen. `sub_dir_keys` are the
+    (st_dev, st_ino) of the sub-folders; `depends_on_walk` is set when a sub-folder was left
+    out only because the walk had already visited it."""
+    __slots__ = ('mtime_ns', 'own_bytes', 'own_files', 'own_errors', 'sub_dirs',
+                 'sub_dir_keys', 'own_allocated_bytes', 'hard_linked_files', 'depends_on_walk')
+
+    def __init__(self, mtime_ns: int, own_bytes: int, own_files: int, own_errors: int,
+                 sub_dirs: list[str], sub_dir_keys: list[tuple[int, int]],
+                 own_allocated_bytes: int, hard_linked_files: list[tuple[int, int, int, int]],
+                 depends_on_walk: bool):
+        self.mtime_ns = mtime_ns
+        self.own_bytes = own_bytes
+        self.own_files = own_files
+        self.own_errors = own_errors
+        self.sub_dirs = sub_dirs
+        self.sub_dir_keys = sub_dir_keys
+        self.own_allocated_bytes = own_allocated_bytes
+        self.hard_linked_files = hard_linked_files
+        self.depends_on_walk = depends_on_walk
+
+
+def _list_directory(prune_walk, path: str, depth: int, mtime_ns: int = 0) -> _DirectoryRecord:
+    own_bytes = own_allocated_bytes = own_files = own_errors = 0
+    sub_dirs = []
+    sub_dir_keys = []
+    hard_linked_files = []
+    depends_on_walk = False
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                try:
+                    if prune_walk.should_descend(entry, depth + 1):
+                        st = entry.stat(follow_symlinks=prune_walk.rules.follow_symlinks)
+                        sub_dirs.append(entry.name)
+                        sub_dir_keys.append((st.st_dev, st.st_ino))
+                    elif entry.is_dir(follow_symlinks=prune_walk.rules.follow_symlinks):
+                        depends_on_walk = depends_on_walk or prune_walk.was_visited(entry)
+                    else:
+                        st = entry.stat(follow_symlinks=False)
+                        if st.st_nlink > 1:
+                            hard_linked_files.append((st.st_dev, st.st_ino, st.st_size,
+                                                      allocated_size(st)))
+                        else:
+                            own_files += 1
+                            own_bytes += st.st_size
+                            own_allocated_bytes += allocated_size(st)
+                except OSError:
+                    own_errors += 1
+    except OSError:
+        own_errors += 1
+    return _DirectoryRecord(mtime_ns, own_bytes, own_files, own_errors, sub_dirs, sub_dir_keys,
+                            own_allocated_bytes, hard_linked_files, depends_on_walk)
+
+
+class FolderSizeCache:
+    """
+    Per-folder records keyed by (st_dev, st_ino) and validated by the folder's mtime, so a
+    repeated size calculation only lists the folders whose entries changed (the folder's
+    mtime changes when an entry is added, removed or renamed) and sums up the rest from
+    the cache. A file rewritten in place doesn't touch its folder's mtime, so its new size
+    is only picked up once something else in that folder changes.
+
+    Records depend on the prune rules they were made with, and - when the rules stay on the
+    root's file system - on the root's device, so both are part of their key. Records which
+    depend on the folders a walk had already visited aren't kept (see FolderSizeScan). The
+    records of the MAX_RULE_SETS rule sets used last are kept; older ones are dropped by
+    forgetting their dict, never by clearing it, so a scan still using them isn't disturbed.
+    Shared by threads: lookups and inserts are single dict operations. A saved cache of
+    another `VERSION` (records of another shape) isn't loaded.
+    """
+    VERSION = 3
+    MAX_RULE_SETS = 2
+
+    def __init__(self):
+        self.version = self.VERSION
+        self.records_by_rules = {}      # Rules key -> {(st_dev, st_ino, root device): record}
+
+    def __len__(self):
+        return sum(len(records) for records in list(self.records_by_rules.values()))
+
+    @staticmethod
+    def _rules_key(prune_rules: PruneRules) -> tuple:
+        return (tuple(prune_rules.patterns), prune_rules.stay_on_filesystem,
+                prune_rules.follow_symlinks)
+
+    @staticmethod
+    def _record_key(st: os.stat_result, prune_walk) -> tuple:
+        root_dev = prune_walk.root_dev if prune_walk.rules.stay_on_filesystem else None
+        return st.st_dev, st.st_ino, root_dev
+
+    def use_rules(self, prune_rules: PruneRules):
+        """Called when a scan starts: keeps the records of `prune_rules` (which become the
+        most recently used), dropping those of the rules used longest ago."""
+        rules_key = self._rules_key(prune_rules)
+        records = self.records_by_rules.pop(rules_key, None)
+        self.records_by_rules[rules_key] = records if records is not None else {}
+        while len(self.records_by_rules) > self.MAX_RULE_SETS:
+            self.records_by_rules.pop(next(iter(self.records_by_rules)))
+
+    def get(self, st: os.stat_result, prune_walk) -> Optional[_DirectoryRecord]:
+        records = self.records_by_rules.get(self._rules_key(prune_walk.rules))
+        if records is None:
+            return None
+        record = records.get(self._record_key(st, prune_walk))
+        if record is not None and record.mtime_ns == st.st_mtime_ns:
+            return record
+        return None
+
+    def put(self, st: os.stat_result, prune_walk, record: _DirectoryRecord):
+        records = self.records_by_rules.setdefault(self._rules_key(prune_walk.rules), {})
+        records[self._record_key(st, prune_walk)] = record
+
+    def save(self, file_path: str):
+        with open(file_path, 'wb') as f:
+            pickle.dump(self, f)
+
+    @staticmethod
+    def load(file_path: str) -> 'FolderSizeCache':
+        if os.path.exists(file_path):
+            try:
+                with open(file_path, 'rb') as f:
+                    cache = pickle.load(f)
+                if getattr(cache, 'version', None) == FolderSizeCache.VERSION:
+                    return cache
+            except Exception:
+                pass
+        return FolderSizeCache()
+
+
+def nearest_first(items: list, first_visible: int, last_visible: int) -> list:
+    """Reorder `items` (one per table row) so the visible rows come first, then the rows
+    closest to them, alternating below and above."""
+    first_visible = max(0, min(first_visible, len(items)))
+    last_visible = max(first_visible - 1, min(last_visible, len(items) - 1))
+    ordered = items[first_visible:last_visible + 1]
+    below, above = last_visible + 1, first_visible - 1
+    while below < len(items) or above >= 0:
+        if below < len(items):
+            ordered.append(items[below])
+            below += 1
+        if above >= 0:
+            ordered.append(items[above])
+            above -= 1
+    return ordered
+
+
+def get_total_size_bytes(paths: list[str], prune_rules: PruneRules = None,
+                         cache: FolderSizeCache = None,
+                         size_mode: str = SIZE_MODE_APPARENT) -> int:
+    return FolderSizeScan(paths, prune_rules, cache=cache).run().size(size_mode)
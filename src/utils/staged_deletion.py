@@ -0,0 +1,294 @@
+"""Staged permanent deletes: an item is first renamed into a hidden staging folder on its own
+volume - a single rename, instant whatever the size of the tree, so the UI updates at once -
+and removed from there later by a low-priority purger. Until it's purged a staged item can
+be restored (renamed back), which is what undoing a permanent delete does.
+
+Kept free of Qt and pyobjc so it is unit-testable; the Qt glue is ``StagedPurgeThread``
+(``src/utils/file_explorer_utils.py``).
+
+Each staged item gets a token: it's moved to ``<staging folder>/<token>/<its name>``, and a
+record of where it came from is written to ``<index_dir>/<token>.json``. The records live in
+one folder, so the items left staged when the app quit are found (and purged) on the next
+launch whatever volume they're on. Restoring and purging an item both start by removing its
+record; whichever removes it first owns the item, so an undo never races a purge.
+
+A record whose volume isn't mounted (an external or network disk) is kept, and its item
+purged once the volume is back. The staging folders used are listed in the index folder
+too, and a token folder found there without a record (left by a purge cut short by a
+crash) is recorded again to be purged.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from typing import Optional
+
+from src.utils.deletion_engine import DeletionEngine
+from src.utils.io_scheduler import mount_point_of
+
+
+STAGING_DIR_NAME = '.cleanfinder_staged_deletes'
+RECORD_EXTENSION = '.json'
+# In the index folder: the staging folders used, one per line
+STAGING_DIRS_FILE_NAME = 'staging_dirs.txt'
+TOKEN_LENGTH = 32
+# Staged items are kept (restorable) this long before they're purged
+PURGE_DELAY_SECONDS = 5 * 60
+# Threads removing a purged tree: few, so a purge doesn't compete with interactive work
+PURGE_WORKERS = 2
+# Items staged on volumes which aren't mounted are looked for again this often
+PENDING_RECHECK_SECONDS = 10 * 60
+# A record is written just before its token folder is made: a younger one without its
+# folder may be mid-staging, so it's kept
+RECORD_GRACE_SECONDS = 60
+
+
+class StagedItem:
+    __slots__ = ('token', 'original_path', 'staged_path', 'staged_at', 'volume')
+
+    def __init__(self, token: str, original_path: str, staged_path: str, staged_at: float,
+                 volume: str = None):
+        self.token = token
+        self.original_path = original_path      # Empty for a token folder found without a record
+        self.staged_path = staged_path
+        self.staged_at = staged_at
+        self.volume = volume        # Mount point of the staging folder
+
+    @property
+    def staging_dir(self) -> str:
+        return os.path.dirname(self.token_dir)
+
+    @property
+    def token_dir(self) -> str:
+        return os.path.dirname(self.staged_path)
+
+
+def lower_io_priority():
+    """Best effort: make the current thread's disk I/O (and CPU) yield to the rest of the
+    system."""
+    try:
+        if sys.platform == 'darwin':
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c'))
+            # setiopolicy_np(IOPOL_TYPE_DISK, IOPOL_SCOPE_THREAD, IOPOL_THROTTLE)
+            libc.setiopolicy_np(0, 1, 3)
+        elif hasattr(os, 'setpriority'):
+            # On Linux this is per thread; the disk scheduler derives the I/O priority of a
+            # thread without one from its nice value
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (OSError, AttributeError):
+        pass
+
+
+class StagedDeletions:
+    def __init__(self, index_dir: str, staging_dir: str = None):
+        self.index_dir = index_dir
+        # One fixed staging folder; by default there is one per volume (see staging_dir_for)
+        self.staging_dir = staging_dir
+        self._known_staging_dirs = None
+        # Token folders found without a record by the last pending()
+        self._unrecorded_tokens = set()
+
+    def _record_path(self, token: str) -> str:
+        return os.path.join(self.index_dir, token + RECORD_EXTENSION)
+
+    @staticmethod
+    def staging_dir_for(path: str) -> Optional[str]:
+        """A staging folder on the volume of `path` (created if needed): at the root of the
+        volume, else in the home folder, else next to `path`. None if none can be made. A
+        candidate is only created in a folder on that volume which can be written to."""
+        parent = os.path.dirname(os.path.abspath(path))
+        candidates = [os.path.join(mount_point_of(parent), STAGING_DIR_NAME),
+                      os.path.join(os.path.expanduser('~'), STAGING_DIR_NAME),
+                      os.path.join(parent, STAGING_DIR_NAME)]
+        try:
+            device = os.stat(parent).st_dev
+        except OSError:
+            return None
+        for candidate in candidates:
+            try:
+                if not os.path.isdir(candidate):
+                    candidate_parent = os.path.dirname(candidate)
+                    if os.stat(candidate_parent).st_dev != device or \
+                            not os.access(candidate_parent, os.W_OK):
+                        continue
+                    os.mkdir(candidate)
+                if os.stat(candidate).st_dev == device and os.access(candidate, os.W_OK):
+                    return candidate
+            except OSError:
+                continue
+        return None
+
+    def _staging_dirs_file_path(self) -> str:
+        return os.path.join(self.index_dir, STAGING_DIRS_FILE_NAME)
+
+    def known_staging_dirs(self) -> list[str]:
+        """The staging folders items were ever staged in (mounted or not)."""
+        if self._known_staging_dirs is None:
+            try:
+                with open(self._staging_dirs_file_path()) as f:
+                    self._known_staging_dirs = [line.rstrip('\n') for line in f if line.strip()]
+            except OSError:
+                self._known_staging_dirs = []
+        return self._known_staging_dirs
+
+    def _remember_staging_dir(self, staging_dir: str):
+        if staging_dir in self.known_staging_dirs():
+            return
+        self._known_staging_dirs.append(staging_dir)
+        with open(self._staging_dirs_file_path(), 'a') as f:
+            f.write(staging_dir + '\n')
+
+    def stage(self, paths: list[str]) -> tuple[list[StagedItem], list[tuple[str, str]]]:
+        """Move `paths` into staging; returns the items staged and a (path, error message)
+        pair for each path which couldn't be."""
+        os.makedirs(self.index_dir, exist_ok=True)
+        staged, errors = [], []
+        staging_dirs = {}   # Parent folder -> its staging folder
+        for path in paths:
+            parent = os.path.dirname(os.path.abspath(path))
+            if parent not in staging_dirs:
+                staging_dirs[parent] = self.staging_dir if self.staging_dir is not None \
+                    else self.staging_dir_for(path)
+            if staging_dirs[parent] is None:
+                errors.append((path, "No staging folder on this volume"))
+                continue
+            token = uuid.uuid4().hex
+            item = StagedItem(token, os.path.abspath(path),
+                              os.path.join(staging_dirs[parent], token, os.path.basename(path)),
+                              time.time(), mount_point_of(staging_dirs[parent]))
+            try:
+                self._remember_staging_dir(staging_dirs[parent])
+                # Recorded first: a token folder without a record is taken for a leftover
+                self._write_record(item)
+                os.mkdir(item.token_dir)
+                os.rename(path, item.staged_path)
+            except OSError as e:
+                errors.append((path, e.strerror or str(e)))
+                self._remove_record(item.token)
+                _remove_empty_dir(item.token_dir)
+                continue
+            staged.append(item)
+        return staged, errors
+
+    def _write_record(self, item: StagedItem):
+        with open(self._record_path(item.token), 'w') as f:
+            json.dump({'original_path': item.original_path, 'staged_path': item.staged_path,
+                       'staged_at': item.staged_at, 'volume': item.volume}, f)
+
+    def _remove_record(self, token: str) -> bool:
+        # Claims the item: True for the one caller which removed the record
+        try:
+            os.remove(self._record_path(token))
+            return True
+        except OSError:
+            return False
+
+    def restore(self, item: StagedItem) -> bool:
+        """Move a staged item back where it was. False if it was purged (or is being purged),
+        or its name was taken in the meantime."""
+        if os.path.lexists(item.original_path) or not self._remove_record(item.token):
+            return False
+        try:
+            os.rename(item.staged_path, item.original_path)
+        except OSError:
+            self._write_record(item)    # Still staged, and still to be purged
+            return False
+        _remove_empty_dir(item.token_dir)
+        return True
+
+    def purge(self, item: StagedItem, engine: DeletionEngine = None) -> bool:
+        """Remove a staged item for good. False if it was restored meanwhile (or is being
+        purged by another caller), or the purge was cancelled or failed - the item is then
+        recorded again, to be purged later."""
+        if not self._remove_record(item.token):
+            return False
+        if engine is None:
+            engine = DeletionEngine(num_workers=PURGE_WORKERS, worker_initializer=lower_io_priority)
+        if os.path.lexists(item.token_dir) and engine.delete_items([item.token_dir]) != [1]:
+            self._write_record(item)
+            return False
+        return True
+
+    def pending(self) -> list[StagedItem]:
+        """Items staged and not purged yet (by this or an earlier run), oldest first.
+        Records of items which are gone are dropped; those on a volume which isn't mounted
+        are kept, and their items returned once it is. Token folders found without a
+        record by two calls in a row are recorded again, as items to purge at once."""
+        try:
+            names = [name for name in os.listdir(self.index_dir) if name.endswith(RECORD_EXTENSION)]
+        except OSError:
+            return []
+        items = []
+        for name in names:
+            token = name[:-len(RECORD_EXTENSION)]
+            try:
+                with open(os.path.join(self.index_dir, name)) as f:
+                    record = json.load(f)
+                item = StagedItem(token, record['original_path'], record['staged_path'],
+                                  record['staged_at'], record.get('volume'))
+            except (OSError, ValueError, KeyError, TypeError):
+                self._remove_record(token)
+                continue
+            if os.path.lexists(item.token_dir):
+                items.append(item)
+            elif not _is_volume_missing(item) and item.staged_at < time.time() - RECORD_GRACE_SECONDS:
+                self._remove_record(token)
+        items.extend(self._unrecorded_items({name[:-len(RECORD_EXTENSION)] for name in names}))
+        items.sort(key=lambda item: item.staged_at)
+        return items
+
+    def _unrecorded_items(self, recorded_tokens: set[str]) -> list[StagedItem]:
+        # A token folder is recorded before it's made and its record removed only while it
+        # is being restored or purged - so one seen without a record twice, a pending() call
+        # apart, was left by a purge which didn't finish
+        staging_dirs = set(self.known_staging_dirs())
+        if self.staging_dir is not None:
+            staging_dirs.add(self.staging_dir)
+        unrecorded = {}
+        for staging_dir in staging_dirs:
+            try:
+                names = os.listdir(staging_dir)
+            except OSError:
+                continue
+            for token in names:
+                if len(token) == TOKEN_LENGTH and token not in recorded_tokens and \
+                        os.path.isdir(os.path.join(staging_dir, token)):
+                    unrecorded[token] = staging_dir
+        items = []
+        for token, staging_dir in unrecorded.items():
+            if token not in self._unrecorded_tokens:
+                continue
+            token_dir = os.path.join(staging_dir, token)
+            try:
+                names = os.listdir(token_dir)
+            except OSError:
+                continue
+            # It can't be restored, so it's purged without waiting
+            item = StagedItem(token, '', os.path.join(token_dir, names[0] if names else token), 0.0,
+                              mount_point_of(staging_dir))
+            try:
+                self._write_record(item)
+            except OSError:
+                continue
+            items.append(item)
+        self._unrecorded_tokens = set(unrecorded) - {item.token for item in items}
+        return items
+
+
+def _is_volume_missing(item: StagedItem) -> bool:
+    # Its staging folder is gone: either along with the volume (not mounted), or for good
+    if os.path.isdir(item.staging_dir):
+        return False
+    return item.volume is None or not os.path.ismount(item.volume)
+
+
+def _remove_empty_dir(path: str):
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
@@ -0,0 +1,56 @@
+"""Token bucket capping the bandwidth of a paste job, shared by the threads copying its files.
+
+Kept free of Qt and pyobjc so it is unit-testable; used by ``CopyEngine``
+(``src/utils/copy_engine.py``).
+
+Bytes are taken from the bucket once they were moved, and the bucket may go into debt by a
+chunk: the thread which took them then waits until the debt is repaid at `rate`. The bucket
+never holds more than BURST_SECONDS worth of `rate`, so the average rate over any window is
+within BURST_SECONDS / window of `rate` - well under 1% over a minute.
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+
+BURST_SECONDS = 0.25
+
+
+class TokenBucket:
+    def __init__(self, rate: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._tokens = 0.0
+        self._updated_at = clock()
+
+    @property
+    def rate(self) -> Optional[float]:
+        """Bytes per second; None for no limit."""
+        return self._rate
+
+    @rate.setter
+    def rate(self, rate: Optional[float]):
+        with self._lock:
+            self._refill()
+            self._rate = rate if rate else None
+            if self._rate is not None:
+                self._tokens = min(self._tokens, self._rate * BURST_SECONDS)
+
+    def _refill(self):
+        # Called with the lock held
+        now = self._clock()
+        if self._rate is not None:
+            self._tokens = min(self._rate * BURST_SECONDS,
+                               self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    def take(self, num_bytes: int) -> float:
+        """Take `num_bytes` just moved; returns the seconds to wait before moving more."""
+        if self._rate is None:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._tokens -= num_bytes
+            return -self._tokens / self._rate if self._tokens < 0 else 0.0
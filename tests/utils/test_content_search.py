@@ -0,0 +1,68 @@
+import unittest
+import os
+import tempfile
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils import content_search
+
+
+def _write(path, data: bytes):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+class TestSearchFile(unittest.TestCase):
+
+    def test_returns_line_numbers_and_previews(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'notes.txt')
+            _write(path, b'first line\n  the Needle is here  \nlast\n')
+            pattern = content_search.compile_content_pattern('needle')
+            n_bytes, previews = content_search.search_file(path, pattern)
+            self.assertEqual(n_bytes, os.path.getsize(path))
+            self.assertEqual(previews, [(2, 'the Needle is here')])
+
+    def test_binary_files_are_skipped(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'blob.bin')
+            _write(path, b'needle\0needle')
+            pattern = content_search.compile_content_pattern('needle')
+            self.assertEqual(content_search.search_file(path, pattern)[1], [])
+
+    def test_large_files_are_memory_mapped(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, 'big.log')
+            _write(path, b'x' * (content_search.MMAP_THRESHOLD_BYTES + 10) + b'\nneedle\n')
+            pattern = content_search.compile_content_pattern('needle')
+            n_bytes, previews = content_search.search_file(path, pattern)
+            self.assertEqual(n_bytes, os.path.getsize(path))
+            self.assertEqual(previews, [(2, 'needle')])
+
+
+class TestContentSearch(unittest.TestCase):
+
+    def test_finds_matching_files_and_skips_oversized_ones(self):
+        with tempfile.TemporaryDirectory() as d:
+            os.makedirs(os.path.join(d, 'sub'))
+            _write(os.path.join(d, 'a.txt'), b'needle\n')
+            _write(os.path.join(d, 'sub', 'b.txt'), b'hay\nneedle\n')
+            _write(os.path.join(d, 'c.txt'), b'hay\n')
+            _write(os.path.join(d, 'big.txt'), b'needle' * 100)
+            search = content_search.ContentSearch(d, 'needle', max_file_size=100, num_workers=1)
+            results = dict(search.run())
+            self.assertEqual(sorted(results),
+                             [os.path.join(d, 'a.txt'), os.path.join(d, 'sub', 'b.txt')])
+            self.assertEqual(results[os.path.join(d, 'sub', 'b.txt')], [(2, 'needle')])
+            self.assertEqual(search.files_scanned, 3)
+
+    def test_cancelled_search_yields_nothing(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'a.txt'), b'needle\n')
+            search = content_search.ContentSearch(d, 'needle', num_workers=1)
+            search.cancel()
+            self.assertEqual(list(search.run()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,367 @@
+import unittest
+import errno
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils import copy_engine
+from src.utils.copy_engine import (CopyEngine, CopyProgress, measure_item, format_duration,
+                                   COPY_METHOD_BUFFERED, COPY_METHOD_RENAME, VERIFY_SHA256,
+                                   VERIFY_XXHASH, verify_algorithm_used)
+from src.utils.copy_journal import CopyJournal
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _make_tree(d):
+    _write(os.path.join(d, 'src', 'a.bin'), os.urandom(3000))
+    _write(os.path.join(d, 'src', 'sub', 'b.bin'), os.urandom(5000))
+    _write(os.path.join(d, 'src', 'sub', 'deeper', 'c.txt'), b'hello')
+    os.symlink('a.bin', os.path.join(d, 'src', 'link'))
+
+
+class FlakyCopyEngine(CopyEngine):
+    """Appends a stray byte to the first `num_corrupt` files it copies."""
+    def __init__(self, num_corrupt, **kwargs):
+        super().__init__(**kwargs)
+        self.num_corrupt = num_corrupt
+
+    def _copy_buffered(self, f_src, f_dest, hasher=None):
+        super()._copy_buffered(f_src, f_dest, hasher)
+        if self.num_corrupt > 0:
+            self.num_corrupt -= 1
+            f_dest.write(b'!')
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class TestCopyEngine(unittest.TestCase):
+
+    def test_measure(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            self.assertEqual(measure_item(os.path.join(d, 'src')), (8005, 4))
+            self.assertEqual(measure_item(os.path.join(d, 'src', 'a.bin')), (3000, 1))
+
+    def test_copies_tree_in_small_chunks(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            snapshots = []
+            engine = CopyEngine(on_progress=snapshots.append, progress_interval=0, buffer_size=1024,
+                                fast_copy=False)
+            engine.start()
+            self.assertEqual(engine.copy_item(os.path.join(d, 'src'), os.path.join(d, 'dest')), 1)
+            engine.finish()
+            for relative_path in ['a.bin', os.path.join('sub', 'b.bin'), os.path.join('sub', 'deeper', 'c.txt')]:
+                self.assertEqual(_read(os.path.join(d, 'dest', relative_path)),
+                                 _read(os.path.join(d, 'src', relative_path)))
+            self.assertEqual(os.readlink(os.path.join(d, 'dest', 'link')), 'a.bin')
+            self.assertEqual(int(os.stat(os.path.join(d, 'dest', 'a.bin')).st_mtime),
+                             int(os.stat(os.path.join(d, 'src', 'a.bin')).st_mtime))
+            last = snapshots[-1]
+            self.assertTrue(last.finished)
+            self.assertEqual((last.bytes_done, last.bytes_total), (8005, 8005))
+            self.assertEqual((last.files_done, last.files_total), (4, 4))
+            # Reported while the files were being copied, not only per item
+            self.assertTrue(any(0 < s.bytes_done < 8005 for s in snapshots))
+            self.assertEqual(engine.methods_used, {COPY_METHOD_BUFFERED: 3})
+
+    def test_fast_copy_gives_identical_files(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            _write(os.path.join(d, 'src', 'big.bin'), os.urandom(3 * 1024 ** 2 + 17))
+            engine = CopyEngine()
+            engine.start()
+            self.assertEqual(engine.copy_item(os.path.join(d, 'src'), os.path.join(d, 'dest')), 1)
+            for name in ['a.bin', 'big.bin']:
+                self.assertEqual(_read(os.path.join(d, 'dest', name)), _read(os.path.join(d, 'src', name)))
+            self.assertEqual(engine.progress.bytes_done, engine.progress.bytes_total)
+            self.assertTrue(engine.methods_used)
+
+    def test_falls_back_when_kernel_copy_is_unsupported(self):
+        def unsupported(*args):
+            raise OSError(errno.EXDEV, "Cross-device link")
+
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'a.bin'), os.urandom(5000))
+            saved = copy_engine._copy_file_range_chunk, copy_engine._sendfile_chunk
+            copy_engine._copy_file_range_chunk = copy_engine._sendfile_chunk = unsupported
+            try:
+                engine = CopyEngine()
+                self.assertEqual(engine.copy_item(os.path.join(d, 'a.bin'), os.path.join(d, 'b.bin')), 1)
+            finally:
+                copy_engine._copy_file_range_chunk, copy_engine._sendfile_chunk = saved
+            self.assertEqual(_read(os.path.join(d, 'b.bin')), _read(os.path.join(d, 'a.bin')))
+            self.assertIn(list(engine.methods_used), [[COPY_METHOD_BUFFERED], ['clone']])
+
+    def test_cancel_removes_partial_file(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'big.bin'), os.urandom(10000))
+            engine = CopyEngine(progress_interval=0, buffer_size=1000, fast_copy=False)
+            engine.on_progress = lambda progress: progress.bytes_done >= 3000 and engine.cancel()
+            engine.start()
+            self.assertEqual(engine.copy_item(os.path.join(d, 'big.bin'), os.path.join(d, 'copy.bin')), 0)
+            self.assertTrue(engine.is_cancelled)
+            self.assertFalse(os.path.exists(os.path.join(d, 'copy.bin')))
+
+    def test_move_within_a_volume_is_a_rename(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            os.mkdir(os.path.join(d, 'target'))
+            inode = os.stat(os.path.join(d, 'src', 'a.bin')).st_ino
+            engine = CopyEngine()
+            engine.start()
+            self.assertTrue(engine.rename_item(os.path.join(d, 'src'), os.path.join(d, 'target', 'src')))
+            self.assertEqual((engine.progress.bytes_total, engine.progress.files_total), (0, 1))
+            self.assertFalse(os.path.exists(os.path.join(d, 'src')))
+            self.assertEqual(os.stat(os.path.join(d, 'target', 'src', 'a.bin')).st_ino, inode)
+            self.assertEqual(engine.methods_used, {COPY_METHOD_RENAME: 1})
+
+    def test_rename_never_overwrites(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'a.bin'), b'a')
+            _write(os.path.join(d, 'b.bin'), b'b')
+            self.assertFalse(CopyEngine().rename_item(os.path.join(d, 'a.bin'), os.path.join(d, 'b.bin')))
+            self.assertEqual(_read(os.path.join(d, 'b.bin')), b'b')
+
+    def test_verify_copy(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            engine = CopyEngine()
+            engine.copy_item(os.path.join(d, 'src'), os.path.join(d, 'dest'))
+            self.assertTrue(engine.verify_copy(os.path.join(d, 'src'), os.path.join(d, 'dest')))
+            os.remove(os.path.join(d, 'dest', 'sub', 'b.bin'))
+            self.assertFalse(engine.verify_copy(os.path.join(d, 'src'), os.path.join(d, 'dest')))
+            self.assertFalse(engine.verify_copy(os.path.join(d, 'src'), os.path.join(d, 'nope')))
+
+    def test_copies_many_items_in_parallel(self):
+        with tempfile.TemporaryDirectory() as d:
+            for i in range(40):
+                _write(os.path.join(d, 'src', f'dir{i % 4}', f'file{i}'), os.urandom(100 + i))
+            _write(os.path.join(d, 'single.bin'), b'single')
+            os.mkdir(os.path.join(d, 'src', 'empty'))
+            pairs = [(os.path.join(d, 'src'), os.path.join(d, 'dest')),
+                     (os.path.join(d, 'single.bin'), os.path.join(d, 'single copy.bin')),
+                     (os.path.join(d, 'nope'), os.path.join(d, 'nope copy'))]
+            engine = CopyEngine(num_workers=4, fast_copy=False)
+            engine.start()
+            self.assertEqual(engine.copy_items(pairs), [1, 1, -1])
+            for i in range(40):
+                relative_path = os.path.join(f'dir{i % 4}', f'file{i}')
+                self.assertEqual(_read(os.path.join(d, 'dest', relative_path)),
+                                 _read(os.path.join(d, 'src', relative_path)))
+            self.assertTrue(os.path.isdir(os.path.join(d, 'dest', 'empty')))
+            self.assertEqual(int(os.stat(os.path.join(d, 'dest', 'dir1')).st_mtime),
+                             int(os.stat(os.path.join(d, 'src', 'dir1')).st_mtime))
+            self.assertEqual((engine.progress.files_done, engine.progress.files_total), (41, 41))
+            self.assertEqual(engine.methods_used, {COPY_METHOD_BUFFERED: 41})
+
+    def test_cancel_removes_incomplete_folders(self):
+        with tempfile.TemporaryDirectory() as d:
+            for i in range(20):
+                _write(os.path.join(d, 'src', f'file{i}'), os.urandom(2000))
+            engine = CopyEngine(progress_interval=0, buffer_size=500, fast_copy=False, num_workers=4)
+            engine.on_progress = lambda progress: progress.bytes_done >= 5000 and engine.cancel()
+            engine.start()
+            self.assertEqual(engine.copy_items([(os.path.join(d, 'src'), os.path.join(d, 'dest'))]), [0])
+            self.assertFalse(os.path.exists(os.path.join(d, 'dest')))
+
+    def test_verified_copy(self):
+        for algorithm in [VERIFY_XXHASH, VERIFY_SHA256]:
+            with tempfile.TemporaryDirectory() as d:
+                _make_tree(d)
+                engine = CopyEngine(verify=algorithm)
+                engine.start()
+                self.assertEqual(engine.copy_item(os.path.join(d, 'src'), os.path.join(d, 'dest')), 1)
+                self.assertEqual(_read(os.path.join(d, 'dest', 'sub', 'b.bin')),
+                                 _read(os.path.join(d, 'src', 'sub', 'b.bin')))
+                self.assertEqual(engine.methods_used, {COPY_METHOD_BUFFERED: 3})
+                self.assertEqual(engine.verify_failures, [])
+                self.assertGreater(engine.verify_seconds, 0)
+
+    def test_verify_algorithm_used(self):
+        self.assertEqual(verify_algorithm_used(VERIFY_SHA256), VERIFY_SHA256)
+        with mock.patch.object(copy_engine, 'xxhash', None):
+            self.assertEqual(verify_algorithm_used(VERIFY_XXHASH), VERIFY_SHA256)
+            self.assertEqual(copy_engine.new_hasher(VERIFY_XXHASH).name, 'sha256')
+
+    def test_mismatching_copy_is_retried(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'a.bin'), os.urandom(5000))
+            engine = FlakyCopyEngine(1, verify=VERIFY_SHA256)
+            engine.start()
+            self.assertEqual(engine.copy_item(os.path.join(d, 'a.bin'), os.path.join(d, 'b.bin')), 1)
+            self.assertEqual(_read(os.path.join(d, 'b.bin')), _read(os.path.join(d, 'a.bin')))
+            self.assertEqual(engine.verify_failures, [os.path.join(d, 'a.bin')])
+            self.assertEqual(engine.progress.bytes_done, 5000)
+
+    def test_copy_that_never_matches_fails(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'src', 'a.bin'), os.urandom(5000))
+            engine = FlakyCopyEngine(10, verify=VERIFY_SHA256)
+            self.assertEqual(engine.copy_item(os.path.join(d, 'src'), os.path.join(d, 'dest')), -1)
+            self.assertFalse(os.path.exists(os.path.join(d, 'dest')))
+
+    def test_checkpoint_then_resume(self):
+        with tempfile.TemporaryDirectory() as d:
+            for i in range(3):
+                _write(os.path.join(d, 'src', f'file{i}'), os.urandom(10000))
+            pairs = [(os.path.join(d, 'src'), os.path.join(d, 'dest'))]
+            journal = CopyJournal.create(os.path.join(d, 'journals'), pairs, d, False)
+            engine = CopyEngine(progress_interval=0, buffer_size=1000, fast_copy=False, num_workers=1)
+            engine.on_progress = lambda progress: progress.bytes_done >= 15000 and engine.checkpoint()
+            engine.journal = journal
+            engine.start()
+            self.assertEqual(engine.copy_items(pairs), [0])
+            self.assertTrue(engine.is_checkpointed)
+            journal.close()
+            # What was copied is kept, the file being copied under its temporary name
+            self.assertTrue(os.path.isdir(os.path.join(d, 'dest')))
+
+            journal = CopyJournal.load(journal.path)
+            self.assertEqual(len(journal.completed_files), 1)
+            self.assertEqual(list(journal.partial_offsets.values()), [5000])
+            engine = CopyEngine(fast_copy=False, num_workers=1)
+            engine.journal = journal
+            engine.start()
+            self.assertEqual(engine.copy_items(pairs), [1])
+            for i in range(3):
+                self.assertEqual(_read(os.path.join(d, 'dest', f'file{i}')),
+                                 _read(os.path.join(d, 'src', f'file{i}')))
+            self.assertEqual(sorted(os.listdir(os.path.join(d, 'dest'))), ['file0', 'file1', 'file2'])
+            self.assertEqual(engine.progress.bytes_done, 30000)
+
+    def test_destination_appearing_in_a_new_job_is_left_alone(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            _write(os.path.join(d, 'single.bin'), b'new')
+            # Made by someone else after the paste was planned
+            _write(os.path.join(d, 'dest', 'sub', 'b.bin'), b'theirs')
+            _write(os.path.join(d, 'single copy.bin'), b'theirs')
+            pairs = [(os.path.join(d, 'src'), os.path.join(d, 'dest')),
+                     (os.path.join(d, 'single.bin'), os.path.join(d, 'single copy.bin'))]
+            engine = CopyEngine(fast_copy=False)
+            engine.journal = CopyJournal.create(os.path.join(d, 'journals'), pairs, d, False)
+            engine.start()
+            self.assertEqual(engine.copy_items(pairs), [-1, -1])
+            self.assertEqual(os.listdir(os.path.join(d, 'dest')), ['sub'])
+            self.assertEqual(_read(os.path.join(d, 'dest', 'sub', 'b.bin')), b'theirs')
+            self.assertEqual(_read(os.path.join(d, 'single copy.bin')), b'theirs')
+
+    def test_source_changed_since_checkpoint_is_copied_again(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'src', 'big.bin'), os.urandom(10000))
+            pairs = [(os.path.join(d, 'src'), os.path.join(d, 'dest'))]
+            journal = CopyJournal.create(os.path.join(d, 'journals'), pairs, d, False)
+            engine = CopyEngine(progress_interval=0, buffer_size=1000, fast_copy=False, num_workers=1)
+            engine.on_progress = lambda progress: progress.bytes_done >= 5000 and engine.checkpoint()
+            engine.journal = journal
+            engine.start()
+            self.assertEqual(engine.copy_items(pairs), [0])
+            journal.close()
+
+            # Rewritten, and grown, before the paste is resumed
+            _write(os.path.join(d, 'src', 'big.bin'), os.urandom(12000))
+            journal = CopyJournal.load(journal.path)
+            engine = CopyEngine(fast_copy=False, num_workers=1)
+            engine.journal = journal
+            engine.start()
+            self.assertEqual(engine.copy_items(pairs), [1])
+            self.assertEqual(_read(os.path.join(d, 'dest', 'big.bin')),
+                             _read(os.path.join(d, 'src', 'big.bin')))
+
+    def test_pause_and_resume_mid_file(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'big.bin'), os.urandom(10000))
+            engine = CopyEngine(progress_interval=0, buffer_size=1000, fast_copy=False)
+            paused_at = []
+
+            def on_progress(progress):
+                if progress.bytes_done >= 3000 and not paused_at:
+                    paused_at.append(progress.bytes_done)
+                    engine.pause()
+                    threading.Timer(0.2, engine.resume).start()
+
+            engine.on_progress = on_progress
+            engine.start()
+            self.assertEqual(engine.copy_item(os.path.join(d, 'big.bin'), os.path.join(d, 'copy.bin')), 1)
+            self.assertEqual(_read(os.path.join(d, 'copy.bin')), _read(os.path.join(d, 'big.bin')))
+            self.assertEqual(paused_at, [3000])
+            self.assertGreaterEqual(engine.progress.paused_seconds, 0.15)
+            self.assertFalse(engine.is_paused)
+
+    def test_cancel_while_paused(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'big.bin'), os.urandom(10000))
+            engine = CopyEngine(progress_interval=0, buffer_size=1000, fast_copy=False)
+
+            def on_progress(progress):
+                if progress.bytes_done >= 3000 and not engine.is_paused and not engine.is_cancelled:
+                    engine.pause()
+                    threading.Timer(0.1, engine.cancel).start()
+
+            engine.on_progress = on_progress
+            engine.start()
+            self.assertEqual(engine.copy_item(os.path.join(d, 'big.bin'), os.path.join(d, 'copy.bin')), 0)
+            self.assertFalse(os.path.exists(os.path.join(d, 'copy.bin')))
+
+    def test_bandwidth_limit(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'a.bin'), os.urandom(400 * 1024))
+            engine = CopyEngine(fast_copy=False)
+            engine.bandwidth_limit = 2 * 1024 ** 2
+            engine.start()
+            started = time.monotonic()
+            self.assertEqual(engine.copy_item(os.path.join(d, 'a.bin'), os.path.join(d, 'b.bin')), 1)
+            self.assertAlmostEqual(time.monotonic() - started, 0.2, delta=0.1)
+            self.assertEqual(_read(os.path.join(d, 'b.bin')), _read(os.path.join(d, 'a.bin')))
+
+    def test_missing_source_is_an_error(self):
+        with tempfile.TemporaryDirectory() as d:
+            self.assertEqual(CopyEngine().copy_item(os.path.join(d, 'nope'), os.path.join(d, 'x')), -1)
+
+    @unittest.skipUnless(hasattr(os, 'mkfifo'), "needs FIFOs")
+    def test_special_files_are_never_opened(self):
+        with tempfile.TemporaryDirectory() as d:
+            os.makedirs(os.path.join(d, 'src'))
+            _write(os.path.join(d, 'src', 'a.bin'), b'abc')
+            os.mkfifo(os.path.join(d, 'src', 'pipe'))
+            engine = CopyEngine()
+            # Opening the FIFO would block forever
+            self.assertEqual(engine.copy_item(os.path.join(d, 'src'), os.path.join(d, 'dest')), 1)
+            self.assertEqual(os.listdir(os.path.join(d, 'dest')), ['a.bin'])
+            self.assertEqual(engine.skipped_files, [os.path.join(d, 'src', 'pipe')])
+            engine.fast_copy = False
+            self.assertEqual(engine.copy_item(os.path.join(d, 'src', 'pipe'), os.path.join(d, 'p')), -1)
+            self.assertFalse(os.path.lexists(os.path.join(d, 'p')))
+
+
+class TestCopyProgress(unittest.TestCase):
+
+    def test_rate_and_eta(self):
+        progress = CopyProgress(bytes_done=100, bytes_total=300)
+        progress.started_at -= 10
+        self.assertAlmostEqual(progress.bytes_per_second, 10, places=1)
+        self.assertAlmostEqual(progress.eta_seconds, 20, places=0)
+        self.assertAlmostEqual(progress.fraction_done, 1 / 3)
+        self.assertIsNone(CopyProgress().eta_seconds)
+
+    def test_format_duration(self):
+        self.assertEqual(format_duration(None), '--:--')
+        self.assertEqual(format_duration(75), '01:15')
+        self.assertEqual(format_duration(3725), '1:02:05')
+
+
+if __name__ == '__main__':
+    unittest.main()
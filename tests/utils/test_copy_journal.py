@@ -0,0 +1,101 @@
+import unittest
+import os
+import tempfile
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils.copy_journal import CopyJournal, partial_path, pending_journals
+
+
+class TestCopyJournal(unittest.TestCase):
+
+    def test_records_are_reloaded(self):
+        with tempfile.TemporaryDirectory() as d:
+            journal = CopyJournal.create(d, [('/a/x', '/b/x'), ('/a/y', '/b/y')], '/b', True)
+            journal.file_completed('/b/x')
+            journal.item_completed(0)
+            journal.checkpoint_partial('/b/y', 1234, os.stat(d))
+            journal.close()
+            loaded = CopyJournal.load(journal.path)
+            self.assertEqual(loaded.pairs, [('/a/x', '/b/x'), ('/a/y', '/b/y')])
+            self.assertEqual((loaded.dest_path, loaded.delete_source_after_paste), ('/b', True))
+            self.assertEqual(loaded.completed_files, {'/b/x'})
+            self.assertEqual(loaded.completed_items, {0})
+            self.assertEqual(loaded.partial_offsets, {'/b/y': 1234})
+            self.assertEqual(loaded.partial_sources, {'/b/y': (os.stat(d).st_size, os.stat(d).st_mtime_ns)})
+
+    def test_torn_last_line_is_ignored(self):
+        with tempfile.TemporaryDirectory() as d:
+            journal = CopyJournal.create(d, [('/a/x', '/b/x')], '/b', False)
+            journal.file_completed('/b/x')
+            journal.close()
+            with open(journal.path, 'a') as f:
+                f.write('{"type": "item", "ind')
+            loaded = CopyJournal.load(journal.path)
+            self.assertEqual((loaded.completed_files, loaded.completed_items), ({'/b/x'}, set()))
+
+    def test_resume_offset_never_exceeds_partial_file(self):
+        with tempfile.TemporaryDirectory() as d:
+            dest = os.path.join(d, 'big.bin')
+            src_st = os.stat(d)
+            journal = CopyJournal(os.path.join(d, 'j.jsonl'))
+            journal.checkpoint_partial(dest, 5000, src_st)
+            self.assertEqual(journal.resume_offset(dest, src_st), 0)
+            with open(partial_path(dest), 'wb') as f:
+                f.write(b'x' * 3000)
+            self.assertEqual(journal.resume_offset(dest, src_st), 3000)
+            self.assertEqual(os.path.basename(partial_path(dest)), '.big.bin.cfpartial')
+
+    def test_changed_source_starts_over(self):
+        with tempfile.TemporaryDirectory() as d:
+            src, dest = os.path.join(d, 'src.bin'), os.path.join(d, 'big.bin')
+            with open(src, 'wb') as f:
+                f.write(b'x' * 5000)
+            with open(partial_path(dest), 'wb') as f:
+                f.write(b'x' * 3000)
+            journal = CopyJournal.create(os.path.join(d, 'journals'), [(src, dest)], d, False)
+            journal.checkpoint_partial(dest, 3000, os.stat(src))
+            journal.close()
+            journal = CopyJournal.load(journal.path)
+            self.assertEqual(journal.resume_offset(dest, os.stat(src)), 3000)
+            # Nor is a partial file resumed when its journal doesn't say what its source was
+            sources = dict(journal.partial_sources)
+            journal.partial_sources.clear()
+            self.assertEqual(journal.resume_offset(dest, os.stat(src)), 0)
+            journal.partial_sources.update(sources)
+            with open(src, 'ab') as f:
+                f.write(b'y')
+            self.assertEqual(journal.resume_offset(dest, os.stat(src)), 0)
+
+    def test_pending_journals(self):
+        with tempfile.TemporaryDirectory() as d:
+            first = CopyJournal.create(d, [('/a/x', '/b/x')], '/b', False)
+            second = CopyJournal.create(d, [('/a/y', '/b/y')], '/b', False)
+            first.close()
+            second.close()
+            with open(os.path.join(d, 'broken.jsonl'), 'w') as f:
+                f.write('not json\n')
+            self.assertEqual([j.path for j in pending_journals(d)], [first.path, second.path])
+            self.assertFalse(os.path.exists(os.path.join(d, 'broken.jsonl')))
+            second.remove()
+            self.assertEqual([j.path for j in pending_journals(d)], [first.path])
+            self.assertEqual(pending_journals(os.path.join(d, 'nope')), [])
+
+    def test_discard_removes_unfinished_items(self):
+        with tempfile.TemporaryDirectory() as d:
+            done, unfinished = os.path.join(d, 'done'), os.path.join(d, 'unfinished')
+            os.makedirs(unfinished)
+            open(done, 'w').close()
+            open(partial_path(os.path.join(unfinished, 'f')), 'w').close()
+            journal = CopyJournal.create(os.path.join(d, 'journals'),
+                                         [('/a/done', done), ('/a/unfinished', unfinished)], d, False)
+            journal.item_completed(0)
+            journal.checkpoint_partial(os.path.join(unfinished, 'f'), 0, os.stat(d))
+            journal.discard()
+            self.assertTrue(os.path.exists(done))
+            self.assertFalse(os.path.exists(unfinished))
+            self.assertFalse(os.path.exists(journal.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import unittest
+import os
+import tempfile
+from unittest import mock
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils.deletion_engine import DeletionEngine, DeletionProgress
+
+
+def _make_tree(root, num_folders=5, depth=3, num_files=4):
+    # Returns the number of entries below `root`
+    os.makedirs(root)
+    num_entries = 0
+    for i in range(num_files):
+        open(os.path.join(root, f'file{i}'), 'w').close()
+        num_entries += 1
+    if depth > 0:
+        for i in range(num_folders):
+            num_entries += 1 + _make_tree(os.path.join(root, f'dir{i}'), num_folders, depth - 1, num_files)
+    return num_entries
+
+
+class FakeTrash:
+    """Moves paths into a folder; fails on names in `failing_names`."""
+    def __init__(self, trash_dir, failing_names=()):
+        self.trash_dir = trash_dir
+        self.failing_names = set(failing_names)
+        self.calls = []
+
+    def __call__(self, paths):
+        self.calls.append(paths)
+        for path in paths if isinstance(paths, list) else [paths]:
+            if os.path.basename(path) in self.failing_names:
+                raise PermissionError(13, "Permission denied")
+            os.rename(path, os.path.join(self.trash_dir, os.path.basename(path)))
+
+
+class TestDeletionEngine(unittest.TestCase):
+
+    def test_deletes_trees_in_parallel(self):
+        with tempfile.TemporaryDirectory() as d:
+            num_entries = _make_tree(os.path.join(d, 'tree')) + 1
+            os.symlink(os.path.join(d, 'tree'), os.path.join(d, 'link'))
+            open(os.path.join(d, 'file'), 'w').close()
+            snapshots = []
+            engine = DeletionEngine(on_progress=snapshots.append, progress_interval=0, num_workers=4)
+            paths = [os.path.join(d, name) for name in ['tree', 'link', 'file']]
+            self.assertEqual(engine.delete_items(paths), [1, 1, 1])
+            self.assertEqual(os.listdir(d), [])
+            last = snapshots[-1]
+            self.assertTrue(last.finished)
+            self.assertEqual((last.items_done, last.items_left), (3, 0))
+            self.assertEqual(last.entries_removed, num_entries + 2)
+            self.assertEqual(engine.errors, [])
+
+    def test_errors_are_collected_per_item(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(os.path.join(d, 'locked'), num_folders=2, depth=1)
+            _make_tree(os.path.join(d, 'fine'), num_folders=2, depth=1)
+            locked_dir = os.path.join(d, 'locked', 'dir1')
+            unlink = os.unlink
+
+            def failing_unlink(path, *args, **kwargs):
+                if os.path.dirname(path) == locked_dir:
+                    raise PermissionError(13, "Permission denied")
+                return unlink(path, *args, **kwargs)
+
+            engine = DeletionEngine()
+            paths = [os.path.join(d, name) for name in ['missing', 'locked', 'fine']]
+            with mock.patch('os.unlink', failing_unlink):
+                self.assertEqual(engine.delete_items(paths), [-1, -1, 1])
+            self.assertEqual(engine.progress.num_errors, len(engine.errors))
+            self.assertEqual({path for path, _ in engine.errors} - {paths[0]},
+                             {os.path.join(locked_dir, f'file{i}') for i in range(4)})
+            self.assertEqual(engine.errors[-1][1], "Permission denied")
+            # Everything else is removed
+            self.assertEqual(os.listdir(os.path.join(d, 'locked')), ['dir1'])
+            self.assertFalse(os.path.exists(os.path.join(d, 'fine')))
+
+    def test_cancel(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(os.path.join(d, 'tree'))
+            engine = DeletionEngine(progress_interval=0, num_workers=2)
+            engine.on_progress = lambda progress: progress.entries_removed > 20 and engine.cancel()
+            self.assertEqual(engine.delete_items([os.path.join(d, 'tree')]), [0])
+            self.assertTrue(os.path.isdir(os.path.join(d, 'tree')))
+
+    def test_trash_in_batches(self):
+        with tempfile.TemporaryDirectory() as d:
+            os.mkdir(os.path.join(d, 'trash'))
+            paths = []
+            for i in range(10):
+                paths.append(os.path.join(d, f'file{i}'))
+                open(paths[-1], 'w').close()
+            trash = FakeTrash(os.path.join(d, 'trash'), failing_names=['file6'])
+            engine = DeletionEngine(trash_batch_size=4, trash=trash)
+            results = engine.trash_items(paths + [os.path.join(d, 'missing')])
+            self.assertEqual(results, [1] * 6 + [-1] + [1] * 3 + [-1])
+            self.assertEqual(len(os.listdir(os.path.join(d, 'trash'))), 9)
+            self.assertEqual([path for path, _ in engine.errors],
+                             [paths[6], os.path.join(d, 'missing')])
+            # Two batches went through whole; the one with the failing file was retried
+            # one by one
+            self.assertEqual(sum(isinstance(call, list) for call in trash.calls), 3)
+            self.assertEqual((engine.progress.items_done, engine.progress.entries_removed), (11, 9))
+
+    def test_progress_rate(self):
+        progress = DeletionProgress(items_done=1, items_total=4, entries_removed=100)
+        progress.started_at -= 2
+        self.assertEqual(progress.items_left, 3)
+        self.assertAlmostEqual(progress.entries_per_second, 50, delta=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
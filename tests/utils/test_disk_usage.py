@@ -0,0 +1,131 @@
+import unittest
+import os
+import tempfile
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils.disk_usage import DiskUsageScan, LARGEST_FILES_PER_DIR, squarify
+from src.utils.prune_rules import PruneRules
+
+
+def _write(path, num_bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * num_bytes)
+
+
+def _make_tree(d):
+    _write(os.path.join(d, 'big', 'movie.mov'), 5000)
+    _write(os.path.join(d, 'big', 'deeper', 'disk.img'), 3000)
+    _write(os.path.join(d, 'small', 'note.txt'), 10)
+    _write(os.path.join(d, 'top.bin'), 700)
+
+
+class TestDiskUsageScan(unittest.TestCase):
+
+    def test_totals_roll_up(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            scan = DiskUsageScan(d, num_workers=3)
+            root = scan.run()
+            self.assertTrue(scan.finished)
+            self.assertEqual((root.total_bytes, root.total_files), (8710, 4))
+            self.assertEqual(scan.snapshot().folders, 3)
+            big = [node for _, _, node in root.entries() if node is not None and node.name == 'big'][0]
+            self.assertEqual((big.total_bytes, big.own_bytes), (8000, 5000))
+            self.assertEqual(big.path, os.path.join(os.path.abspath(d), 'big'))
+
+    def test_entries_are_sorted_largest_first(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            root = DiskUsageScan(d).run()
+            self.assertEqual([(size, name) for size, name, _ in root.entries()],
+                             [(8000, 'big'), (700, 'top.bin'), (10, 'small')])
+
+    def test_files_beyond_the_largest_are_summed_up(self):
+        with tempfile.TemporaryDirectory() as d:
+            for i in range(LARGEST_FILES_PER_DIR + 4):
+                _write(os.path.join(d, f'file{i}'), i + 1)
+            root = DiskUsageScan(d).run()
+            entries = root.entries()
+            self.assertEqual(len(entries), LARGEST_FILES_PER_DIR + 1)
+            self.assertEqual(entries[0][:2], (LARGEST_FILES_PER_DIR + 4, f'file{LARGEST_FILES_PER_DIR + 3}'))
+            self.assertIn((1 + 2 + 3 + 4, '(4 other files)', None), entries)
+
+    def test_largest_files_below(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            root = DiskUsageScan(d).run()
+            self.assertEqual(root.largest_files_below(2),
+                             [(5000, os.path.join('big', 'movie.mov')),
+                              (3000, os.path.join('big', 'deeper', 'disk.img'))])
+
+    def test_largest_files_below_match_every_file_of_the_subtree(self):
+        with tempfile.TemporaryDirectory() as d:
+            sizes = {}
+            for i in range(60):
+                path = os.path.join(f'd{i % 3}', f'e{i % 5}', f'f{i}.bin')
+                sizes[path] = (i * 37) % 101 + 1
+                _write(os.path.join(d, path), sizes[path])
+            scan = DiskUsageScan(d, num_workers=4)
+            root = scan.run()
+            expected = sorted(((size, path) for path, size in sizes.items()), reverse=True)
+            self.assertEqual([size for size, _ in scan.largest_files_below(root, 10)],
+                             [size for size, _ in expected[:10]])
+            for size, path in scan.largest_files_below(root, 10):
+                self.assertEqual(sizes[path], size)
+            d1 = [node for _, _, node in root.entries() if node is not None and node.name == 'd1'][0]
+            expected = sorted(((size, os.path.relpath(path, 'd1')) for path, size in sizes.items()
+                               if path.startswith('d1' + os.sep)), reverse=True)
+            self.assertEqual([size for size, _ in d1.largest_files_below(5)],
+                             [size for size, _ in expected[:5]])
+
+    def test_hard_links_are_counted_once(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            os.link(os.path.join(d, 'big', 'movie.mov'), os.path.join(d, 'small', 'movie.mov'))
+            root = DiskUsageScan(d).run()
+            self.assertEqual((root.total_bytes, root.total_files), (8710, 4))
+
+    def test_pruned_folders_are_left_out(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            root = DiskUsageScan(d, PruneRules(patterns=['big'])).run()
+            self.assertEqual(root.total_bytes, 710)
+
+
+class TestSquarify(unittest.TestCase):
+
+    def test_areas_are_proportional_and_inside(self):
+        sizes = [600, 300, 200, 100, 50, 25, 25]
+        rects = squarify(sizes, 10, 20, 300, 200)
+        total_area = 300 * 200
+        for size, (x, y, w, h) in zip(sizes, rects):
+            self.assertAlmostEqual(w * h, total_area * size / sum(sizes), places=6)
+            self.assertGreaterEqual(x, 10 - 1e-9)
+            self.assertGreaterEqual(y, 20 - 1e-9)
+            self.assertLessEqual(x + w, 310 + 1e-6)
+            self.assertLessEqual(y + h, 220 + 1e-6)
+
+    def test_rectangles_do_not_overlap(self):
+        rects = squarify([6, 6, 4, 3, 2, 2, 1], 0, 0, 6, 4)
+        for i, (x1, y1, w1, h1) in enumerate(rects):
+            for x2, y2, w2, h2 in rects[i + 1:]:
+                overlap_w = min(x1 + w1, x2 + w2) - max(x1, x2)
+                overlap_h = min(y1 + h1, y2 + h2) - max(y1, y2)
+                self.assertFalse(overlap_w > 1e-9 and overlap_h > 1e-9)
+
+    def test_aspect_ratios_stay_reasonable(self):
+        rects = squarify([1] * 16, 0, 0, 400, 400)
+        for _, _, w, h in rects:
+            self.assertLess(max(w / h, h / w), 2.01)
+
+    def test_zero_sizes_and_empty_input(self):
+        self.assertEqual(squarify([], 0, 0, 10, 10), [])
+        rects = squarify([5, 0], 0, 0, 10, 10)
+        self.assertEqual(rects[0], (0, 0, 10, 10))
+        self.assertEqual(rects[1][2:], (0.0, 0.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
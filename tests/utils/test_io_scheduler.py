@@ -0,0 +1,77 @@
+import unittest
+import os
+import tempfile
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils.io_scheduler import IOScheduler, device_of
+
+
+class FakeDevices:
+    """Maps the first folder of a fake path ('/hdd/...', '/ssd1/...') to a device."""
+    DEVICES = {'hdd': 1, 'ssd1': 2, 'ssd2': 3}
+
+    def device_of(self, path):
+        return self.DEVICES[path.strip('/').split('/')[0]]
+
+    def is_rotational(self, path):
+        return path.startswith('/hdd')
+
+
+class TestIOScheduler(unittest.TestCase):
+
+    def setUp(self):
+        fake = FakeDevices()
+        self.scheduler = IOScheduler(ssd_limit=2, rotational_limit=1,
+                                     is_rotational=fake.is_rotational, get_device=fake.device_of)
+
+    def _start_runnable(self):
+        runnable = self.scheduler.runnable_jobs()
+        for job_id in runnable:
+            self.scheduler.start(job_id)
+        return runnable
+
+    def test_rotational_device_runs_one_job_at_a_time(self):
+        self.scheduler.add('a', ['/ssd1/x', '/hdd/dest'])
+        self.scheduler.add('b', ['/ssd2/y', '/hdd/dest'])
+        self.assertEqual(self._start_runnable(), ['a'])
+        self.assertEqual(self.scheduler.queue_position('b'), 1)
+        self.scheduler.finish('a')
+        self.assertEqual(self._start_runnable(), ['b'])
+
+    def test_jobs_on_different_devices_run_in_parallel(self):
+        self.scheduler.add('a', ['/hdd/x', '/hdd/dest'])
+        self.scheduler.add('b', ['/ssd1/y', '/ssd1/dest'])
+        self.scheduler.add('c', ['/ssd2/y', '/ssd1/dest'])
+        self.scheduler.add('d', ['/ssd1/z', '/ssd1/dest'])
+        self.assertEqual(self._start_runnable(), ['a', 'b', 'c'])
+        self.assertEqual(self.scheduler.queue_position('d'), 1)
+
+    def test_later_jobs_do_not_overtake_on_a_shared_device(self):
+        self.scheduler.add('a', ['/hdd/x', '/ssd1/dest'])
+        self._start_runnable()
+        self.scheduler.add('b', ['/hdd/y', '/ssd2/dest'])
+        # 'c' only needs ssd2, which 'b' is waiting for
+        self.scheduler.add('c', ['/ssd2/z', '/ssd2/dest'])
+        self.scheduler.add('d', ['/ssd1/z', '/ssd1/dest'])
+        self.assertEqual(self._start_runnable(), ['d'])
+        self.assertEqual((self.scheduler.queue_position('b'), self.scheduler.queue_position('c')), (1, 2))
+
+    def test_eta(self):
+        self.scheduler.add('a', ['/hdd/x', '/hdd/dest'])
+        self.scheduler.add('b', ['/hdd/y', '/hdd/dest'])
+        self._start_runnable()
+        self.assertIsNone(self.scheduler.eta_seconds('b'))
+        self.scheduler.update('a', 100, 1100, 50.0)
+        self.assertAlmostEqual(self.scheduler.eta_seconds('a'), 20)
+        self.assertAlmostEqual(self.scheduler.eta_seconds('b'), 20)
+        self.scheduler.finish('a')
+        self.assertIsNone(self.scheduler.queue_position('a'))
+
+    def test_device_of_missing_path_is_its_parent(self):
+        with tempfile.TemporaryDirectory() as d:
+            self.assertEqual(device_of(os.path.join(d, 'nope', 'deeper')), os.stat(d).st_dev)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+import os
+import tempfile
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils.name_allocator import UniqueNameAllocator
+
+
+class TestUniqueNameAllocator(unittest.TestCase):
+
+    def test_first_copy_is_numbered_2(self):
+        allocator = UniqueNameAllocator(['a.txt', 'b.txt'])
+        self.assertEqual(allocator.allocate('a.txt'), 'a 2.txt')
+        self.assertEqual(allocator.allocate('c.txt'), 'c.txt')
+
+    def test_continues_after_the_highest_number(self):
+        allocator = UniqueNameAllocator(['a.txt', 'a 2.txt', 'A 7.txt', 'a 9.pdf'])
+        self.assertEqual(allocator.allocate('a.txt'), 'a 8.txt')
+
+    def test_batch_gets_distinct_names(self):
+        names = [f'file{i}.jpg' for i in range(2000)]
+        allocator = UniqueNameAllocator(names)
+        allocated = [allocator.allocate(name) for name in names]
+        self.assertEqual(len(set(allocated) | set(names)), 4000)
+        self.assertEqual(allocated[0], 'file0 2.jpg')
+        # As increment_max_item_name: 'file1999' reads as 'file1' numbered 999
+        self.assertEqual(allocated[1], 'file1 1000.jpg')
+        self.assertEqual(allocator.allocate('file0.jpg'), 'file0 3.jpg')
+
+    def test_names_ending_in_digits_and_folders(self):
+        allocator = UniqueNameAllocator(['v2', 'v2 3', 'v23', 'photos'])
+        self.assertEqual(allocator.allocate('v2'), 'v2 4')
+        self.assertEqual(allocator.allocate('photos'), 'photos 2')
+
+    def test_for_directory(self):
+        with tempfile.TemporaryDirectory() as d:
+            open(os.path.join(d, 'a.txt'), 'w').close()
+            self.assertEqual(UniqueNameAllocator.for_directory(d).allocate('a.txt'), 'a 2.txt')
+            self.assertEqual(UniqueNameAllocator.for_directory(os.path.join(d, 'nope')).allocate('a.txt'),
+                             'a.txt')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import unittest
+import os
+import tempfile
+import threading
+from unittest import mock
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils.copy_engine import CopyEngine
+from src.utils.paste_planner import plan_paste, FREE_SPACE_MARGIN_BYTES, LISTING_MAX_AGE_SECONDS
+
+
+def _write(path, num_bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(b'x' * num_bytes)
+
+
+class TestPastePlanner(unittest.TestCase):
+
+    def test_totals(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'src', 'photos', 'a.jpg'), 100)
+            _write(os.path.join(d, 'src', 'photos', 'trip', 'b.jpg'), 200)
+            _write(os.path.join(d, 'src', 'notes.txt'), 7)
+            os.mkdir(os.path.join(d, 'dest'))
+            plan = plan_paste([os.path.join(d, 'src', 'photos'), os.path.join(d, 'src', 'notes.txt')],
+                              os.path.join(d, 'dest'))
+            self.assertEqual((plan.bytes_total, plan.files_total), (307, 3))
+            self.assertEqual(plan.conflicting_names, [])
+            self.assertEqual(plan.bytes_for([os.path.join(d, 'src', 'notes.txt')]), 7)
+            self.assertTrue(plan.has_enough_space)
+
+    def test_conflicts_at_every_level(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'src', 'photos', 'a.jpg'), 1)
+            _write(os.path.join(d, 'src', 'photos', 'new.jpg'), 1)
+            _write(os.path.join(d, 'src', 'photos', 'trip', 'b.jpg'), 1)
+            _write(os.path.join(d, 'src', 'photos', 'clash', 'c.jpg'), 1)
+            _write(os.path.join(d, 'dest', 'photos', 'a.jpg'), 1)
+            _write(os.path.join(d, 'dest', 'photos', 'trip', 'b.jpg'), 1)
+            _write(os.path.join(d, 'dest', 'photos', 'clash'), 1)     # A file where src has a folder
+            plan = plan_paste([os.path.join(d, 'src', 'photos')], os.path.join(d, 'dest'))
+            self.assertEqual(plan.conflicting_names, ['photos'])
+            self.assertEqual(plan.nested_conflicts_of('photos'),
+                             ['a.jpg', 'clash', os.path.join('trip', 'b.jpg')])
+
+    def test_free_space(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'src', 'big.bin'), 1000)
+            os.mkdir(os.path.join(d, 'dest'))
+            plan = plan_paste([os.path.join(d, 'src', 'big.bin')], os.path.join(d, 'dest'))
+            plan.free_bytes = FREE_SPACE_MARGIN_BYTES + 999
+            self.assertFalse(plan.has_enough_space)
+            # Moving within the volume is a rename: no space needed
+            plan = plan_paste([os.path.join(d, 'src', 'big.bin')], os.path.join(d, 'dest'),
+                              delete_source_after_paste=True)
+            plan.free_bytes = 0
+            self.assertTrue(plan.has_enough_space)
+
+    def test_missing_source(self):
+        with tempfile.TemporaryDirectory() as d:
+            plan = plan_paste([os.path.join(d, 'nope')], d)
+            self.assertEqual((plan.bytes_total, plan.items[0].errors), (0, 1))
+
+    def test_copy_reuses_the_planned_walk(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'src', 'photos', 'a.jpg'), 100)
+            _write(os.path.join(d, 'src', 'photos', 'trip', 'b.jpg'), 200)
+            os.mkdir(os.path.join(d, 'src', 'photos', 'empty'))
+            os.symlink('a.jpg', os.path.join(d, 'src', 'photos', 'link'))
+            os.mkdir(os.path.join(d, 'dest'))
+            src = os.path.join(d, 'src', 'photos')
+            plan = plan_paste([src], os.path.join(d, 'dest'))
+            self.assertEqual(set(plan.listings()), {src})
+            engine = CopyEngine(fast_copy=False)
+            engine.start()
+            # Pasted under another name (as when keeping both), without walking the source again
+            with mock.patch('os.scandir', side_effect=AssertionError("walked again")):
+                results = engine.copy_items([(src, os.path.join(d, 'dest', 'photos 2'))],
+                                            plan.listings())
+            self.assertEqual(results, [1])
+            self.assertEqual((engine.progress.files_total, engine.progress.bytes_total), (3, 300))
+            self.assertTrue(os.path.isdir(os.path.join(d, 'dest', 'photos 2', 'empty')))
+            self.assertEqual(os.readlink(os.path.join(d, 'dest', 'photos 2', 'link')), 'a.jpg')
+            with open(os.path.join(d, 'dest', 'photos 2', 'trip', 'b.jpg'), 'rb') as f:
+                self.assertEqual(len(f.read()), 200)
+
+    def test_listings_of_changed_or_old_plans_are_dropped(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'src', 'photos', 'trip', 'a.jpg'), 1)
+            _write(os.path.join(d, 'src', 'notes', 'b.txt'), 1)
+            photos, notes = os.path.join(d, 'src', 'photos'), os.path.join(d, 'src', 'notes')
+            plan = plan_paste([photos, notes], os.path.join(d, 'dest'))
+            self.assertEqual(set(plan.listings()), {photos, notes})
+            # Added to a folder below the item: that item is walked again by the copy
+            _write(os.path.join(photos, 'trip', 'new.jpg'), 1)
+            os.utime(os.path.join(photos, 'trip'), ns=(1, 1))
+            self.assertEqual(set(plan.listings()), {notes})
+            plan.planned_at -= LISTING_MAX_AGE_SECONDS + 1
+            self.assertEqual(plan.listings(), {})
+
+    def test_clones_need_no_space(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'src', 'big.bin'), 1000)
+            os.mkdir(os.path.join(d, 'dest'))
+            with mock.patch('src.utils.paste_planner.can_clone', return_value=True):
+                plan = plan_paste([os.path.join(d, 'src', 'big.bin')], os.path.join(d, 'dest'))
+                self.assertEqual(plan.required_bytes, 0)
+                # A verified copy goes through the buffer: it's never a clone
+                plan = plan_paste([os.path.join(d, 'src', 'big.bin')], os.path.join(d, 'dest'),
+                                  verify='sha256')
+                self.assertEqual(plan.required_bytes, 1000)
+
+    def test_cancelled_planning(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'src', 'photos', 'a.jpg'), 1)
+            stop_event = threading.Event()
+            stop_event.set()
+            self.assertIsNone(plan_paste([os.path.join(d, 'src', 'photos')], d,
+                                         stop_event=stop_event))
+
+    def test_progress(self):
+        with tempfile.TemporaryDirectory() as d:
+            _write(os.path.join(d, 'src', 'photos', 'a.jpg'), 10)
+            reports = []
+            plan_paste([os.path.join(d, 'src', 'photos')], d,
+                       on_progress=lambda files, num_bytes: reports.append((files, num_bytes)))
+            self.assertEqual(reports, [(1, 10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+import os
+import tempfile
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils import search_utils
+from src.utils.prune_rules import PruneRules
+
+
+def _make_tree(d):
+    os.makedirs(os.path.join(d, 'src', 'deep'))
+    os.makedirs(os.path.join(d, '.git', 'objects'))
+    os.makedirs(os.path.join(d, 'node_modules', 'pkg'))
+    for path in ['src/a.py', 'src/deep/b.py', '.git/objects/c.py', 'node_modules/pkg/d.py']:
+        open(os.path.join(d, path), 'w').close()
+
+
+class TestPruneRules(unittest.TestCase):
+
+    def test_default_patterns_skip_subtrees(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            self.assertEqual(sorted(search_utils.files_iterator(d, '.py', prune_rules=PruneRules())),
+                             [os.path.join('src', 'a.py'), os.path.join('src', 'deep', 'b.py')])
+
+    def test_max_depth(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            rules = PruneRules(max_depth=2)
+            self.assertEqual(sorted(search_utils.files_iterator(d, '.py', prune_rules=rules)),
+                             [os.path.join('src', 'a.py')])
+
+    def test_symlink_loops_are_entered_once(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            os.symlink(d, os.path.join(d, 'src', 'loop'))
+            rules = PruneRules(follow_symlinks=True)
+            self.assertEqual(sorted(search_utils.files_iterator(d, 'a.py', prune_rules=rules)),
+                             [os.path.join('src', 'a.py')])
+
+    def test_walk_leaves_out_pruned_folders(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            walked = {root[len(d):]: (sorted(dirs), files) for root, dirs, files in PruneRules().walk(d)}
+            self.assertEqual(walked[''], (['src'], []))
+            self.assertEqual(sorted(walked), ['', '/src', '/src/deep'])
+
+
+if __name__ == '__main__':
+    unittest.main()
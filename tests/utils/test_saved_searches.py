@@ -0,0 +1,73 @@
+import unittest
+import os
+import tempfile
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils import saved_searches
+
+
+def _touch(path, data=b''):
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+class TestSavedSearch(unittest.TestCase):
+
+    def test_refresh_only_lists_changed_directories(self):
+        with tempfile.TemporaryDirectory() as d:
+            for folder in ['a', 'b', 'c']:
+                os.makedirs(os.path.join(d, folder))
+                _touch(os.path.join(d, folder, 'report.txt'))
+            search = saved_searches.SavedSearch('reports', d, 'report')
+            self.assertEqual(sorted(search.refresh()),
+                             [os.path.join(x, 'report.txt') for x in ['a', 'b', 'c']])
+            self.assertEqual(search.dirs_listed, 4)
+
+            _touch(os.path.join(d, 'b', 'report_2.txt'))
+            os.remove(os.path.join(d, 'c', 'report.txt'))
+            os.utime(os.path.join(d, 'b'), ns=(0, 10 ** 18))
+            os.utime(os.path.join(d, 'c'), ns=(0, 10 ** 18))
+            self.assertEqual(sorted(search.refresh()),
+                             [os.path.join('a', 'report.txt'), os.path.join('b', 'report.txt'),
+                              os.path.join('b', 'report_2.txt')])
+            self.assertEqual((search.dirs_listed, search.dirs_reused), (2, 2))
+
+    def test_watches_every_directory_walked(self):
+        with tempfile.TemporaryDirectory() as d:
+            os.makedirs(os.path.join(d, 'a', 'deep'))
+            os.makedirs(os.path.join(d, 'b'))
+            _touch(os.path.join(d, 'a', 'report.txt'))
+            search = saved_searches.SavedSearch('reports', d, 'report')
+            search.refresh()
+            # 'b' and 'a/deep' hold no results, but a new match there must be noticed
+            self.assertEqual(sorted(search.watched_directories()),
+                             sorted([d, os.path.join(d, 'a'), os.path.join(d, 'a', 'deep'),
+                                     os.path.join(d, 'b')]))
+
+    def test_stat_predicates_are_rechecked_on_cached_matches(self):
+        with tempfile.TemporaryDirectory() as d:
+            _touch(os.path.join(d, 'clip.mov'), b'x' * 10)
+            search = saved_searches.SavedSearch('big clips', d, 'ext = mov size > 1 KB')
+            self.assertEqual(search.refresh(), [])
+            mtime_ns = os.stat(d).st_mtime_ns
+            _touch(os.path.join(d, 'clip.mov'), b'x' * 2048)
+            os.utime(d, ns=(mtime_ns, mtime_ns))
+            self.assertEqual(search.refresh(), ['clip.mov'])
+            self.assertEqual(search.dirs_reused, 1)
+
+    def test_round_trip_through_file(self):
+        with tempfile.TemporaryDirectory() as d, tempfile.TemporaryDirectory() as results_dir:
+            _touch(os.path.join(d, 'notes.txt'))
+            search = saved_searches.SavedSearch('notes', d, 'notes')
+            search.refresh()
+            file_path = os.path.join(results_dir, 'saved_searches')
+            saved_searches.save_saved_searches(file_path, {search.name: search})
+            loaded = saved_searches.load_saved_searches(file_path)['notes']
+            self.assertEqual(loaded.results, ['notes.txt'])
+            self.assertEqual(loaded.refresh(), ['notes.txt'])
+            self.assertEqual(loaded.dirs_listed, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
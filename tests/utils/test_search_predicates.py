@@ -0,0 +1,103 @@
+import unittest
+import os
+import tempfile
+import time
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils import search_predicates, search_utils
+
+
+def _entries(path):
+    with os.scandir(path) as it:
+        return {entry.name: entry for entry in it}
+
+
+class TestParseQuery(unittest.TestCase):
+
+    def test_name_text_is_what_remains(self):
+        query = search_predicates.parse_query('report size > 1 GB and ext in {pdf, .DOCX}')
+        self.assertEqual(query.name_text, 'report')
+        self.assertEqual(len(query.stat_predicates), 1)
+        self.assertEqual(len(query.name_predicates), 1)
+
+    def test_plain_text_has_no_predicates(self):
+        query = search_predicates.parse_query('annual report')
+        self.assertEqual(query.name_text, 'annual report')
+        self.assertFalse(query.has_predicates)
+
+    def test_unknown_unit_raises(self):
+        with self.assertRaises(ValueError):
+            search_predicates.parse_query('size > 3 parsecs')
+
+    def test_invalid_date_raises(self):
+        with self.assertRaises(ValueError):
+            search_predicates.parse_query('modified before 2024-13-45')
+
+
+class TestEntryPasses(unittest.TestCase):
+
+    def test_size_extension_and_mtime(self):
+        with tempfile.TemporaryDirectory() as d:
+            with open(os.path.join(d, 'big.mp4'), 'wb') as f:
+                f.write(b'x' * 2048)
+            with open(os.path.join(d, 'small.mp4'), 'wb') as f:
+                f.write(b'x')
+            with open(os.path.join(d, 'big.txt'), 'wb') as f:
+                f.write(b'x' * 2048)
+            os.mkdir(os.path.join(d, 'folder.mp4'))
+            old = time.time() - 10 * 24 * 60 * 60
+            os.utime(os.path.join(d, 'small.mp4'), (old, old))
+            entries = _entries(d)
+
+            query = search_predicates.parse_query('ext in {mp4, mov} size >= 1 KB')
+            self.assertEqual(sorted(n for n, e in entries.items() if query.entry_passes(e)),
+                             ['big.mp4'])
+
+            # A folder has no extension
+            query = search_predicates.parse_query('modified in the last 3 days ext = mp4')
+            self.assertEqual(sorted(n for n, e in entries.items() if query.entry_passes(e)),
+                             ['big.mp4'])
+
+            query = search_predicates.parse_query('type = folder')
+            self.assertEqual([n for n, e in entries.items() if query.entry_passes(e)],
+                             ['folder.mp4'])
+
+    def test_stat_is_skipped_when_name_predicate_fails(self):
+        class Entry:
+            name = 'notes.txt'
+
+            def is_dir(self, follow_symlinks=True):
+                return False
+
+            def stat(self, follow_symlinks=True):
+                raise AssertionError("stat() should not be called")
+
+        query = search_predicates.parse_query('ext = mp4 size > 1 MB')
+        self.assertFalse(query.entry_passes(Entry()))
+
+
+class TestFilesIteratorWithPredicates(unittest.TestCase):
+
+    def test_predicates_combine_with_name_text(self):
+        with tempfile.TemporaryDirectory() as d:
+            os.makedirs(os.path.join(d, 'sub'))
+            with open(os.path.join(d, 'sub', 'clip_a.mov'), 'wb') as f:
+                f.write(b'x' * 10)
+            open(os.path.join(d, 'clip_b.txt'), 'w').close()
+            self.assertEqual(list(search_utils.files_iterator(d, 'clip ext in {mov}')),
+                             [os.path.join('sub', 'clip_a.mov')])
+
+    def test_regex_and_glob_text_is_not_split(self):
+        with tempfile.TemporaryDirectory() as d:
+            open(os.path.join(d, 'size=1.txt'), 'w').close()
+            open(os.path.join(d, 'ext=mp4'), 'w').close()
+            self.assertEqual(list(search_utils.files_iterator(d, r'^size=\d', 'regex')),
+                             ['size=1.txt'])
+            self.assertEqual(list(search_utils.files_iterator(d, 'ext=mp4', 'glob')), ['ext=mp4'])
+            self.assertFalse(search_utils.parse_search('size > 1 KB', 'regex').has_predicates)
+            self.assertTrue(search_utils.parse_search('size > 1 KB', 'fuzzy').has_predicates)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import unittest
+import os
+import re
+import tempfile
+import threading
+import time
+from unittest import mock
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils import search_utils
+
+
+class TestCompileMatcher(unittest.TestCase):
+
+    def test_substring_is_case_sensitive(self):
+        matcher = search_utils.compile_matcher('Rep', search_utils.MATCH_MODE_SUBSTRING)
+        self.assertEqual(matcher('Report.txt'), 0)
+        self.assertIsNone(matcher('report.txt'))
+
+    def test_case_insensitive(self):
+        matcher = search_utils.compile_matcher('REP', search_utils.MATCH_MODE_CASE_INSENSITIVE)
+        self.assertEqual(matcher('report.txt'), 0)
+
+    def test_glob_with_wildcards_matches_whole_name(self):
+        matcher = search_utils.compile_matcher('*.txt', search_utils.MATCH_MODE_GLOB)
+        self.assertEqual(matcher('notes.TXT'), 0)
+        self.assertIsNone(matcher('notes.txt.bak'))
+
+    def test_glob_without_wildcards_behaves_like_substring(self):
+        matcher = search_utils.compile_matcher('note', search_utils.MATCH_MODE_GLOB)
+        self.assertEqual(matcher('my_notes.txt'), 0)
+
+    def test_regex(self):
+        matcher = search_utils.compile_matcher(r'^IMG_\d+\.jpe?g$', search_utils.MATCH_MODE_REGEX)
+        self.assertEqual(matcher('IMG_0042.jpg'), 0)
+        self.assertIsNone(matcher('IMG_a.jpg'))
+
+    def test_invalid_regex_raises_on_compile(self):
+        with self.assertRaises(re.error):
+            search_utils.compile_matcher('(', search_utils.MATCH_MODE_REGEX)
+
+    def test_unknown_mode_raises(self):
+        with self.assertRaises(ValueError):
+            search_utils.compile_matcher('x', 'nope')
+
+
+class TestFuzzyScore(unittest.TestCase):
+
+    def test_non_subsequence_returns_none(self):
+        self.assertIsNone(search_utils.fuzzy_score('xyz', 'foo_bar'))
+
+    def test_word_boundary_beats_mid_word(self):
+        self.assertGreater(search_utils.fuzzy_score('fb', 'foo_bar'),
+                           search_utils.fuzzy_score('fb', 'fooxbar'))
+
+    def test_consecutive_beats_scattered(self):
+        self.assertGreater(search_utils.fuzzy_score('rep', 'report'),
+                           search_utils.fuzzy_score('rep', 'r_e_p'))
+
+    def test_smart_case(self):
+        matcher = search_utils.compile_matcher('Rep', search_utils.MATCH_MODE_FUZZY)
+        self.assertIsNone(matcher('report'))
+        matcher = search_utils.compile_matcher('rep', search_utils.MATCH_MODE_FUZZY)
+        self.assertIsNotNone(matcher('REPORT'))
+
+
+class TestTopKResults(unittest.TestCase):
+
+    def test_keeps_only_best_k_best_first(self):
+        top = search_utils.TopKResults(k=2)
+        for score, item in [(1, 'a'), (5, 'b'), (3, 'c'), (0, 'd')]:
+            top.push(score, item)
+        self.assertEqual(top.best_first(), ['b', 'c'])
+
+    def test_ties_keep_the_earlier_result(self):
+        top = search_utils.TopKResults(k=1)
+        top.push(3, 'first')
+        self.assertFalse(top.push(3, 'second'))
+        self.assertEqual(top.best_first(), ['first'])
+
+
+class TestFilesIterator(unittest.TestCase):
+
+    def test_matches_names_and_returns_relative_paths(self):
+        with tempfile.TemporaryDirectory() as d:
+            os.makedirs(os.path.join(d, 'reports', 'old'))
+            open(os.path.join(d, 'reports', 'old', 'report_2020.txt'), 'w').close()
+            open(os.path.join(d, 'notes.txt'), 'w').close()
+            self.assertEqual(
+                sorted(search_utils.files_iterator(d, 'report')),
+                ['reports', os.path.join('reports', 'old', 'report_2020.txt')])
+
+    def test_trailing_slash_on_root(self):
+        with tempfile.TemporaryDirectory() as d:
+            open(os.path.join(d, 'a.txt'), 'w').close()
+            self.assertEqual(list(search_utils.files_iterator(d + '/', 'a.txt')), ['a.txt'])
+
+    def test_stop_event_ends_a_walk_without_matches(self):
+        with tempfile.TemporaryDirectory() as d:
+            for i in range(20):
+                os.makedirs(os.path.join(d, f'dir_{i}', 'sub'))
+            stop_event = threading.Event()
+            listed = []
+            real_scandir = os.scandir
+
+            def scandir(path):
+                listed.append(path)
+                if len(listed) == 3:
+                    stop_event.set()
+                return real_scandir(path)
+
+            with mock.patch('os.scandir', scandir):
+                self.assertEqual(list(search_utils.iter_matches(d, lambda name: None,
+                                                                stop_event=stop_event)), [])
+            self.assertEqual(len(listed), 3)
+
+
+class TestSearchOrdering(unittest.TestCase):
+
+    def test_shallow_hits_come_before_deep_ones(self):
+        with tempfile.TemporaryDirectory() as d:
+            deep = os.path.join(d, 'a', 'b', 'c', 'd')
+            os.makedirs(deep)
+            os.makedirs(os.path.join(d, 'z'))
+            open(os.path.join(deep, 'hit_deep'), 'w').close()
+            open(os.path.join(d, 'z', 'hit_shallow'), 'w').close()
+            old = time.time() - 30 * 24 * 60 * 60
+            for folder in ['a', 'a/b', 'a/b/c', 'a/b/c/d', 'z']:
+                os.utime(os.path.join(d, folder), (old, old))
+            self.assertEqual(list(search_utils.files_iterator(d, 'hit_')),
+                             [os.path.join('z', 'hit_shallow'), os.path.join('a', 'b', 'c', 'd', 'hit_deep')])
+
+    def test_favorites_are_explored_first(self):
+        with tempfile.TemporaryDirectory() as d:
+            for folder in ['x1/x2', 'y1/y2']:
+                os.makedirs(os.path.join(d, folder))
+                open(os.path.join(d, folder, 'hit'), 'w').close()
+            matcher = search_utils.compile_matcher('hit')
+            results = [p for p, _ in search_utils.iter_matches(
+                d, matcher, favorite_paths=[os.path.join(d, 'y1', 'y2')])]
+            self.assertEqual(results, [os.path.join('y1', 'y2', 'hit'), os.path.join('x1', 'x2', 'hit')])
+
+    def test_favorite_paths_membership(self):
+        favorites = search_utils.FavoritePaths(['/Users/me/Projects'])
+        self.assertIn('/Users/me', favorites)
+        self.assertIn('/Users/me/Projects/app/src', favorites)
+        self.assertNotIn('/Users/me/Library', favorites)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import unittest
+import os
+import tempfile
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils.size_engine import (FolderSizeScan, FolderSizeCache, get_total_size_bytes, nearest_first,
+                                   SIZE_MODE_ALLOCATED)
+from src.utils.prune_rules import PruneRules
+
+
+def _make_tree(d):
+    for i in range(5):
+        folder = os.path.join(d, f'f{i}', 'sub')
+        os.makedirs(folder)
+        with open(os.path.join(folder, 'data.bin'), 'wb') as f:
+            f.write(b'x' * 100 * (i + 1))
+    with open(os.path.join(d, 'top.txt'), 'wb') as f:
+        f.write(b'x' * 7)
+
+
+class TestFolderSizeScan(unittest.TestCase):
+
+    def test_totals(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            snapshot = FolderSizeScan([d], num_workers=3).run()
+            self.assertEqual(snapshot.bytes, 1500 + 7)
+            self.assertEqual(snapshot.files, 6)
+            self.assertEqual(snapshot.folders, 11)
+            self.assertEqual(snapshot.errors, 0)
+            self.assertTrue(snapshot.finished)
+
+    def test_files_and_folders_mixed(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            self.assertEqual(get_total_size_bytes([os.path.join(d, 'top.txt'), os.path.join(d, 'f0')]),
+                             107)
+
+    def test_prune_rules_apply(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            self.assertEqual(get_total_size_bytes([d], PruneRules(patterns=['f4', 'f3'])), 607)
+
+    def test_progress_is_reported_and_last_snapshot_is_final(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            snapshots = []
+            FolderSizeScan([d]).run(on_progress=snapshots.append, progress_interval=0)
+            self.assertTrue(snapshots[-1].finished)
+            self.assertEqual(snapshots[-1].bytes, 1507)
+
+    def test_missing_path_counts_as_error(self):
+        snapshot = FolderSizeScan(['/no/such/path']).run()
+        self.assertEqual((snapshot.bytes, snapshot.errors), (0, 1))
+
+    def test_hard_links_are_counted_once(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            os.link(os.path.join(d, 'f4', 'sub', 'data.bin'), os.path.join(d, 'f0', 'link.bin'))
+            os.link(os.path.join(d, 'f4', 'sub', 'data.bin'), os.path.join(d, 'link.bin'))
+            snapshot = FolderSizeScan([d], num_workers=3).run()
+            self.assertEqual((snapshot.bytes, snapshot.files, snapshot.hard_links), (1507, 6, 2))
+            # Across the top-level items too
+            self.assertEqual(get_total_size_bytes([os.path.join(d, 'link.bin'), os.path.join(d, 'f4')]),
+                             500)
+
+    def test_hard_links_are_counted_once_from_cache(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            os.link(os.path.join(d, 'f4', 'sub', 'data.bin'), os.path.join(d, 'f0', 'link.bin'))
+            cache = FolderSizeCache()
+            for _ in range(2):
+                self.assertEqual(get_total_size_bytes([d], cache=cache), 1507)
+
+    def test_allocated_size_of_sparse_file(self):
+        with tempfile.TemporaryDirectory() as d:
+            with open(os.path.join(d, 'sparse.img'), 'wb') as f:
+                f.truncate(64 * 1024 ** 2)
+            snapshot = FolderSizeScan([d]).run()
+            self.assertEqual(snapshot.bytes, 64 * 1024 ** 2)
+            self.assertLess(snapshot.allocated_bytes, snapshot.bytes)
+            self.assertEqual(snapshot.size(SIZE_MODE_ALLOCATED), snapshot.allocated_bytes)
+
+    def test_cancelled_scan_is_not_finished(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            scan = FolderSizeScan([d])
+            scan.cancel()
+            self.assertFalse(scan.run().finished)
+
+
+class TestFolderSizeCache(unittest.TestCase):
+
+    def test_only_changed_folders_are_listed_again(self):
+        with tempfile.TemporaryDirectory() as d, tempfile.TemporaryDirectory() as results_dir:
+            _make_tree(d)
+            cache = FolderSizeCache()
+            self.assertEqual(get_total_size_bytes([d], cache=cache), 1507)
+            self.assertEqual(len(cache), 11)
+
+            cache_path = os.path.join(results_dir, 'folder_size_cache')
+            cache.save(cache_path)
+            cache = FolderSizeCache.load(cache_path)
+            # Stale entry: a cached folder's totals are used as long as its mtime is unchanged
+            record = cache.get(os.stat(os.path.join(d, 'f0', 'sub')), PruneRules(patterns=[]).new_walk(d))
+            record.own_bytes = 1000
+            with open(os.path.join(d, 'f1', 'sub', 'more.bin'), 'wb') as f:
+                f.write(b'x' * 50)
+            self.assertEqual(get_total_size_bytes([d], cache=cache), 1507 + 900 + 50)
+
+    def test_different_prune_rules_start_over(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            cache = FolderSizeCache()
+            get_total_size_bytes([d], cache=cache)
+            self.assertEqual(get_total_size_bytes([d], PruneRules(patterns=['f4']), cache), 1007)
+
+    def test_records_depending_on_the_walk_are_not_reused(self):
+        with tempfile.TemporaryDirectory() as d:
+            os.makedirs(os.path.join(d, 'x'))
+            os.makedirs(os.path.join(d, 'a'))
+            with open(os.path.join(d, 'x', 'data.bin'), 'wb') as f:
+                f.write(b'x' * 100)
+            os.symlink(os.path.join(d, 'x'), os.path.join(d, 'a', 'link'))
+            rules = PruneRules(patterns=[], follow_symlinks=True)
+            cache = FolderSizeCache()
+            # 'x' is reached twice from the root, so 'a' is listed without it...
+            self.assertEqual(get_total_size_bytes([d], rules, cache), 100)
+            # ... which mustn't stick to 'a' when it's scanned on its own
+            self.assertEqual(get_total_size_bytes([os.path.join(d, 'a')], rules, cache), 100)
+            # ... nor the other way round, when 'a' comes from the cache
+            self.assertEqual(get_total_size_bytes([d], rules, cache), 100)
+
+    def test_records_of_the_rules_used_last_are_kept(self):
+        with tempfile.TemporaryDirectory() as d:
+            _make_tree(d)
+            cache = FolderSizeCache()
+            get_total_size_bytes([d], cache=cache)
+            get_total_size_bytes([d], PruneRules(patterns=['f4']), cache)
+            self.assertEqual(len(cache), 11 + 9)
+            get_total_size_bytes([d], PruneRules(patterns=['f3']), cache)
+            self.assertEqual(len(cache), 9 + 9)
+
+
+class TestNearestFirst(unittest.TestCase):
+
+    def test_visible_rows_then_alternating_outwards(self):
+        self.assertEqual(nearest_first(list('abcdefg'), 2, 3), list('cdebfag'))
+
+    def test_out_of_range_visible_rows(self):
+        self.assertEqual(nearest_first(list('abc'), 0, 10), list('abc'))
+        self.assertEqual(nearest_first([], 0, 5), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import unittest
+import os
+import tempfile
+import threading
+from unittest import mock
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils.deletion_engine import DeletionEngine
+from src.utils.staged_deletion import StagedDeletions, lower_io_priority, STAGING_DIR_NAME
+
+
+def _make_tree(root):
+    os.makedirs(os.path.join(root, 'sub'))
+    for name in ['a', os.path.join('sub', 'b')]:
+        with open(os.path.join(root, name), 'w') as f:
+            f.write(name)
+
+
+class TestStagedDeletions(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.d = self.temp_dir.name
+        self.staging_dir = os.path.join(self.d, 'staging')
+        os.mkdir(self.staging_dir)
+        self.deletions = StagedDeletions(os.path.join(self.d, 'index'), staging_dir=self.staging_dir)
+        self.tree = os.path.join(self.d, 'tree')
+        _make_tree(self.tree)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_stage_then_restore(self):
+        staged, errors = self.deletions.stage([self.tree, os.path.join(self.d, 'missing')])
+        self.assertEqual(len(staged), 1)
+        self.assertEqual([path for path, _ in errors], [os.path.join(self.d, 'missing')])
+        self.assertFalse(os.path.exists(self.tree))
+        self.assertTrue(os.path.isfile(os.path.join(staged[0].staged_path, 'sub', 'b')))
+        self.assertTrue(self.deletions.restore(staged[0]))
+        self.assertTrue(os.path.isfile(os.path.join(self.tree, 'sub', 'b')))
+        self.assertEqual(os.listdir(self.staging_dir), [])
+        self.assertEqual(self.deletions.pending(), [])
+
+    def test_stage_then_purge(self):
+        staged, _ = self.deletions.stage([self.tree])
+        self.assertTrue(self.deletions.purge(staged[0]))
+        self.assertEqual(os.listdir(self.staging_dir), [])
+        # Purged: can't be restored, nor purged twice
+        self.assertFalse(self.deletions.restore(staged[0]))
+        self.assertFalse(self.deletions.purge(staged[0]))
+        self.assertFalse(os.path.exists(self.tree))
+
+    def test_cancelled_purge_is_finished_later(self):
+        staged, _ = self.deletions.stage([self.tree])
+        engine = DeletionEngine(progress_interval=0, num_workers=1)
+        engine.on_progress = lambda progress: progress.entries_removed > 0 and engine.cancel()
+        self.assertFalse(self.deletions.purge(staged[0], engine))
+        self.assertEqual([item.token for item in self.deletions.pending()], [staged[0].token])
+        self.assertTrue(self.deletions.purge(staged[0]))
+        self.assertEqual(os.listdir(self.staging_dir), [])
+
+    def test_restored_item_is_not_purged(self):
+        staged, _ = self.deletions.stage([self.tree])
+        self.assertTrue(self.deletions.restore(staged[0]))
+        self.assertFalse(self.deletions.purge(staged[0]))
+        self.assertTrue(os.path.isdir(self.tree))
+
+    def test_restore_never_overwrites(self):
+        staged, _ = self.deletions.stage([self.tree])
+        os.mkdir(self.tree)
+        self.assertFalse(self.deletions.restore(staged[0]))
+        self.assertEqual([item.token for item in self.deletions.pending()], [staged[0].token])
+
+    def test_pending_items_are_found_by_a_new_instance(self):
+        other = os.path.join(self.d, 'other')
+        open(other, 'w').close()
+        staged, _ = self.deletions.stage([self.tree, other])
+        pending = StagedDeletions(os.path.join(self.d, 'index')).pending()
+        self.assertEqual([(item.original_path, item.staged_path) for item in pending],
+                         [(item.original_path, item.staged_path) for item in staged])
+
+    def test_staging_dir_is_on_the_same_volume(self):
+        staging_dir = StagedDeletions.staging_dir_for(self.tree)
+        self.assertIsNotNone(staging_dir)
+        self.assertEqual(os.stat(staging_dir).st_dev, os.stat(self.d).st_dev)
+
+    def test_staging_dir_is_only_made_on_the_same_volume(self):
+        volume_root, home = os.path.join(self.d, 'volume_root'), os.path.join(self.d, 'home')
+        os.mkdir(volume_root)
+        os.mkdir(home)
+        real_stat = os.stat
+
+        def stat(path, *args, **kwargs):
+            st = real_stat(path, *args, **kwargs)
+            if path in (volume_root, home):     # As if on another volume
+                return os.stat_result((st.st_mode, st.st_ino, st.st_dev + 1) + tuple(st)[3:])
+            return st
+
+        with mock.patch('src.utils.staged_deletion.mount_point_of', return_value=volume_root), \
+                mock.patch('os.path.expanduser', return_value=home), mock.patch('os.stat', stat):
+            staging_dir = StagedDeletions.staging_dir_for(os.path.join(self.tree, 'a'))
+        self.assertEqual(staging_dir, os.path.join(self.tree, STAGING_DIR_NAME))
+        self.assertEqual((os.listdir(volume_root), os.listdir(home)), ([], []))
+
+    def test_items_on_a_missing_volume_are_kept(self):
+        staged, _ = self.deletions.stage([self.tree])
+        unmounted = os.path.join(self.d, 'unmounted')
+        os.rename(self.staging_dir, unmounted)
+        with mock.patch('os.path.ismount', return_value=False):
+            self.assertEqual(self.deletions.pending(), [])
+        # Back: purged as usual
+        os.rename(unmounted, self.staging_dir)
+        self.assertEqual([item.token for item in self.deletions.pending()], [staged[0].token])
+        # Its volume is here, without its staging folder: the item is gone
+        staged[0].staged_at -= 3600
+        self.deletions._write_record(staged[0])
+        os.rename(self.staging_dir, unmounted)
+        self.assertEqual(self.deletions.pending(), [])
+        os.rename(unmounted, self.staging_dir)
+        self.assertEqual(self.deletions.pending(), [])
+
+    def test_token_folders_without_a_record_are_purged(self):
+        staged, _ = self.deletions.stage([self.tree])
+        # As when a purge, which starts by removing the record, is cut short by a crash
+        self.deletions._remove_record(staged[0].token)
+        deletions = StagedDeletions(os.path.join(self.d, 'index'))
+        self.assertEqual(deletions.pending(), [])
+        pending = deletions.pending()
+        self.assertEqual([(item.token, item.original_path) for item in pending], [(staged[0].token, '')])
+        self.assertTrue(deletions.purge(pending[0]))
+        self.assertEqual(os.listdir(self.staging_dir), [])
+        self.assertEqual(deletions.pending(), [])
+
+    def test_lower_io_priority_is_best_effort(self):
+        # In a thread of its own: it applies to the calling thread
+        thread = threading.Thread(target=lower_io_priority)
+        thread.start()
+        thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
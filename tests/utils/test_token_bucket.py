@@ -0,0 +1,54 @@
+import unittest
+import os
+
+os.chdir(os.getcwd().replace('/tests/utils', ''))
+
+from src.utils.token_bucket import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def _copy_for(self, bucket, clock, seconds, chunk_size, chunk_seconds):
+        # A copier moving `chunk_size` bytes per chunk, each taking `chunk_seconds`
+        copied = 0
+        while clock.now < seconds:
+            clock.now += chunk_seconds
+            copied += chunk_size
+            clock.now += bucket.take(chunk_size)
+        return copied / clock.now
+
+    def test_rate_is_kept_over_a_minute(self):
+        for rate, chunk_size in [(10 * 1024 ** 2, 1024 ** 2), (100 * 1024, 64 * 1024),
+                                 (1024 ** 2, 8 * 1024 ** 2)]:
+            clock = FakeClock()
+            bucket = TokenBucket(rate, clock=clock)
+            average = self._copy_for(bucket, clock, 60, chunk_size, chunk_seconds=0.001)
+            self.assertAlmostEqual(average / rate, 1, delta=0.05)
+
+    def test_slower_copies_are_not_limited(self):
+        clock = FakeClock()
+        bucket = TokenBucket(10 * 1024 ** 2, clock=clock)
+        average = self._copy_for(bucket, clock, 60, 1024 ** 2, chunk_seconds=0.5)
+        self.assertAlmostEqual(average, 2 * 1024 ** 2, delta=1)
+
+    def test_unlimited_and_changed_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(clock=clock)
+        self.assertEqual(bucket.take(10 ** 9), 0)
+        bucket.rate = 1000
+        self.assertAlmostEqual(bucket.take(500), 0.5)
+        bucket.rate = 0
+        self.assertIsNone(bucket.rate)
+        self.assertEqual(bucket.take(500), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()